@@ -1,15 +1,28 @@
 import backoff
 import requests
 
+from functools import partial
 from os.path import join as os_path_join, split as os_split_path, realpath
 
 from utils.api import Api
+from utils.crawler import Crawler, HostPolicy, crawl_job, retry_pacing
 
 
 class KworbChartsApi(Api):
 
     # https://kworb.net/spotify/artists.html
 
+    # seconds each page type stays fresh in the response cache, totals are refreshed daily by kworb.
+    cache_ttl = {
+        'track': 6 * 3600,
+        'artist': 6 * 3600,
+        'region': 1 * 3600
+    }
+
+    # politeness towards kworb.net while crawling.
+    host = 'kworb.net'
+    host_policy = HostPolicy(max_concurrency=2, min_interval=0.5)
+
     def __init__(self, output_path: list):
 
         # initialise superclass.
@@ -34,10 +47,12 @@ class KworbChartsApi(Api):
 
         # fetch data.
         try:
-            data: str = self._download_data(url=f'https://kworb.net/spotify/track/{track_id}.html')
+            data: str = self._download_data(
+                url=f'https://kworb.net/spotify/track/{track_id}.html', ttl=self.cache_ttl.get('track')
+            )
         except requests.exceptions.RequestException:
             self.logger.error(f'aborting download for id {track_id}')
-            return
+            raise
 
         # save data to file system.
         self._save_text_to_file(
@@ -57,7 +72,9 @@ class KworbChartsApi(Api):
             raise ValueError(f'a valid non empty string was expected, but received {artist_id} {type(artist_id)}')
 
         # fetch data.
-        data: str = self._download_data(url=f'https://kworb.net/spotify/artist/{artist_id}.html')
+        data: str = self._download_data(
+            url=f'https://kworb.net/spotify/artist/{artist_id}.html', ttl=self.cache_ttl.get('artist')
+        )
 
         # save data to file system.
         self._save_text_to_file(
@@ -72,7 +89,9 @@ class KworbChartsApi(Api):
         self.logger.info(f'initialising retrieval of charts history for region {region} and interval {interval}')
 
         # fetch data.
-        data: str = self._download_data(url=f'https://kworb.net/spotify/country/{region}_{interval}_totals.html')
+        data: str = self._download_data(
+            url=f'https://kworb.net/spotify/country/{region}_{interval}_totals.html', ttl=self.cache_ttl.get('region')
+        )
 
         # save data to file system.
         self._save_text_to_file(
@@ -81,15 +100,77 @@ class KworbChartsApi(Api):
             extension='html'
         )
 
-    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=5)
-    def _download_data(self, url: str) -> str:
+    def track_charts_jobs(self, track_ids: list) -> list:
+        """
+        Builds one crawl job per track, to be run by a Crawler alone or along jobs of other hosts.
+        :param track_ids: list - track ids to download.
+        :return: list - CrawlJob instances.
+        """
+
+        # assert input.
+        if not isinstance(track_ids, list) or len(track_ids) == 0:
+            self.logger.error(f'expected a valid non empty list, but found {track_ids} of type {type(track_ids)}')
+            raise ValueError(f'expected a valid non empty list, but found {track_ids} of type {type(track_ids)}')
+
+        return [
+            crawl_job(
+                url=f'https://kworb.net/spotify/track/{track_id}.html', key=track_id,
+                task=partial(self.download_track_charts_history, track_id=track_id)
+            )
+            for track_id in track_ids
+        ]
+
+    def global_charts_jobs(self, regions: list, intervals: list = None) -> list:
+        """
+        Builds one crawl job per region and interval, to be run by a Crawler alone or along jobs of other hosts.
+        :param regions: list - regions to download.
+        :param intervals: list - intervals to download, defaults to weekly.
+        :return: list - CrawlJob instances.
+        """
+
+        # assert input.
+        if not isinstance(regions, list) or len(regions) == 0:
+            self.logger.error(f'expected a valid non empty list, but found {regions} of type {type(regions)}')
+            raise ValueError(f'expected a valid non empty list, but found {regions} of type {type(regions)}')
+        intervals = ['weekly'] if intervals is None else intervals
+
+        return [
+            crawl_job(
+                url=f'https://kworb.net/spotify/country/{region}_{interval}_totals.html', key=f'{region}-{interval}',
+                task=partial(self.download_global_charts_history, interval=interval, region=region)
+            )
+            for interval in intervals for region in regions
+        ]
+
+    def crawl(self, jobs: list, max_concurrency: int = 4) -> dict:
+        """
+        Runs crawl jobs through a polite concurrent crawler instead of a serial loop.
+        :param jobs: list - CrawlJob instances, e.g. track_charts_jobs(...) + global_charts_jobs(...).
+        :param max_concurrency: int - max amount of requests in flight.
+        :return: dict - amount of completed and failed jobs.
+        """
+
+        # crawl.
+        crawler = Crawler(max_concurrency=max_concurrency, policies={self.host: self.host_policy}, logger=self.logger)
+        counters: dict = crawler.crawl(jobs=jobs)
+
+        # logger.
+        self.logger.info('kworb crawl completed')
+        self.log_transport_stats()
+
+        return counters
 
-        # perform request.
-        r = requests.get(
+    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=5,
+                          on_backoff=retry_pacing(host=host))
+    def _download_data(self, url: str, ttl: float = 0) -> str:
+
+        # perform request, through the response cache when enabled.
+        r = self._cached_get(
             url=url,
+            ttl=ttl,
             headers={
                 'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9',
-                'accept-encoding': 'gzip, deflate, br',
+                'accept-encoding': 'gzip, deflate',
                 'accept-language': 'en-US,en;q=0.9,es-419;q=0.8,es;q=0.7,es-ES;q=0.6,en-GB;q=0.5,pt;q=0.4,pt-BR;q=0.3',
                 'referer': 'https://kworb.net/spotify/country/global_weekly_totals.html',
                 'sec-fetch-dest': 'document',
@@ -130,12 +211,30 @@ if __name__ == '__main__':
     # available artists.
     artists = []
 
+    # # reuse previously downloaded pages while they are fresh.
+    # KworbChartsApi.configure_cache(cache_path=os_path_join('data', 'cache', 'http'))
+
     # instantiate a new downloader object.
     k_charts = KworbChartsApi(output_path=['data', 'raw'])
 
-    # download track's charts.
+    # download track's charts, skipping the ones that keep failing.
     for track in tracks:
-        k_charts.download_track_charts_history(track_id=track)
+        try:
+            k_charts.download_track_charts_history(track_id=track)
+        except requests.exceptions.RequestException:
+            continue
+
+    # report connection reuse.
+    k_charts.log_transport_stats()
+
+    # # download track's and region's charts concurrently, politely towards kworb.net.
+    # k_charts.crawl(jobs=k_charts.track_charts_jobs(track_ids=tracks) + k_charts.global_charts_jobs(regions=regions))
+
+    # # crawl kworb.net and spotifycharts.com side by side under one cap, given a SpotifyChartsDownloader wd.
+    # from utils.crawler import crawl_downloaders
+    # crawl_downloaders(downloaders=[k_charts, wd],
+    #                   jobs=k_charts.track_charts_jobs(track_ids=tracks) + wd.weekly_charts_jobs(weeks=weeks),
+    #                   max_concurrency=8)
 
     # download global charts.
     # for region in regions:
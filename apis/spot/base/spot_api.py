@@ -1,12 +1,29 @@
+import asyncio
+
 import requests
 import backoff
 
+from functools import partial
+
+from apis.spot.base.spot_token import SpotifyTokenManager
+
 from utils.api import Api
+from utils.json_codec import codec
+from utils.rate_limiter import RateLimiter
 
 
 class SpotifyApi(Api):
 
-    def __init__(self):
+    # max amount of consecutive 401 responses before a request is abandoned.
+    max_token_retries = 5
+
+    def __init__(self, asynchronous: bool = False, max_concurrency: int = 8, rate_limit: float = 5.0):
+        """
+        Initialise SPOT API base class.
+        :param asynchronous: bool - download chunks concurrently through the asyncio engine.
+        :param max_concurrency: int - max amount of requests in flight while running asynchronously.
+        :param rate_limit: float - max requests per second, shared by every request issued by this instance.
+        """
 
         # initialise superclass.
         super().__init__()
@@ -14,120 +31,279 @@ class SpotifyApi(Api):
         # in memory logger.
         self._init_logger(logger_name='SPOT', file_name='', system_logger=False)
 
-        # get new access token.
-        self.access_token: str = self._refresh_access_token()
+        # assert concurrency input.
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            self.logger.error(f'expected a positive integer, but found {max_concurrency} of type '
+                              f'{type(max_concurrency)}')
+            raise ValueError(f'expected a positive integer, but found {max_concurrency} of type '
+                             f'{type(max_concurrency)}')
+
+        # download engine settings.
+        self._asynchronous: bool = asynchronous
+        self._max_concurrency: int = max_concurrency
+        self._rate_limiter: RateLimiter = RateLimiter(rate=rate_limit)
+
+        # access token shared with every thread and process using the same credentials.
+        self._token_manager: SpotifyTokenManager = SpotifyTokenManager(
+            environment=self.environment, transport=self.transport, logger=self.logger
+        )
+
+        # get a valid access token, only reaching the token endpoint when the cached one is about to expire.
+        self._token_manager.get_token()
 
         # data container.
         self.data_container = list()
 
-    def _refresh_access_token(self) -> str:
+    @property
+    def access_token(self) -> str:
+        """
+        Getter for property access_token, refreshed ahead of expiry.
+        :return: str
+        """
 
-        # assemble data for request.
-        api_url = 'https://accounts.spotify.com/api/token'
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        data = {
-            'grant_type': 'refresh_token',
-            'refresh_token': self.environment.get('SPOT_REFRESH_TOKEN'),
-            'client_id': self.environment.get('SPOT_CLIENT_ID'),
-            'client_secret': self.environment.get('SPOT_CLIENT_SECRET')
-        }
+        return self._token_manager.get_token()
 
-        # perform request.
-        response = requests.post(url=api_url, headers=headers, data=data)
+    def _renew_access_token(self, stale_token: str) -> None:
+        """
+        Refreshes the access token after a 401 response, unless a concurrent request already did it.
+        :param stale_token: str - token that was rejected by the endpoint.
+        :return: None
+        """
 
-        # update credentials on success.
-        if response.ok:
-            # parse data
-            json_response = response.json()
-            # extract data
-            access_token = json_response.get('access_token', None)
-            # set token.
-            self.access_token = access_token
+        # logger.
+        self.logger.info('access token rejected, renewing it')
 
-            return access_token
+        # refresh token.
+        self._token_manager.invalidate(stale_token=stale_token)
 
-        # raise Error
-        raise ValueError('refresh token could not be generated')
+    def _fetch(self, url: str, params: dict = None) -> tuple:
+        """
+        Performs a rate limited GET request using the current access token.
+        :param url: str - endpoint url.
+        :param params: dict - query string parameters.
+        :return: tuple - response and the access token used to perform the request.
+        """
 
-    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=5)
-    def _download_multiple(self, data_id: str, endpoint: str, ids: list, retries: int = 0):
+        # wait for the rate budget.
+        self._rate_limiter.acquire()
 
-        # check max retries.
-        if retries == 5:
-            return
+        # perform request.
+        token = self.access_token
+        r = self.transport.get(url=url, headers={'Authorization': f'Bearer {token}'}, params=params)
 
-        # logger.
-        self.logger.info(f'performing data request for endpoint: {endpoint} for ids {" ".join(ids)}')
+        return r, token
+
+    async def _fetch_async(self, url: str, params: dict = None) -> tuple:
+        """
+        Asynchronous counterpart of _fetch, the blocking request runs on the event loop's executor.
+        :param url: str - endpoint url.
+        :param params: dict - query string parameters.
+        :return: tuple - response and the access token used to perform the request.
+        """
+
+        # wait for the rate budget.
+        await self._rate_limiter.acquire_async()
 
         # perform request.
-        r = requests.get(
-            url=endpoint,
-            headers={
-                'Authorization': f'Bearer {self.access_token}'
-            },
-            params={
-                'ids': ','.join(ids)
-            }
+        token = self.access_token
+        r = await asyncio.get_running_loop().run_in_executor(
+            None, partial(self.transport.get, url=url, headers={'Authorization': f'Bearer {token}'}, params=params)
         )
 
+        return r, token
+
+    def _evaluate_response(self, r: requests.Response, reference: dict):
+        """
+        Evaluates an endpoint response.
+        :param r: requests.Response - endpoint response.
+        :param reference: dict - request reference that is stored alongside the downloaded data.
+        :return: tuple - status code and data record, the latter is None when the response did not produce any data.
+        """
+
         # evaluate result.
         if r.ok:
-            self._append_data_to_container(
-                response=r,
-                reference={'data_id': data_id, 'endpoint': endpoint, 'ids': ids}
-            )
-        elif r.status_code == 401:
-            self._refresh_access_token()
-            self._download_multiple(data_id=data_id, endpoint=endpoint, ids=ids, retries=retries+1)
-        else:
-            raise requests.exceptions.RequestException(f'endpoint responded with code {r.status_code}')
+            return r.status_code, self._build_record(response=r, reference=reference)
+        elif r.status_code == 404 and 'id' in reference:
+            self.logger.error(f'endpoint responded with status code: {r.status_code}')
+            return r.status_code, None
+        elif r.status_code == 429:
+            # hold every request back for the time requested by the endpoint.
+            self._rate_limiter.pause(float(r.headers.get('Retry-After', 1)))
+
+        raise requests.exceptions.RequestException(f'endpoint responded with code {r.status_code}')
 
     @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=5)
-    def _download_single(self, data_id: str, endpoint: str, id: str, retries: int = 0):
+    def _request_multiple(self, data_id: str, endpoint: str, ids: list):
 
-        # check max retries.
-        if retries == 5:
-            return
+        # logger.
+        self.logger.info(f'performing data request for endpoint: {endpoint} for ids {" ".join(ids)}')
+
+        # retry as long as the access token keeps being rejected.
+        for _ in range(self.max_token_retries):
+            # perform request.
+            r, token = self._fetch(url=endpoint, params={'ids': ','.join(ids)})
+            # refresh token and try again.
+            if r.status_code == 401:
+                self._renew_access_token(stale_token=token)
+                continue
+            # evaluate result.
+            return self._evaluate_response(r=r, reference={'data_id': data_id, 'endpoint': endpoint, 'ids': ids})
+
+        return 401, None
+
+    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=5)
+    def _request_single(self, data_id: str, endpoint: str, id: str):
 
         # logger.
         self.logger.info(f'performing data request for endpoint: {endpoint} using id {id}')
 
+        # retry as long as the access token keeps being rejected.
+        for _ in range(self.max_token_retries):
+            # perform request.
+            r, token = self._fetch(url=endpoint.format(id=id))
+            # refresh token and try again.
+            if r.status_code == 401:
+                self._renew_access_token(stale_token=token)
+                continue
+            # evaluate result.
+            return self._evaluate_response(r=r, reference={'data_id': data_id, 'endpoint': endpoint, 'id': id})
+
+        return 401, None
+
+    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=5)
+    async def _request_multiple_async(self, data_id: str, endpoint: str, ids: list):
+
+        # logger.
+        self.logger.info(f'performing data request for endpoint: {endpoint} for ids {" ".join(ids)}')
+
+        # retry as long as the access token keeps being rejected.
+        for _ in range(self.max_token_retries):
+            # perform request.
+            r, token = await self._fetch_async(url=endpoint, params={'ids': ','.join(ids)})
+            # refresh token and try again.
+            if r.status_code == 401:
+                await asyncio.get_running_loop().run_in_executor(None, self._renew_access_token, token)
+                continue
+            # evaluate result.
+            return self._evaluate_response(r=r, reference={'data_id': data_id, 'endpoint': endpoint, 'ids': ids})
+
+        return 401, None
+
+    def _download_single(self, data_id: str, endpoint: str, id: str) -> int:
+
         # perform request.
-        r = requests.get(
-            url=endpoint.format(id=id),
-            headers={
-                'Authorization': f'Bearer {self.access_token}'
-            }
-        )
+        status_code, record = self._request_single(data_id=data_id, endpoint=endpoint, id=id)
 
-        # evaluate result.
-        if r.ok:
-            self._append_data_to_container(
-                response=r,
-                reference={'data_id': data_id, 'endpoint': endpoint, 'id': id}
+        # append data to container.
+        if record is not None:
+            self._append_record_to_container(record=record)
+
+        return status_code
+
+    def _download_chunks(self, data_id: str, endpoint: str, id_chunks: list, on_chunk=None):
+        """
+        Downloads every chunk of ids, either one at a time or concurrently depending on the instance's mode.
+        Records are appended to the data container in chunk order on both modes, unless a chunk handler is given.
+        :param data_id: str - endpoint name.
+        :param endpoint: str - endpoint url.
+        :param id_chunks: list - lists of ids, one request per list.
+        :param on_chunk: callable - receives (index, ids, record) as soon as each chunk is done, record is None
+        when the chunk could not be downloaded.
+        :return: list - ids of the chunks that could not be downloaded, on both modes a failed chunk is logged and
+        does not discard the other ones.
+        """
+
+        # concurrent mode, unless called from a running event loop, e.g. a notebook, where asyncio.run can not be
+        # used.
+        asynchronous = self._asynchronous
+        if asynchronous:
+            try:
+                asyncio.get_running_loop()
+                self.logger.info('event loop already running, downloading chunks sequentially')
+                asynchronous = False
+            except RuntimeError:
+                pass
+
+        if asynchronous:
+            records = asyncio.run(
+                self._gather_chunks(data_id=data_id, endpoint=endpoint, id_chunks=id_chunks, on_chunk=on_chunk)
             )
-        elif r.status_code == 401:
-            self._refresh_access_token()
-            self._download_single(data_id=data_id, endpoint=endpoint, id=id, retries=retries+1)
-        elif r.status_code == 404:
-            self.logger.error(f'endpoint responded with status code: {r.status_code}')
-            return
         else:
-            raise requests.exceptions.RequestException(f'endpoint responded with code {r.status_code}')
+            # sequential mode.
+            records = list()
+            n_chunks: int = len(id_chunks)
+            for index, chunk in enumerate(id_chunks):
+                # logger.
+                self.logger.info(f'iterating chunk {index + 1} of {n_chunks}')
+                # get data.
+                try:
+                    _, record = self._request_multiple(data_id=data_id, endpoint=endpoint, ids=chunk)
+                except requests.exceptions.RequestException as e:
+                    # a failed chunk must not discard the ones already downloaded.
+                    self.logger.error(f'chunk {index + 1} of {n_chunks} could not be downloaded: {e}')
+                    record = None
+                # hand chunk over as soon as it is done.
+                if on_chunk is not None:
+                    on_chunk(index, chunk, record)
+                records.append(record)
+
+        # append records in chunk order.
+        if on_chunk is None:
+            for record in records:
+                if record is not None:
+                    self._append_record_to_container(record=record)
+
+        # failed chunks.
+        failed: list = [id for chunk, record in zip(id_chunks, records) if record is None for id in chunk]
+        if len(failed) > 0:
+            self.logger.error(f'{len(failed)} ids could not be downloaded: {" ".join(failed)}')
+
+        # logger.
+        self.log_transport_stats()
 
-    def _append_data_to_container(self, response: requests.Response, reference: dict):
+        return failed
+
+    async def _gather_chunks(self, data_id: str, endpoint: str, id_chunks: list, on_chunk=None) -> list:
+
+        # bound requests in flight.
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        n_chunks: int = len(id_chunks)
+
+        async def download(index: int, chunk: list):
+            async with semaphore:
+                # logger.
+                self.logger.info(f'iterating chunk {index + 1} of {n_chunks}')
+                # get data.
+                try:
+                    _, record = await self._request_multiple_async(data_id=data_id, endpoint=endpoint, ids=chunk)
+                except requests.exceptions.RequestException as e:
+                    # a failed chunk must not discard the ones already downloaded.
+                    self.logger.error(f'chunk {index + 1} of {n_chunks} could not be downloaded: {e}')
+                    record = None
+                # hand chunk over as soon as it is done.
+                if on_chunk is not None:
+                    on_chunk(index, chunk, record)
+                return record
+
+        return await asyncio.gather(*[download(index, chunk) for index, chunk in enumerate(id_chunks)])
+
+    def _build_record(self, response: requests.Response, reference: dict):
 
         # attempt to perform JSON parsing.
         try:
-            raw_data = response.json()
+            raw_data = codec.loads(response.content)
         except:
             # log error.
             self.logger.error(f'JSONDecodeError while parsing response')
             # return to prevent further processing.
-            return
+            return None
+
+        return {**reference, 'raw_data': raw_data}
+
+    def _append_record_to_container(self, record: dict):
 
         # logger.
         self.logger.info('appending data to container')
 
         # append data to container.
-        self.data_container.append({**reference, 'raw_data': raw_data})
+        self.data_container.append(record)
@@ -0,0 +1,193 @@
+import hashlib
+import threading
+
+from contextlib import contextmanager
+from json import dumps, loads
+from os import path, makedirs, replace, getpid, chmod
+from time import time
+
+from utils.transport import HttpTransport
+
+try:
+    import fcntl
+except ImportError:
+    # non POSIX systems, only threads of the same process are synchronised.
+    fcntl = None
+
+
+class SpotifyTokenManager:
+
+    # token endpoint.
+    token_url = 'https://accounts.spotify.com/api/token'
+    # seconds before expiry at which the token is refreshed ahead of time.
+    refresh_margin = 60
+    # lifetime assumed when the endpoint does not report expires_in.
+    default_expires_in = 3600
+
+    def __init__(self, environment: dict, transport: HttpTransport, logger, cache_path: str = None):
+        """
+        Access token manager which caches the token and its expiry on disk, so that every thread and process
+        using the same credentials shares a single token and a single refresh.
+        :param environment: dict - environment holding SPOT credentials.
+        :param transport: HttpTransport - transport used to reach the token endpoint.
+        :param logger: logger instance.
+        :param cache_path: str - directory where the token is cached, defaults to SPOT_TOKEN_CACHE or ~/.cache.
+        """
+
+        # dependencies.
+        self._environment: dict = environment
+        self._transport: HttpTransport = transport
+        self.logger = logger
+
+        # token cache file, one per client id.
+        cache_path = cache_path or self._environment.get('SPOT_TOKEN_CACHE') or \
+            path.join(path.expanduser('~'), '.cache', 'ds-desafio-3-grupo-1')
+        client_hash = hashlib.sha1(str(self._environment.get('SPOT_CLIENT_ID')).encode('utf-8')).hexdigest()[:12]
+        self._cache_file: str = path.join(cache_path, f'spot-token-{client_hash}.json')
+
+        # in memory copy.
+        self._token: str = ''
+        self._expires_at: float = 0.0
+
+        # lock shared by the threads of this process.
+        self._lock = threading.Lock()
+
+    @property
+    def cache_file(self) -> str:
+        """
+        Getter for property cache_file.
+        :return: str
+        """
+
+        return self._cache_file
+
+    def _is_fresh(self) -> bool:
+
+        return bool(self._token) and time() < self._expires_at - self.refresh_margin
+
+    def get_token(self) -> str:
+        """
+        Returns a valid access token, refreshing it ahead of expiry when required.
+        :return: str
+        """
+
+        # fast path.
+        if self._is_fresh():
+            return self._token
+
+        with self._lock:
+            # another thread refreshed it meanwhile.
+            if self._is_fresh():
+                return self._token
+            with self._process_lock():
+                # another process may have refreshed it meanwhile.
+                self._load()
+                if not self._is_fresh():
+                    self._refresh()
+
+            return self._token
+
+    def invalidate(self, stale_token: str) -> str:
+        """
+        Replaces a token rejected by an endpoint, unless another thread or process already did it.
+        :param stale_token: str - token that was rejected.
+        :return: str - valid access token.
+        """
+
+        with self._lock:
+            # token has already been replaced by another thread.
+            if self._token != stale_token and self._is_fresh():
+                return self._token
+            with self._process_lock():
+                # token has already been replaced by another process.
+                self._load()
+                if self._token == stale_token or not self._is_fresh():
+                    self._refresh()
+
+            return self._token
+
+    def _refresh(self) -> None:
+
+        # logger.
+        self.logger.info('requesting a new access token')
+
+        # assemble data for request.
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        data = {
+            'grant_type': 'refresh_token',
+            'refresh_token': self._environment.get('SPOT_REFRESH_TOKEN'),
+            'client_id': self._environment.get('SPOT_CLIENT_ID'),
+            'client_secret': self._environment.get('SPOT_CLIENT_SECRET')
+        }
+
+        # perform request.
+        issued_at = time()
+        response = self._transport.post(url=self.token_url, headers=headers, data=data)
+
+        # raise Error
+        if not response.ok:
+            raise ValueError('refresh token could not be generated')
+
+        # parse data
+        json_response = response.json()
+        access_token = json_response.get('access_token', None)
+        if not access_token:
+            raise ValueError('refresh token could not be generated')
+
+        # set token.
+        self._token = access_token
+        self._expires_at = issued_at + float(json_response.get('expires_in', self.default_expires_in))
+
+        # share token with other processes.
+        self._store()
+
+    def _load(self) -> None:
+
+        # check file existence.
+        if not path.isfile(self._cache_file):
+            return
+
+        # read cached token.
+        try:
+            with open(self._cache_file, 'r', encoding='utf-8') as f:
+                cached = loads(f.read())
+        except (OSError, ValueError):
+            # corrupted cache is simply replaced on next refresh.
+            self.logger.error(f'could not read token cache {self._cache_file}')
+            return
+
+        # keep the freshest token.
+        if cached.get('expires_at', 0) > self._expires_at:
+            self._token = cached.get('access_token', '')
+            self._expires_at = float(cached.get('expires_at', 0))
+
+    def _store(self) -> None:
+
+        # check for location to save the cache.
+        makedirs(path.dirname(self._cache_file), exist_ok=True)
+
+        # write atomically so readers never see a partial file.
+        tmp_file = f'{self._cache_file}.{getpid()}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(dumps({'access_token': self._token, 'expires_at': self._expires_at}))
+        chmod(tmp_file, 0o600)
+        replace(tmp_file, self._cache_file)
+
+    @contextmanager
+    def _process_lock(self):
+
+        # no cross process lock available.
+        if fcntl is None:
+            yield
+            return
+
+        # check for location to save the lock.
+        makedirs(path.dirname(self._cache_file), exist_ok=True)
+
+        # exclusive lock held while the token is checked and refreshed.
+        with open(f'{self._cache_file}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
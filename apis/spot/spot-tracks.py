@@ -1,198 +1,281 @@
-from math import ceil
-from time import time, sleep
+import requests
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import time, monotonic
 from os.path import join as os_path_join, split as os_split_path, realpath
 
 from apis.spot.base.spot_api import SpotifyApi
 from apis.spot.base.spot_endpoints import SpotifyTrackEndpoints
 
 from utils.list import chunks
+from utils.manifest import DownloadManifest
 
 
 class SpotifyTracksApi(SpotifyApi):
 
-    def __init__(self, output_path: list):
+    def __init__(self, output_path: list, asynchronous: bool = False, max_concurrency: int = 8,
+                 rate_limit: float = 5.0):
 
         # initialise superclass.
-        super().__init__()
+        super().__init__(asynchronous=asynchronous, max_concurrency=max_concurrency, rate_limit=rate_limit)
 
         # paths.
         self._base_path: str = os_split_path(os_split_path(os_split_path(realpath(__file__))[0])[0])[0]
         self._output_path: str = os_path_join(*output_path)
 
+        # download manifests, one per output folder.
+        self._manifests: dict = dict()
+
     def _clear_containers(self):
 
         self.data_container.clear()
 
-    def download_track(self, track_id: str):
+    def manifest(self, folder: str) -> DownloadManifest:
+        """
+        Returns the download manifest of an output folder, shared by its single and batch endpoints.
+        :param folder: str - output folder, e.g. spot-track-data.
+        :return: DownloadManifest
+        """
+
+        # lazily load manifest.
+        if folder not in self._manifests:
+            self._manifests[folder] = DownloadManifest(
+                manifest_file=os_path_join(self._base_path, self._output_path, 'manifests', f'{folder}.jsonl')
+            )
+
+        return self._manifests[folder]
+
+    def _download_and_save_single(self, endpoint: SpotifyTrackEndpoints, folder: str, track_id: str,
+                                  resume: bool) -> bool:
 
         # assert input
         if not isinstance(track_id, str) or len(track_id) == 0:
             self.logger.error(f'expected a valid non empty string, but found {track_id} of type {type(track_id)}')
             raise ValueError(f'expected a valid non empty string, but found {track_id} of type {type(track_id)}')
 
+        # skip ids already fetched or known to be missing.
+        manifest = self.manifest(folder=folder)
+        if resume and len(manifest.pending(ids=[track_id])) == 0:
+            self.logger.info(f'id {track_id} is already {manifest.state(id=track_id)}, skipping download')
+            return False
+
         # clear all containers.
         self._clear_containers()
 
         # download data.
-        self._download_single(
-            data_id=SpotifyTrackEndpoints.GET_TRACK.name,
-            endpoint=SpotifyTrackEndpoints.GET_TRACK.value,
-            id=track_id
-        )
+        try:
+            status_code = self._download_single(data_id=endpoint.name, endpoint=endpoint.value, id=track_id)
+        except Exception:
+            manifest.mark(ids=[track_id], status=DownloadManifest.FAILED)
+            raise
 
         # if data was downloaded, save data.
         if len(self.data_container) > 0:
             # save to .json file.
             self._save_json_to_file(
-                output_path=[self._base_path, self._output_path, 'spot-track-data', track_id],
+                output_path=[self._base_path, self._output_path, folder, track_id],
                 data=self.data_container.pop()
             )
-            # logger.
-            self.logger.info('track download completed')
-        else:
-            self.logger.error('no data was downloaded')
+            # checkpoint.
+            manifest.mark(ids=[track_id], status=DownloadManifest.FETCHED)
+            return True
 
-    def download_several_tracks(self, track_ids: list):
+        # checkpoint.
+        manifest.mark(
+            ids=[track_id], status=DownloadManifest.NOT_FOUND if status_code == 404 else DownloadManifest.FAILED
+        )
+        self.logger.error('no data was downloaded')
+
+        return False
+
+    def _download_and_save_several(self, endpoint: SpotifyTrackEndpoints, folder: str, node: str, track_ids: list,
+                                   resume: bool, completed_message: str) -> None:
 
         # assert input
         if not isinstance(track_ids, list) or len(track_ids) == 0:
             self.logger.error(f'expected a valid non empty list, but found {track_ids} of type {type(track_ids)}')
             raise ValueError(f'expected a valid non empty list, but found {track_ids} of type {type(track_ids)}')
 
+        # only fetch the ids missing from previous runs.
+        manifest = self.manifest(folder=folder)
+        if resume:
+            pending = manifest.pending(ids=track_ids)
+            self.logger.info(f'{len(track_ids) - len(pending)} of {len(track_ids)} ids already downloaded, '
+                             f'{len(pending)} pending')
+        else:
+            pending = track_ids
+
+        # nothing left to do.
+        if len(pending) == 0:
+            self.logger.info('every id has already been downloaded')
+            return
+
         # clear all containers.
         self._clear_containers()
 
-        # download data.
-        n_chunks: int = ceil(len(track_ids) / 50)
-        for index, chunk in enumerate(chunks(track_ids, 50)):
-            # logger.
-            self.logger.info(f'iterating chunk {index + 1} of {n_chunks}')
-            # get data.
-            self._download_multiple(
-                data_id=SpotifyTrackEndpoints.GET_SEVERAL_TRACKS.name,
-                endpoint=SpotifyTrackEndpoints.GET_SEVERAL_TRACKS.value,
-                ids=chunk
+        # save every chunk as soon as it is downloaded, so a crashed run resumes from its last chunk.
+        time_signature = int(time())
+        saved: list = list()
+
+        def save_chunk(index: int, ids: list, record: dict):
+            # chunk failed.
+            if record is None:
+                manifest.mark(ids=ids, status=DownloadManifest.FAILED)
+                return
+            # save to .json file.
+            self._save_json_to_file(
+                output_path=[self._base_path, self._output_path, folder, f'{time_signature}-{index}'],
+                data=record
             )
-            # avoid flooding.
-            sleep(1)
+            # unknown ids are returned as null entries.
+            items = record.get('raw_data', {}).get(node) or []
+            missing = [id for id, item in zip(ids, items) if item is None]
+            manifest.mark(ids=[id for id in ids if id not in missing], status=DownloadManifest.FETCHED)
+            if len(missing) > 0:
+                manifest.mark(ids=missing, status=DownloadManifest.NOT_FOUND)
+            saved.append(index)
 
-        # if data was downloaded, save data.
-        if len(self.data_container) > 0:
-            # iterate container.
-            time_signature = int(time())
-            for index, data in enumerate(self.data_container):
-                # save to .json file.
-                self._save_json_to_file(
-                    output_path=[
-                        self._base_path, self._output_path, 'spot-track-data', f'{time_signature}-{index}'
-                    ],
-                    data=data
-                )
-            # logger.
-            self.logger.info('track download completed')
+        # download data.
+        self._download_chunks(
+            data_id=endpoint.name, endpoint=endpoint.value, id_chunks=list(chunks(pending, 50)), on_chunk=save_chunk
+        )
+
+        # logger.
+        if len(saved) > 0:
+            self.logger.info(completed_message)
         else:
-            # logger.
             self.logger.error('no data was downloaded')
 
-    def download_track_features(self, track_id: str):
+    def download_track(self, track_id: str, resume: bool = True):
 
-        # assert input
-        if not isinstance(track_id, str) or len(track_id) == 0:
-            self.logger.error(f'expected a valid non empty string, but found {track_id} of type {type(track_id)}')
-            raise ValueError(f'expected a valid non empty string, but found {track_id} of type {type(track_id)}')
+        # download and save data.
+        if self._download_and_save_single(
+            endpoint=SpotifyTrackEndpoints.GET_TRACK, folder='spot-track-data', track_id=track_id, resume=resume
+        ):
+            # logger.
+            self.logger.info('track download completed')
 
-        # clear all containers.
-        self._clear_containers()
+    def download_several_tracks(self, track_ids: list, resume: bool = True):
 
-        # download data.
-        self._download_single(
-            data_id=SpotifyTrackEndpoints.GET_TRACK_AUDIO_FEATURES.name,
-            endpoint=SpotifyTrackEndpoints.GET_TRACK_AUDIO_FEATURES.value,
-            id=track_id
+        # download and save data.
+        self._download_and_save_several(
+            endpoint=SpotifyTrackEndpoints.GET_SEVERAL_TRACKS, folder='spot-track-data', node='tracks',
+            track_ids=track_ids, resume=resume, completed_message='track download completed'
         )
 
-        # if data was downloaded, save data.
-        if len(self.data_container) > 0:
-            # save to .json file.
-            self._save_json_to_file(
-                output_path=[self._base_path, self._output_path, 'spot-track-audio-features', track_id],
-                data=self.data_container.pop()
-            )
+    def download_track_features(self, track_id: str, resume: bool = True):
+
+        # download and save data.
+        if self._download_and_save_single(
+            endpoint=SpotifyTrackEndpoints.GET_TRACK_AUDIO_FEATURES, folder='spot-track-audio-features',
+            track_id=track_id, resume=resume
+        ):
             # logger.
             self.logger.info("track's audio features download completed")
-        else:
-            self.logger.error('no data was downloaded')
 
-    def download_several_tracks_features(self, track_ids: list):
+    def download_several_tracks_features(self, track_ids: list, resume: bool = True):
 
-        # assert input
-        if not isinstance(track_ids, list) or len(track_ids) == 0:
-            self.logger.error(f'expected a valid non empty list, but found {track_ids} of type {type(track_ids)}')
-            raise ValueError(f'expected a valid non empty list, but found {track_ids} of type {type(track_ids)}')
-
-        # clear all containers.
-        self._clear_containers()
+        # download and save data.
+        self._download_and_save_several(
+            endpoint=SpotifyTrackEndpoints.GET_SEVERAL_TRACKS_AUDIO_FEATURES, folder='spot-track-audio-features',
+            node='audio_features', track_ids=track_ids, resume=resume,
+            completed_message="tracks' audio features download completed"
+        )
 
-        # download data.
-        n_chunks: int = ceil(len(track_ids) / 50)
-        for index, chunk in enumerate(chunks(track_ids, 50)):
-            # logger.
-            self.logger.info(f'iterating chunk {index + 1} of {n_chunks}')
-            # get data.
-            self._download_multiple(
-                data_id=SpotifyTrackEndpoints.GET_SEVERAL_TRACKS_AUDIO_FEATURES.name,
-                endpoint=SpotifyTrackEndpoints.GET_SEVERAL_TRACKS_AUDIO_FEATURES.value,
-                ids=chunk
-            )
-            # avoid flooding.
-            sleep(1)
+    def download_audio_analysis(self, track_id: str, resume: bool = True):
 
-        # if data was downloaded, save data.
-        if len(self.data_container) > 0:
-            # iterate container.
-            time_signature = int(time())
-            for index, data in enumerate(self.data_container):
-                # save to .json file.
-                self._save_json_to_file(
-                    output_path=[
-                        self._base_path, self._output_path, 'spot-track-audio-features', f'{time_signature}-{index}'
-                    ],
-                    data=data
-                )
-            # logger.
-            self.logger.info("tracks' audio features download completed")
-        else:
+        # download and save data.
+        if self._download_and_save_single(
+            endpoint=SpotifyTrackEndpoints.GET_TRACK_AUDIO_ANALYSIS, folder='spot-track-audio-analysis',
+            track_id=track_id, resume=resume
+        ):
             # logger.
-            self.logger.error('no data was downloaded')
+            self.logger.info('track audio analysis data download completed')
 
-    def download_audio_analysis(self, track_id: str):
+    def download_several_audio_analyses(self, track_ids: list, workers: int = None, resume: bool = True,
+                                        progress_every: int = 25):
+        """
+        Downloads the audio analysis of several tracks through a bounded pool of workers sharing the instance's
+        rate limiter. Each analysis is saved as soon as it arrives.
+        :param track_ids: list - track ids to download.
+        :param workers: int - max amount of requests in flight, defaults to the instance's max_concurrency.
+        :param resume: bool - skip ids fetched or not found by previous runs.
+        :param progress_every: int - amount of completed ids between progress reports.
+        :return: None
+        """
 
         # assert input
-        if not isinstance(track_id, str) or len(track_id) == 0:
-            self.logger.error(f'expected a valid non empty string, but found {track_id} of type {type(track_id)}')
-            raise ValueError(f'expected a valid non empty string, but found {track_id} of type {type(track_id)}')
-
-        # clear all containers.
-        self._clear_containers()
+        if not isinstance(track_ids, list) or len(track_ids) == 0:
+            self.logger.error(f'expected a valid non empty list, but found {track_ids} of type {type(track_ids)}')
+            raise ValueError(f'expected a valid non empty list, but found {track_ids} of type {type(track_ids)}')
+        workers = self._max_concurrency if workers is None else workers
+        if not isinstance(workers, int) or workers < 1:
+            self.logger.error(f'expected a positive integer, but found {workers} of type {type(workers)}')
+            raise ValueError(f'expected a positive integer, but found {workers} of type {type(workers)}')
+        if not isinstance(progress_every, int) or progress_every < 1:
+            self.logger.error(f'expected a positive integer, but found {progress_every} of type {type(progress_every)}')
+            raise ValueError(f'expected a positive integer, but found {progress_every} of type {type(progress_every)}')
+        if workers > self.transport.pool_maxsize:
+            self.logger.info(f'{workers} workers exceed the {self.transport.pool_maxsize} pooled connections per '
+                             f'host, extra connections will not be reused')
+
+        # only fetch the ids missing from previous runs.
+        endpoint = SpotifyTrackEndpoints.GET_TRACK_AUDIO_ANALYSIS
+        folder = 'spot-track-audio-analysis'
+        manifest = self.manifest(folder=folder)
+        # duplicated ids would be downloaded concurrently into the same file.
+        track_ids = list(dict.fromkeys(track_ids))
+        pending = manifest.pending(ids=track_ids) if resume else track_ids
+
+        # logger.
+        self.logger.info(f'{len(pending)} of {len(track_ids)} audio analyses pending, using {workers} workers at '
+                         f'{self._rate_limiter.rate:.2f} requests per second')
+
+        # nothing left to do.
+        if len(pending) == 0:
+            return
+
+        def fetch(track_id: str) -> tuple:
+            try:
+                status_code, record = self._request_single(data_id=endpoint.name, endpoint=endpoint.value, id=track_id)
+            except requests.exceptions.RequestException as e:
+                self.logger.error(f'audio analysis for id {track_id} could not be downloaded: {e}')
+                return track_id, None, None
+            return track_id, status_code, record
 
         # download data.
-        self._download_single(
-            data_id=SpotifyTrackEndpoints.GET_TRACK_AUDIO_ANALYSIS.name,
-            endpoint=SpotifyTrackEndpoints.GET_TRACK_AUDIO_ANALYSIS.value,
-            id=track_id
-        )
-
-        # if data was downloaded, save data.
-        if len(self.data_container) > 0:
-            # save to .json file.
-            self._save_json_to_file(
-                output_path=[self._base_path, self._output_path, 'spot-track-audio-analysis', track_id],
-                data=self.data_container.pop()
-            )
-            # logger.
-            self.logger.info('track audio analysis data download completed')
-        else:
-            self.logger.error('no data was downloaded')
+        counters: dict = {DownloadManifest.FETCHED: 0, DownloadManifest.NOT_FOUND: 0, DownloadManifest.FAILED: 0}
+        started = monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fetch, track_id) for track_id in pending]
+            for done, future in enumerate(as_completed(futures), start=1):
+                track_id, status_code, record = future.result()
+                # save to .json file as soon as it arrives.
+                if record is not None:
+                    self._save_json_to_file(output_path=[self._base_path, self._output_path, folder, track_id],
+                                            data=record)
+                    status = DownloadManifest.FETCHED
+                elif status_code == 404:
+                    status = DownloadManifest.NOT_FOUND
+                else:
+                    status = DownloadManifest.FAILED
+                # checkpoint.
+                manifest.mark(ids=[track_id], status=status)
+                counters[status] += 1
+                # report progress and throughput.
+                if done % progress_every == 0 or done == len(pending):
+                    elapsed = monotonic() - started
+                    rate = done / elapsed if elapsed > 0 else 0.0
+                    eta = (len(pending) - done) / rate if rate > 0 else 0.0
+                    self.logger.info(
+                        f'audio analyses {done} of {len(pending)} ({100 * done / len(pending):.1f}%) - '
+                        f'{rate:.2f} ids/s - eta {eta:.0f}s - {counters[DownloadManifest.FETCHED]} fetched, '
+                        f'{counters[DownloadManifest.NOT_FOUND]} not found, {counters[DownloadManifest.FAILED]} failed'
+                    )
+
+        # logger.
+        self.log_transport_stats()
+        self.logger.info('audio analyses download completed')
 
 
 if __name__ == '__main__':
@@ -204,6 +287,8 @@ if __name__ == '__main__':
 
     # get new instance.
     spot_tracks = SpotifyTracksApi(output_path=['data', 'raw'])
+    # # get new instance which downloads chunks concurrently.
+    # spot_tracks = SpotifyTracksApi(output_path=['data', 'raw'], asynchronous=True, max_concurrency=8, rate_limit=5)
     # # get single track's data.
     # spot_tracks.download_track(track_id='5aAx2yezTd8zXrkmtKl66Z')
     # # get multiple tracks' data.
@@ -212,7 +297,7 @@ if __name__ == '__main__':
     # spot_tracks.download_track_features(track_id='5aAx2yezTd8zXrkmtKl66Z')
     # # get multiple tracks' audio features.
     # spot_tracks.download_several_tracks_features(track_ids=track_ids)
-    # get single track's audio analysis
-    for track in track_ids:
-        spot_tracks.download_audio_analysis(track_id=track)
-        sleep(2)
+    # # get single track's audio analysis.
+    # spot_tracks.download_audio_analysis(track_id='5aAx2yezTd8zXrkmtKl66Z')
+    # get multiple tracks' audio analysis, ids fetched by previous runs are skipped.
+    spot_tracks.download_several_audio_analyses(track_ids=track_ids, workers=8)
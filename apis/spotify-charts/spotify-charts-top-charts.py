@@ -4,9 +4,11 @@ import backoff
 import requests
 
 from datetime import datetime as dt
+from functools import partial
 from time import sleep
 
 from utils.api import Api
+from utils.crawler import Crawler, HostPolicy, crawl_job, retry_pacing
 
 
 class SpotifyChartsDownloader(Api):
@@ -18,13 +20,21 @@ class SpotifyChartsDownloader(Api):
         "ru", "sg", "sv", "tr", "ua", "vn"
     ]
 
-    def __init__(self, system_logger: bool = False):
+    # seconds a week that has not closed yet stays fresh in the response cache, closed weeks never change.
+    cache_ttl_open_week = 1 * 3600
+
+    # politeness towards spotifycharts.com while crawling.
+    host = 'spotifycharts.com'
+    host_policy = HostPolicy(max_concurrency=2, min_interval=1.0)
+
+    def __init__(self, system_logger: bool = False, output_path: list = None):
 
         # initialise superclass.
         super().__init__()
 
-        # base path.
+        # paths.
         self._base_path = os.path.split(os.path.split(os.path.split(os.path.realpath(__file__))[0])[0])[0]
+        self._output_path: str = os.path.join(*(output_path or ['data', 'raw']))
 
         # initialise logger.
         self._init_logger(logger_name='SPOT-WKLY', file_name=f'RUN {dt.now()}', system_logger=system_logger)
@@ -54,23 +64,107 @@ class SpotifyChartsDownloader(Api):
         for index, week in enumerate(weeks):
             # logger.
             self.logger.info(f'iterating week {week} - {index+1} of {len(weeks)}')
-            # perform data download.
-            self._download_weekly_charts(week=week, region=region)
-            # avoid flooding.
-            sleep(1)
+            # perform data download, moving on to the next week when it keeps failing.
+            try:
+                from_cache: bool = self._download_weekly_charts(week=week, region=region)
+            except requests.exceptions.RequestException:
+                self.logger.error(f'aborting download for week {week}')
+                from_cache = False
+            # avoid flooding, unless the server was not reached.
+            if not from_cache:
+                sleep(1)
 
         # logger.
         self.logger.info(f'weekly data download completed')
+        self.log_transport_stats()
+
+    def weekly_charts_jobs(self, weeks: list, regions: list = None) -> list:
+        """
+        Builds one crawl job per region and week, to be run by a Crawler alone or along jobs of other hosts.
+        :param weeks: list - weeks formatted as YYYY-MM-DD--YYYY-MM-DD.
+        :param regions: list - regions to download, defaults to every available region.
+        :return: list - CrawlJob instances, week by week so every region of a week is fetched together.
+        """
+
+        # assert weeks input.
+        if not isinstance(weeks, list) or len(weeks) == 0:
+            self.logger.error(f'expected a valid non empty list, but found {weeks} of type {type(weeks)}')
+            raise ValueError(f'expected a valid non empty list, but found {weeks} of type {type(weeks)}')
+
+        # assert regions input.
+        regions = self.regions if regions is None else regions
+        if not isinstance(regions, list) or len(regions) == 0:
+            self.logger.error(f'expected a valid non empty list, but found {regions} of type {type(regions)}')
+            raise ValueError(f'expected a valid non empty list, but found {regions} of type {type(regions)}')
+        for region in regions:
+            if region not in self.regions:
+                self.logger.error(f'the region value specified {region} is not allowed')
+                raise ValueError(f'the region value specified {region} is not allowed')
+
+        return [
+            crawl_job(
+                url=self._weekly_charts_url(week=week, region=region), key=f'{region}_{week}',
+                task=partial(self._download_weekly_charts, week=week, region=region)
+            )
+            for week in weeks for region in regions
+        ]
+
+    def crawl_weekly_charts(self, weeks: list, regions: list = None, max_concurrency: int = 4):
+        """
+        Downloads every region and week through a polite concurrent crawler instead of a serial loop.
+        :param weeks: list - weeks formatted as YYYY-MM-DD--YYYY-MM-DD.
+        :param regions: list - regions to download, defaults to every available region.
+        :param max_concurrency: int - max amount of requests in flight.
+        :return: dict - amount of completed and failed jobs.
+        """
+
+        # build jobs.
+        jobs: list = self.weekly_charts_jobs(weeks=weeks, regions=regions)
+
+        # crawl.
+        crawler = Crawler(
+            max_concurrency=max_concurrency, policies={self.host: self.host_policy}, logger=self.logger
+        )
+        counters: dict = crawler.crawl(jobs=jobs)
 
-    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=5)
+        # logger.
+        self.logger.info('weekly data crawl completed')
+        self.log_transport_stats()
+
+        return counters
+
+    def _week_cache_ttl(self, week: str):
+        """
+        Resolves the cache policy of a week.
+        :param week: str - week formatted as YYYY-MM-DD--YYYY-MM-DD.
+        :return: float or None - None for closed weeks, which never change.
+        """
+
+        # closed weeks are immutable.
+        try:
+            if dt.strptime(week.split('--')[1], '%Y-%m-%d') < dt.now():
+                return None
+        except (IndexError, ValueError):
+            self.logger.error(f'could not parse week {week}, caching it as an open week')
+
+        return self.cache_ttl_open_week
+
+    @staticmethod
+    def _weekly_charts_url(week: str, region: str) -> str:
+
+        return f'https://spotifycharts.com/regional/{region}/weekly/{week}/download'
+
+    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=5,
+                          on_backoff=retry_pacing(host=host))
     def _download_weekly_charts(self, week: str, region: str):
 
-        # perform api
-        r = requests.get(
-            url=f'https://spotifycharts.com/regional/{region}/weekly/{week}/download',
+        # perform api, through the response cache when enabled.
+        r = self._cached_get(
+            url=self._weekly_charts_url(week=week, region=region),
+            ttl=self._week_cache_ttl(week=week),
             headers={
                 'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9',
-                'accept-encoding': 'gzip, deflate, br',
+                'accept-encoding': 'gzip, deflate',
                 'accept-language': 'en-US;q=0.5',
                 'referer': f'https://spotifycharts.com/regional/ar/weekly/{week}',
                 'sec-fetch-dest': 'document',
@@ -85,15 +179,17 @@ class SpotifyChartsDownloader(Api):
         if not r.ok:
             # log error.
             self.logger.error(f'endpoint responded with status code {r.status_code}')
-            return
+            raise requests.exceptions.RequestException(f'endpoint responded with status code {r.status_code}')
 
         # save data to filesystem.
         super()._save_text_to_file(
-            output_path=[self._base_path, 'data', 'raw', 'spotify-charts-weekly-top-charts', f'{region}_{week}'],
+            output_path=[self._base_path, self._output_path, 'spotify-charts-weekly-top-charts', f'{region}_{week}'],
             data=r.text,
             extension='csv'
         )
 
+        return getattr(r, 'from_cache', False)
+
 
 if __name__ == '__main__':
 
@@ -207,8 +303,14 @@ if __name__ == '__main__':
         "2016-12-23--2016-12-30"
     ]
 
+    # # reuse previously downloaded weeks, closed weeks are never downloaded again.
+    # SpotifyChartsDownloader.configure_cache(cache_path=os.path.join('data', 'cache', 'http'))
+
     # create a new downloader object.
     wd = SpotifyChartsDownloader(system_logger=False)
 
     # download weekly top charts.
     wd.download_weekly_charts(weeks=weeks, region='global')
+
+    # # download every region and week concurrently, politely towards spotifycharts.com.
+    # wd.crawl_weekly_charts(weeks=weeks, regions=SpotifyChartsDownloader.regions)
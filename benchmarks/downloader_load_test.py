@@ -0,0 +1,754 @@
+import json
+import random
+import secrets
+import threading
+
+from contextlib import redirect_stdout
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from importlib.util import spec_from_file_location, module_from_spec
+from multiprocessing import get_context, Pipe
+from os import makedirs, listdir, devnull
+from os.path import join as os_path_join, split as os_split_path, realpath
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter, monotonic, sleep
+from urllib.parse import urlsplit, urlunsplit, parse_qs
+
+import requests
+
+from benchmarks import synthetic
+from utils.api import Api
+from utils.crawler import HostPolicy, crawl_downloaders
+from utils.logger import InMemoryLogger
+from utils.transport import HttpTransport
+
+
+# project base path.
+base_path: str = os_split_path(os_split_path(realpath(__file__))[0])[0]
+
+# hosts served by the stand-in server.
+stand_in_hosts = ('accounts.spotify.com', 'api.spotify.com', 'kworb.net', 'spotifycharts.com')
+
+# downloader module per benchmarked downloader, they live in hyphenated files that cannot be imported by name.
+downloader_modules = {
+    'spot': (os_path_join(base_path, 'apis', 'spot', 'spot-tracks.py'), 'SpotifyTracksApi'),
+    'kworb': (os_path_join(base_path, 'apis', 'kworb', 'kworb-charts.py'), 'KworbChartsApi'),
+    'charts': (os_path_join(base_path, 'apis', 'spotify-charts', 'spotify-charts-top-charts.py'),
+               'SpotifyChartsDownloader')
+}
+
+
+class Faults:
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 1,
+                 error_rate: float = 0.0, token_ttl: float = None, seed: int = 0):
+        """
+        Misbehaviour injected by the stand-in server, every fault is drawn independently per request.
+        :param latency: float - seconds every response is held back.
+        :param jitter: float - max extra seconds added to latency, uniformly drawn.
+        :param throttle_rate: float - share of requests answered with 429 and a Retry-After header.
+        :param retry_after: int - seconds sent in the Retry-After header.
+        :param error_rate: float - share of requests answered with 500, 502 or 503.
+        :param token_ttl: float - seconds an access token is accepted, while still being issued with a one hour
+        expires_in, so that tokens expire early and are answered with 401. Tokens never expire when None.
+        :param seed: int - random seed of the injected faults.
+        """
+
+        # assert input.
+        for name, value in (('latency', latency), ('jitter', jitter)):
+            if not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f'expected a non negative number for {name}, but found {value} of type {type(value)}')
+        for name, value in (('throttle_rate', throttle_rate), ('error_rate', error_rate)):
+            if not isinstance(value, (int, float)) or not 0 <= value <= 1:
+                raise ValueError(f'expected a number between 0 and 1 for {name}, but found {value} of type '
+                                 f'{type(value)}')
+        if not isinstance(retry_after, int) or retry_after < 0:
+            raise ValueError(f'expected a non negative integer, but found {retry_after} of type {type(retry_after)}')
+        if token_ttl is not None and (not isinstance(token_ttl, (int, float)) or token_ttl <= 0):
+            raise ValueError(f'expected a positive number, but found {token_ttl} of type {type(token_ttl)}')
+
+        self.latency: float = float(latency)
+        self.jitter: float = float(jitter)
+        self.throttle_rate: float = float(throttle_rate)
+        self.retry_after: int = retry_after
+        self.error_rate: float = float(error_rate)
+        self.token_ttl: float = token_ttl
+        self.seed: int = seed
+
+
+class StandInServer:
+
+    # audio features and tracks batch routes, to the record node holding the endpoint's response.
+    batch_routes = {'/v1/audio-features': 'audio_features', '/v1/tracks': 'tracks'}
+
+    def __init__(self, faults: Faults = None, n_segments: int = 500, host: str = '127.0.0.1', port: int = 0):
+        """
+        Local stand-in for the SPOT token, tracks, audio features and audio analysis endpoints, kworb pages and
+        weekly chart downloads, serving deterministic synthetic payloads while injecting latency, throttling,
+        token expiry and server errors.
+        :param faults: Faults - misbehaviour to inject, none when None.
+        :param n_segments: int - segments per audio analysis, which dominate its size.
+        :param host: str - interface to bind.
+        :param port: int - port to bind, a free one is picked when 0.
+        """
+
+        # settings.
+        self.faults: Faults = faults or Faults()
+        self._n_segments: int = n_segments
+        self._rnd = random.Random(self.faults.seed)
+
+        # track pool charts are drawn from.
+        pool_rnd = random.Random(self.faults.seed)
+        self._track_pool: list = [synthetic.spot_id(pool_rnd) for _ in range(1000)]
+
+        # issued access tokens and the time they were issued at.
+        self._tokens: dict = dict()
+        # rendered bodies per path, payloads are deterministic.
+        self._bodies: dict = dict()
+        # served responses per status and injected faults.
+        self._counters: dict = dict()
+
+        # lock shared by the handler threads.
+        self._lock = threading.Lock()
+
+        # server, started on demand.
+        self._server = ThreadingHTTPServer((host, port), _handler(server=self))
+        self._server.daemon_threads = True
+        self._thread: threading.Thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        Getter for property url.
+        :return: str
+        """
+
+        host, port = self._server.server_address[:2]
+
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """
+        Serves requests on a background thread.
+        :return: StandInServer
+        """
+
+        self._thread = threading.Thread(target=self.serve, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def serve(self) -> None:
+        """
+        Serves requests on the calling thread until the server is stopped.
+        :return: None
+        """
+
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        self.stop()
+
+    def stats(self) -> dict:
+        """
+        Responses served per status, along with the faults injected.
+        :return: dict
+        """
+
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self) -> None:
+
+        with self._lock:
+            self._counters.clear()
+
+    def _count(self, key: str) -> None:
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def _draw(self) -> tuple:
+        """
+        Draws the faults of a single request.
+        :return: tuple - seconds to hold the response back, whether it is throttled and whether it errors.
+        """
+
+        faults = self.faults
+        with self._lock:
+            delay = faults.latency + (self._rnd.uniform(0, faults.jitter) if faults.jitter > 0 else 0.0)
+            throttled = self._rnd.random() < faults.throttle_rate
+            error = self._rnd.choice((500, 502, 503)) if self._rnd.random() < faults.error_rate else None
+
+        return delay, throttled, error
+
+    def respond(self, method: str, path: str, query: dict, headers) -> tuple:
+        """
+        Builds the response of a request.
+        :param method: str - HTTP method.
+        :param path: str - request path.
+        :param query: dict - query string parameters.
+        :param headers: request headers.
+        :return: tuple - status, response headers and body bytes.
+        """
+
+        # counters, read by the load test driver when the server runs in a process of its own.
+        if path == '/stand-in/stats':
+            return 200, {'Content-Type': 'application/json'}, json.dumps(self.stats()).encode('utf-8')
+
+        # every response is held back, faults do not apply to the token endpoint so that a run can always start.
+        delay, throttled, error = self._draw()
+        if delay > 0:
+            sleep(delay)
+        if method == 'POST' and path == '/api/token':
+            return self._issue_token()
+        if method != 'GET':
+            return 405, {}, b''
+
+        # SPOT endpoints reject unknown and expired tokens.
+        if path.startswith('/v1/') and not self._is_valid(headers.get('Authorization', '')):
+            self._count('expired')
+            return 401, {'Content-Type': 'application/json'}, \
+                b'{"error": {"status": 401, "message": "The access token expired"}}'
+
+        # injected faults.
+        if throttled:
+            self._count('throttled')
+            return 429, {'Retry-After': str(self.faults.retry_after)}, b''
+        if error is not None:
+            self._count('errors')
+            return error, {}, b''
+
+        # payload, audio analyses do not hold their track id so a single one is rendered and served for every track.
+        key = '/v1/audio-analysis' if path.startswith('/v1/audio-analysis/') else \
+            f'{path}?{",".join(query.get("ids", []))}'
+        with self._lock:
+            body = self._bodies.get(key)
+        if body is None:
+            body = self._render(path=path, ids=query.get('ids', []))
+            if body is None:
+                return 404, {}, b''
+            with self._lock:
+                self._bodies[key] = body
+
+        return 200, {'Content-Type': body[0]}, body[1]
+
+    def _issue_token(self) -> tuple:
+
+        token = secrets.token_hex(20)
+        with self._lock:
+            self._tokens[token] = monotonic()
+        self._count('tokens')
+
+        return 200, {'Content-Type': 'application/json'}, json.dumps(
+            {'access_token': token, 'token_type': 'Bearer', 'expires_in': 3600}
+        ).encode('utf-8')
+
+    def _is_valid(self, authorization: str) -> bool:
+
+        with self._lock:
+            issued_at = self._tokens.get(authorization.replace('Bearer ', '', 1))
+        if issued_at is None:
+            return False
+
+        return self.faults.token_ttl is None or monotonic() - issued_at < self.faults.token_ttl
+
+    def _render(self, path: str, ids: list):
+        """
+        Renders the payload of a path.
+        :param path: str - request path.
+        :param ids: list - ids of batch requests.
+        :return: tuple - content type and body bytes, None for unknown paths.
+        """
+
+        parts = path.strip('/').split('/')
+
+        # SPOT batch endpoints.
+        if path in self.batch_routes and ids:
+            builder = synthetic.audio_features_document if path == '/v1/audio-features' \
+                else synthetic.track_data_document
+            return 'application/json', json.dumps(builder(track_ids=ids, seed=','.join(ids))['raw_data']).encode()
+
+        # SPOT single endpoints.
+        if len(parts) == 3 and parts[0] == 'v1':
+            if parts[1] == 'audio-analysis':
+                document = synthetic.audio_analysis_document(track_id=parts[2], n_segments=self._n_segments,
+                                                             seed=self.faults.seed)
+                return 'application/json', json.dumps(document['raw_data']).encode()
+            if f'/v1/{parts[1]}' in self.batch_routes:
+                builder = synthetic.audio_features_document if parts[1] == 'audio-features' \
+                    else synthetic.track_data_document
+                document = builder(track_ids=[parts[2]], seed=parts[2])['raw_data']
+                return 'application/json', json.dumps(document[self.batch_routes[f'/v1/{parts[1]}']][0]).encode()
+
+        # kworb track, artist and region pages.
+        if len(parts) == 3 and parts[0] == 'spotify' and parts[2].endswith('.html'):
+            return 'text/html; charset=utf-8', self._kworb_page(kind=parts[1], name=parts[2][:-5]).encode('utf-8')
+
+        # weekly charts downloads.
+        if len(parts) == 5 and parts[0] == 'regional' and parts[4] == 'download':
+            return 'text/csv; charset=utf-8', synthetic.weekly_chart_text(
+                track_ids=self._track_pool, rows=200, seed=f'{parts[1]}_{parts[3]}'
+            ).encode('utf-8')
+
+        return None
+
+    @staticmethod
+    def _kworb_page(kind: str, name: str) -> str:
+
+        # random values.
+        rnd = random.Random(name)
+
+        # region totals, one row per track linking its artist and track pages.
+        if kind == 'country':
+            rows = ''.join([
+                f'<tr><td>{index + 1}</td>'
+                f'<td class="text mp"><div><a href="../artist/{synthetic.spot_id(rnd)}.html">Artist {index}</a>'
+                f' - <a href="../track/{synthetic.spot_id(rnd)}.html">Title {index}</a></div></td>'
+                f'<td>{rnd.randint(1, 150)}</td><td>{rnd.randint(0, 40)}</td><td>{rnd.randint(1, 200)}</td>'
+                f'<td>(x{rnd.randint(1, 10)})</td><td>{rnd.randint(10000, 9000000):,}</td>'
+                f'<td>{rnd.randint(100000, 900000000):,}</td></tr>'
+                for index in range(200)
+            ])
+            return f'<html><head><title>{name}</title></head><body><table class="sortable"><thead><tr>' \
+                   f'<th>Pos</th><th>Artist and Title</th><th>Wks</th><th>T10</th><th>Pk</th><th>(x?)</th>' \
+                   f'<th>PkStreams</th><th>Total</th></tr></thead><tbody>{rows}</tbody></table></body></html>'
+
+        # artist songs and their totals.
+        if kind == 'artist':
+            rows = ''.join([
+                f'<tr><td class="text"><div><a href="../track/{synthetic.spot_id(rnd)}.html">Title {index}</a></div>'
+                f'</td><td>{rnd.randint(100000, 900000000):,}</td><td>{rnd.randint(0, 900000):,}</td></tr>'
+                for index in range(rnd.randint(5, 60))
+            ])
+            return f'<html><head><title>{name}</title></head><body><table class="sortable"><thead><tr>' \
+                   f'<th>Song Title</th><th>Streams</th><th>Daily</th></tr></thead><tbody>{rows}</tbody></table>' \
+                   f'</body></html>'
+
+        # track chart history, a date column followed by one column per region, holding the position and, where
+        # known, its streams, or nothing when the track did not chart there that week.
+        def cell() -> str:
+            draw = rnd.random()
+            if draw < 0.6:
+                return f'<td>{rnd.randint(1, 200)} ({rnd.randint(10000, 2000000):,})</td>'
+            return f'<td>{rnd.randint(1, 200)}</td>' if draw < 0.8 else '<td>--</td>'
+
+        regions = ['Global'] + sorted(rnd.sample(['US', 'GB', 'DE', 'BR', 'AR', 'MX', 'ES', 'FR', 'IT', 'JP'], 5))
+        rows = ''.join([
+            f'<tr><td>2020/{1 + week // 4:02}/{1 + 7 * (week % 4):02}</td>{"".join([cell() for _ in regions])}</tr>'
+            for week in range(rnd.randint(10, 48))
+        ])
+
+        return f'<html><head><title>{name}</title></head><body><table><thead><tr><th>Date</th>' \
+               f'{"".join([f"<th>{region}</th>" for region in regions])}</tr></thead><tbody>{rows}</tbody></table>' \
+               f'</body></html>'
+
+
+def _serve(faults: Faults, n_segments: int, connection) -> None:
+    """
+    Runs a stand-in server until the process is terminated. Module level function so that it runs in a process of
+    its own, where rendering payloads does not compete with the downloaders being measured for the GIL.
+    :param faults: Faults - misbehaviour to inject.
+    :param n_segments: int - segments per audio analysis.
+    :param connection: multiprocessing connection the server url is sent through once listening.
+    :return: None
+    """
+
+    server = StandInServer(faults=faults, n_segments=n_segments)
+    connection.send(server.url)
+    server.serve()
+
+
+def _handler(server: StandInServer) -> type:
+
+    class StandInHandler(BaseHTTPRequestHandler):
+
+        # keep-alive connections, headers and body are written apart so nagle would delay every response.
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def _reply(self, method: str) -> None:
+            # request body, e.g. token form data, is not used.
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            url = urlsplit(self.path)
+            query = {key: ','.join(values).split(',') for key, values in parse_qs(url.query).items()}
+            status, headers, body = server.respond(method=method, path=url.path, query=query, headers=self.headers)
+            server._count(str(status))
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply(method='GET')
+
+        def do_POST(self):
+            self._reply(method='POST')
+
+        def log_message(self, format, *args):
+            # requests are not logged, responses are counted by stats.
+            pass
+
+    return StandInHandler
+
+
+class StandInTransport(HttpTransport):
+
+    def __init__(self, target: str, hosts: tuple = stand_in_hosts, **kwargs):
+        """
+        HTTP transport sending every request to the listed hosts to a stand-in server instead, timing each one.
+        :param target: str - stand-in server url, e.g. http://127.0.0.1:8000.
+        :param hosts: tuple - hosts redirected towards the stand-in server.
+        :param kwargs: keyword arguments accepted by HttpTransport.
+        """
+
+        # initialise superclass.
+        super().__init__(**kwargs)
+
+        # settings.
+        self._target = urlsplit(target)
+        self._hosts: tuple = hosts
+
+        # (host, status, seconds) per request, status is None when no response was received.
+        self.samples: list = list()
+        self._samples_lock = threading.Lock()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+
+        # redirect.
+        parts = urlsplit(url)
+        if parts.netloc in self._hosts:
+            url = urlunsplit((self._target.scheme, self._target.netloc, parts.path, parts.query, parts.fragment))
+
+        # perform and time request.
+        start = perf_counter()
+        try:
+            r = super().request(method=method, url=url, **kwargs)
+        except requests.exceptions.RequestException:
+            with self._samples_lock:
+                self.samples.append((parts.netloc, None, perf_counter() - start))
+            raise
+        with self._samples_lock:
+            self.samples.append((parts.netloc, r.status_code, perf_counter() - start))
+
+        return r
+
+
+def _load_downloader(name: str, environment: dict, attributes: dict = None) -> type:
+    """
+    Loads a benchmarked downloader class from its file, subclassed so that it reads its environment from the
+    given dict instead of the .env file.
+    :param name: str - downloader key in downloader_modules.
+    :param environment: dict - environment the downloader is initialised with.
+    :param attributes: dict - class attributes overridden, e.g. host_policy.
+    :return: type
+    """
+
+    file, class_name = downloader_modules[name]
+    spec = spec_from_file_location(f'benchmarked_{name}_downloader', file)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    cls = getattr(module, class_name)
+
+    return type(f'StandIn{class_name}', (cls,), {'_init_environment': staticmethod(lambda: environment),
+                                                 **(attributes or {})})
+
+
+def _percentile(values: list, q: float) -> float:
+
+    if not values:
+        return 0.0
+
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class DownloaderLoadTest:
+
+    def __init__(self, faults: Faults = None, n_segments: int = 500, rate_limit: float = 50.0,
+                 max_concurrency: int = 8, host_policy: HostPolicy = None, pool_maxsize: int = 16):
+        """
+        Runs the real SPOT, kworb and weekly charts downloaders against a local stand-in server, reporting
+        requests per second, tail latency and wasted requests, i.e. every request answered with 401, 429, 5xx or no
+        response at all, each of which is either retried or loses its page.
+        :param faults: Faults - misbehaviour injected by the stand-in server, none when None.
+        :param n_segments: int - segments per audio analysis.
+        :param rate_limit: float - SPOT downloader requests per second.
+        :param max_concurrency: int - SPOT async requests and crawler requests in flight.
+        :param host_policy: HostPolicy - politeness of the kworb and charts crawlers, their own when None.
+        :param pool_maxsize: int - connections kept alive per host.
+        """
+
+        # initialise logger.
+        self.logger: InMemoryLogger = InMemoryLogger()
+
+        # assert input.
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            self.logger.error(f'expected a positive integer, but found {max_concurrency} of type '
+                              f'{type(max_concurrency)}')
+            raise ValueError(f'expected a positive integer, but found {max_concurrency} of type '
+                             f'{type(max_concurrency)}')
+
+        # settings.
+        self.faults: Faults = faults or Faults()
+        self._n_segments: int = n_segments
+        self._rate_limit: float = rate_limit
+        self._max_concurrency: int = max_concurrency
+        self._host_policy: HostPolicy = host_policy
+        self._pool_maxsize: int = pool_maxsize
+
+    def _scenario(self, name: str, run, folders: list, expected: int) -> dict:
+        """
+        Runs a single scenario against a fresh stand-in server and transport.
+        :param name: str - scenario name.
+        :param run: callable - receives the working folder and the downloader environment, runs the downloader.
+        :param folders: list - folders, relative to the working folder, the downloader saves pages into.
+        :param expected: int - amount of pages the downloader should save.
+        :return: dict - scenario report.
+        """
+
+        # working folder inside the project, downloaders take inner project paths.
+        makedirs(os_path_join(base_path, 'data', 'benchmarks'), exist_ok=True)
+        work_path = mkdtemp(prefix=f'load-test-{name}-', dir=os_path_join(base_path, 'data', 'benchmarks'))
+        for folder in folders:
+            makedirs(os_path_join(work_path, *folder.split('/')), exist_ok=True)
+        # tokens are cached within the working folder, never alongside real ones.
+        environment = {'SPOT_REFRESH_TOKEN': 'stand-in', 'SPOT_CLIENT_ID': 'stand-in',
+                       'SPOT_CLIENT_SECRET': 'stand-in', 'SPOT_TOKEN_CACHE': work_path}
+
+        # stand-in server, in a process of its own.
+        receiver, sender = Pipe(duplex=False)
+        process = get_context('spawn').Process(target=_serve, args=(self.faults, self._n_segments, sender),
+                                               daemon=True)
+        process.start()
+        # wait for the server url, unless the server dies while starting.
+        while not receiver.poll(1):
+            if not process.is_alive():
+                self.logger.error(f'stand-in server exited with code {process.exitcode} before listening')
+                raise ValueError(f'stand-in server exited with code {process.exitcode} before listening')
+        url = receiver.recv()
+
+        # swap the transport shared by every API class.
+        previous = Api._transport
+        transport = StandInTransport(target=url, pool_maxsize=self._pool_maxsize)
+        with Api._transport_lock:
+            Api._transport = transport
+        try:
+            # downloaders log every request, which is not what is being measured.
+            start = perf_counter()
+            with open(devnull, 'w') as log, redirect_stdout(log):
+                run(work_path, environment)
+            seconds = perf_counter() - start
+            saved = sum(len(listdir(os_path_join(work_path, *folder.split('/')))) for folder in folders)
+            injected = requests.get(f'{url}/stand-in/stats', timeout=5).json()
+        finally:
+            with Api._transport_lock:
+                Api._transport = previous
+            transport.close()
+            process.terminate()
+            process.join()
+            rmtree(work_path, ignore_errors=True)
+
+        # report, the token endpoint is left out of throughput and latency.
+        samples = [sample for sample in transport.samples if sample[0] != 'accounts.spotify.com']
+        latencies = sorted([sample[2] * 1000 for sample in samples])
+        statuses: dict = dict()
+        for _, status, _ in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        ok = sum(count for status, count in statuses.items() if status.startswith('2'))
+        report = {
+            'seconds': round(seconds, 3), 'requests': len(samples), 'ok': ok, 'wasted': len(samples) - ok,
+            'requests_per_s': round(len(samples) / seconds, 2), 'ok_per_s': round(ok / seconds, 2),
+            'p50_ms': round(_percentile(latencies, 50), 2), 'p95_ms': round(_percentile(latencies, 95), 2),
+            'p99_ms': round(_percentile(latencies, 99), 2), 'max_ms': round(latencies[-1] if latencies else 0.0, 2),
+            'statuses': statuses, 'tokens': injected.get('tokens', 0),
+            'injected': {key: injected.get(key, 0) for key in ('expired', 'throttled', 'errors')},
+            'saved': saved, 'expected': expected
+        }
+
+        # logger.
+        self.logger.info(
+            f'{name} - {report["requests"]} requests in {seconds:.2f}s, {report["requests_per_s"]} req/s, '
+            f'p50 {report["p50_ms"]} ms, p95 {report["p95_ms"]} ms, p99 {report["p99_ms"]} ms, '
+            f'{report["wasted"]} wasted {statuses}, {report["tokens"]} tokens issued, '
+            f'{saved} of {expected} pages saved'
+        )
+
+        return report
+
+    def spot_tracks(self, track_ids: list, asynchronous: bool = False) -> dict:
+        """
+        Downloads track data in batches of 50 ids.
+        :param track_ids: list - track ids.
+        :param asynchronous: bool - download batches concurrently.
+        :return: dict - scenario report.
+        """
+
+        def run(work_path: str, environment: dict):
+            api = _load_downloader(name='spot', environment=environment)(
+                output_path=[work_path], asynchronous=asynchronous, max_concurrency=self._max_concurrency,
+                rate_limit=self._rate_limit
+            )
+            api.download_several_tracks(track_ids=track_ids, resume=False)
+
+        return self._scenario(name=f'spot_tracks{"_async" if asynchronous else ""}', run=run,
+                              folders=['spot-track-data'], expected=-(-len(track_ids) // 50))
+
+    def spot_audio_features(self, track_ids: list, asynchronous: bool = False) -> dict:
+        """
+        Downloads audio features in batches of 50 ids.
+        :param track_ids: list - track ids.
+        :param asynchronous: bool - download batches concurrently.
+        :return: dict - scenario report.
+        """
+
+        def run(work_path: str, environment: dict):
+            api = _load_downloader(name='spot', environment=environment)(
+                output_path=[work_path], asynchronous=asynchronous, max_concurrency=self._max_concurrency,
+                rate_limit=self._rate_limit
+            )
+            api.download_several_tracks_features(track_ids=track_ids, resume=False)
+
+        return self._scenario(name=f'spot_audio_features{"_async" if asynchronous else ""}', run=run,
+                              folders=['spot-track-audio-features'], expected=-(-len(track_ids) // 50))
+
+    def spot_audio_analyses(self, track_ids: list, workers: int = None) -> dict:
+        """
+        Downloads one audio analysis per track through a pool of workers.
+        :param track_ids: list - track ids.
+        :param workers: int - requests in flight, defaults to max_concurrency.
+        :return: dict - scenario report.
+        """
+
+        def run(work_path: str, environment: dict):
+            api = _load_downloader(name='spot', environment=environment)(
+                output_path=[work_path], max_concurrency=self._max_concurrency, rate_limit=self._rate_limit
+            )
+            api.download_several_audio_analyses(track_ids=track_ids, workers=workers, resume=False)
+
+        return self._scenario(name='spot_audio_analyses', run=run, folders=['spot-track-audio-analysis'],
+                              expected=len(set(track_ids)))
+
+    def kworb_charts(self, track_ids: list, regions: list) -> dict:
+        """
+        Crawls kworb track and region pages.
+        :param track_ids: list - track ids.
+        :param regions: list - regions.
+        :return: dict - scenario report.
+        """
+
+        def run(work_path: str, environment: dict):
+            attributes = {'host_policy': self._host_policy} if self._host_policy is not None else None
+            api = _load_downloader(name='kworb', environment=environment, attributes=attributes)(
+                output_path=[work_path]
+            )
+            api.crawl(jobs=api.track_charts_jobs(track_ids=track_ids) + api.global_charts_jobs(regions=regions),
+                      max_concurrency=self._max_concurrency)
+
+        return self._scenario(name='kworb_charts', run=run, folders=['kworb-charts-track', 'kworb-charts-region'],
+                              expected=len(track_ids) + len(regions))
+
+    def weekly_charts(self, weeks: list, regions: list) -> dict:
+        """
+        Crawls weekly chart downloads.
+        :param weeks: list - weeks formatted as YYYY-MM-DD--YYYY-MM-DD.
+        :param regions: list - regions.
+        :return: dict - scenario report.
+        """
+
+        def run(work_path: str, environment: dict):
+            attributes = {'host_policy': self._host_policy} if self._host_policy is not None else None
+            api = _load_downloader(name='charts', environment=environment, attributes=attributes)(
+                output_path=[work_path]
+            )
+            api.crawl_weekly_charts(weeks=weeks, regions=regions, max_concurrency=self._max_concurrency)
+
+        return self._scenario(name='weekly_charts', run=run,
+                              folders=['spotify-charts-weekly-top-charts'],
+                              expected=len(weeks) * len(regions))
+
+    def kworb_and_weekly_charts(self, track_ids: list, weeks: list, regions: list) -> dict:
+        """
+        Crawls kworb track pages and weekly chart downloads side by side with a single crawler.
+        :param track_ids: list - track ids.
+        :param weeks: list - weeks formatted as YYYY-MM-DD--YYYY-MM-DD.
+        :param regions: list - regions.
+        :return: dict - scenario report.
+        """
+
+        def run(work_path: str, environment: dict):
+            attributes = {'host_policy': self._host_policy} if self._host_policy is not None else None
+            kworb = _load_downloader(name='kworb', environment=environment, attributes=attributes)(
+                output_path=[work_path]
+            )
+            charts = _load_downloader(name='charts', environment=environment, attributes=attributes)(
+                output_path=[work_path]
+            )
+            crawl_downloaders(
+                downloaders=[kworb, charts],
+                jobs=kworb.track_charts_jobs(track_ids=track_ids) + charts.weekly_charts_jobs(weeks=weeks,
+                                                                                              regions=regions),
+                max_concurrency=self._max_concurrency
+            )
+
+        return self._scenario(name='kworb_and_weekly_charts', run=run,
+                              folders=['kworb-charts-track', 'spotify-charts-weekly-top-charts'],
+                              expected=len(track_ids) + len(weeks) * len(regions))
+
+    def run(self, n_tracks: int = 500, n_analyses: int = 100, n_weeks: int = 10, regions: list = None,
+            seed: int = 0) -> dict:
+        """
+        Runs every scenario over synthetic ids.
+        :param n_tracks: int - tracks downloaded in batches and crawled on kworb.
+        :param n_analyses: int - audio analyses downloaded.
+        :param n_weeks: int - chart weeks crawled per region.
+        :param regions: list - regions crawled, defaults to global, gb, de and br.
+        :param seed: int - random seed of the ids.
+        :return: dict - scenario name to report.
+        """
+
+        # synthetic ids.
+        rnd = random.Random(seed)
+        track_ids = [synthetic.spot_id(rnd) for _ in range(n_tracks)]
+        regions = ['global', 'gb', 'de', 'br'] if regions is None else regions
+        weeks = [f'{synthetic.date(1577836800 + i * 7 * 86400)}--'
+                 f'{synthetic.date(1577836800 + (i + 1) * 7 * 86400)}' for i in range(n_weeks)]
+
+        return {
+            'spot_tracks': self.spot_tracks(track_ids=track_ids),
+            'spot_tracks_async': self.spot_tracks(track_ids=track_ids, asynchronous=True),
+            'spot_audio_features_async': self.spot_audio_features(track_ids=track_ids, asynchronous=True),
+            'spot_audio_analyses': self.spot_audio_analyses(track_ids=track_ids[:n_analyses]),
+            'kworb_charts': self.kworb_charts(track_ids=track_ids[:n_analyses], regions=regions),
+            'weekly_charts': self.weekly_charts(weeks=weeks, regions=regions),
+            'kworb_and_weekly_charts': self.kworb_and_weekly_charts(track_ids=track_ids[:n_analyses], weeks=weeks,
+                                                                    regions=regions)
+        }
+
+
+if __name__ == '__main__':
+
+    # realistic latency, occasional throttling and server errors, and tokens expiring every 5 seconds.
+    load_test = DownloaderLoadTest(
+        faults=Faults(latency=0.02, jitter=0.03, throttle_rate=0.02, retry_after=1, error_rate=0.02, token_ttl=5),
+        rate_limit=50.0, max_concurrency=8, host_policy=HostPolicy(max_concurrency=4, min_interval=0.0)
+    )
+    load_test.run()
+
+    # # raw throughput against a fault free server.
+    # DownloaderLoadTest(rate_limit=1000.0, max_concurrency=16,
+    #                    host_policy=HostPolicy(max_concurrency=16, min_interval=0.0)).run()
+
+    # # the downloaders' own politeness, with heavy throttling.
+    # DownloaderLoadTest(faults=Faults(latency=0.05, throttle_rate=0.2, retry_after=2)).run(n_tracks=200)
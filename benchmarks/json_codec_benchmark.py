@@ -0,0 +1,134 @@
+import tempfile
+
+from os import path
+from statistics import median
+from time import perf_counter
+
+from benchmarks import synthetic
+from utils.json_codec import JsonCodec, orjson
+from utils.logger import InMemoryLogger
+
+
+class JsonCodecBenchmark:
+
+    def __init__(self, repeat: int = 5):
+        """
+        Measures the per file decode time of every installed JSON backend.
+        :param repeat: int - amount of timed decodes per file and backend, the median is reported.
+        """
+
+        # initialise logger.
+        self.logger: InMemoryLogger = InMemoryLogger()
+
+        # assert input.
+        if not isinstance(repeat, int) or repeat < 1:
+            self.logger.error(f'expected a positive integer, but found {repeat} of type {type(repeat)}')
+            raise ValueError(f'expected a positive integer, but found {repeat} of type {type(repeat)}')
+
+        # settings.
+        self._repeat: int = repeat
+
+    @staticmethod
+    def codecs() -> dict:
+        """
+        Builds one codec per backend variant available on this interpreter.
+        :return: dict - variant name and codec.
+        """
+
+        # stdlib is always available, mmap does not apply to it.
+        codecs = {'json': JsonCodec(backend='json')}
+
+        # orjson reading into a bytes copy and straight from a memory map.
+        if orjson is not None:
+            codecs['orjson'] = JsonCodec(backend='orjson', mmap_threshold=2 ** 62)
+            codecs['orjson+mmap'] = JsonCodec(backend='orjson', mmap_threshold=0)
+
+        return codecs
+
+    @staticmethod
+    def synthetic_audio_analysis(file: str, n_segments: int = 5000, seed: int = 0) -> str:
+        """
+        Writes an audio analysis document shaped like the SPOT endpoint's response.
+        :param file: str - path towards the file to write.
+        :param n_segments: int - amount of segments, which dominate the document size.
+        :param seed: int - random seed.
+        :return: str - file path.
+        """
+
+        # document, shared with the parser benchmark.
+        document = synthetic.audio_analysis_document(track_id='synthetic', n_segments=n_segments, seed=seed)['raw_data']
+
+        # write document.
+        with open(file, 'wb') as f:
+            f.write(JsonCodec(backend='json').dumps(document))
+
+        return file
+
+    def time_file(self, file: str) -> dict:
+        """
+        Times the decoding of a single file with every backend.
+        :param file: str - JSON file.
+        :return: dict - variant name and median seconds per decode.
+        """
+
+        timings = dict()
+        for name, codec in self.codecs().items():
+            # warm up page cache and allocator.
+            codec.load_file(file=file)
+            # timed decodes.
+            samples = list()
+            for _ in range(self._repeat):
+                start = perf_counter()
+                codec.load_file(file=file)
+                samples.append(perf_counter() - start)
+            timings[name] = median(samples)
+
+        return timings
+
+    def run(self, files: list) -> dict:
+        """
+        Times every file and logs one line per file plus the totals.
+        :param files: list - JSON files.
+        :return: dict - file path and timings.
+        """
+
+        results = dict()
+        totals = dict()
+        for file in files:
+            # time file.
+            timings = self.time_file(file=file)
+            results[file] = timings
+            # logger.
+            size = path.getsize(file) / 1024 / 1024
+            detail = ' '.join([f'{name}: {seconds * 1000:.2f} ms' for name, seconds in timings.items()])
+            self.logger.info(f'{path.basename(file)} ({size:.2f} MB) - {detail}')
+            # accumulate.
+            for name, seconds in timings.items():
+                totals[name] = totals.get(name, 0.0) + seconds
+
+        # logger.
+        if totals:
+            baseline = totals.get('json')
+            detail = ' '.join([f'{name}: {seconds * 1000:.2f} ms ({baseline / seconds:.1f}x)'
+                               for name, seconds in totals.items()])
+            self.logger.info(f'total for {len(files)} files - {detail}')
+
+        return results
+
+
+if __name__ == '__main__':
+
+    # create new benchmark object.
+    bench = JsonCodecBenchmark(repeat=5)
+
+    # time synthetic audio analyses of growing size.
+    with tempfile.TemporaryDirectory() as tmp:
+        bench.run(files=[
+            bench.synthetic_audio_analysis(file=path.join(tmp, f'audio-analysis-{n}.json'), n_segments=n)
+            for n in (500, 2000, 8000)
+        ])
+
+    # time the raw files already downloaded.
+    # from os import listdir
+    # raw_path = path.join('data', 'raw', 'spot-track-audio-analysis')
+    # bench.run(files=[path.join(raw_path, f) for f in sorted(listdir(raw_path)) if f.endswith('.json')][:20])
@@ -0,0 +1,464 @@
+import json
+import platform
+import random
+import sys
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from importlib.util import spec_from_file_location, module_from_spec
+from multiprocessing import get_context
+from os import makedirs, replace, getpid, walk, devnull, cpu_count
+from os.path import join as os_path_join, split as os_split_path, realpath, getsize, isfile, relpath
+from shutil import rmtree
+from statistics import median
+from time import perf_counter
+
+from benchmarks import synthetic
+from utils.json_codec import JsonCodec
+from utils.logger import InMemoryLogger
+
+try:
+    import resource
+except ImportError:
+    # peak resident set size is not reported on platforms without getrusage.
+    resource = None
+
+
+# project base path.
+base_path: str = os_split_path(os_split_path(realpath(__file__))[0])[0]
+
+# parser module per benchmarked parser, charts parsers live in hyphenated files that cannot be imported by name.
+parser_modules = {
+    'spot': (os_path_join(base_path, 'parsers', 'spot', 'spot_parser.py'), 'SpotTrackParser'),
+    'charts': (os_path_join(base_path, 'parsers', 'spotify-charts', 'spotify-charts-top-charts.py'),
+               'SpotifyChartsParser')
+}
+
+# benchmarked paths in run order, as (name, parser, method, input folder, output folder, kwargs). consolidation
+# reads what parsing wrote, so every case runs after the ones it depends on. records per second are counted over
+# the raw folder every input folder eventually derives from.
+cases = [
+    ('parse_audio_features_files', 'spot', 'parse_audio_features_files', 'raw-audio-features',
+     'parsed-audio-features', {}),
+    ('consolidate_audio_files_files', 'spot', 'consolidate_audio_files_files', 'parsed-audio-features',
+     'consolidated-audio-features', {'output_file_name': 'consolidated_audio_features', 'incremental': False}),
+    ('parse_track_data_files', 'spot', 'parse_track_data_files', 'raw-track-data', 'parsed-track-data', {}),
+    ('consolidate_track_data_files', 'spot', 'consolidate_track_data_files', 'parsed-track-data',
+     'consolidated-track-data', {'output_file_name': 'consolidated_track_data', 'incremental': False}),
+    ('parse_audio_analysis_files', 'spot', 'parse_audio_analysis_files', 'raw-audio-analysis',
+     'parsed-audio-analysis', {}),
+    ('consolidate_audio_analysis_files', 'spot', 'consolidate_audio_analysis_files', 'parsed-audio-analysis',
+     'consolidated-audio-analysis', {'output_file_name': 'consolidated_audio_analysis', 'incremental': False}),
+    ('parse_and_consolidate_audio_analysis_files', 'spot', 'parse_and_consolidate_audio_analysis_files',
+     'raw-audio-analysis', 'single-pass-audio-analysis', {'output_file_name': 'consolidated_audio_analysis'}),
+    ('parse_audio_analysis_vectors', 'spot', 'parse_audio_analysis_vectors', 'raw-audio-analysis',
+     'vectors-audio-analysis', {'output_file_name': 'audio_analysis'}),
+    ('parse_weekly_files', 'charts', 'parse_weekly_files', 'raw-weekly-charts', 'parsed-weekly-charts', {}),
+    ('consolidate_weekly_files', 'charts', 'consolidate_weekly_files', 'parsed-weekly-charts',
+     'consolidated-weekly-charts', {'output_file_name': 'consolidated_weekly_charts', 'incremental': False}),
+    ('build_chart_stores', 'charts', 'build_chart_stores', 'consolidated-weekly-charts', 'chart-stores', {})
+]
+
+
+def _load_parser(name: str, output_format: str):
+    """
+    Instantiates a benchmarked parser from its file.
+    :param name: str - parser key in parser_modules.
+    :param output_format: str - format of parsed and consolidated tables.
+    :return: Parser
+    """
+
+    file, class_name = parser_modules[name]
+    spec = spec_from_file_location(f'benchmarked_{name}_parser', file)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return getattr(module, class_name)(output_format=output_format)
+
+
+def _peak_rss() -> float:
+    """
+    Peak resident set size of the current process.
+    :return: float - megabytes, None when getrusage is not available.
+    """
+
+    if resource is None:
+        return None
+    # kilobytes on linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_case(parser: str, method: str, output_format: str, kwargs: dict) -> dict:
+    """
+    Times a single parser method call. Module level function so that it runs in a fresh process, which keeps the
+    peak resident set size of every case apart.
+    :param parser: str - parser key in parser_modules.
+    :param method: str - parser method to time.
+    :param output_format: str - format of parsed and consolidated tables.
+    :param kwargs: dict - method keyword arguments.
+    :return: dict - seconds, peak and start resident set size.
+    """
+
+    # parser, imported before measuring.
+    instance = _load_parser(name=parser, output_format=output_format)
+    start_rss = _peak_rss()
+
+    # parsers log every file and track, which is not what is being measured.
+    with open(devnull, 'w') as log, redirect_stdout(log):
+        start = perf_counter()
+        getattr(instance, method)(**kwargs)
+        seconds = perf_counter() - start
+
+    return {'seconds': seconds, 'peak_rss_mb': _peak_rss(), 'start_rss_mb': start_rss}
+
+
+class ParserBenchmark:
+
+    # default volume of a 1x run, multiplied by every scale.
+    volumes = {
+        'audio_features_files': 10, 'audio_features_per_file': 100,
+        'track_data_files': 10, 'tracks_per_file': 50,
+        'audio_analysis_files': 5, 'segments': 1000,
+        'regions': 4, 'weeks': 5, 'chart_rows': 200
+    }
+
+    def __init__(self, scales: tuple = (1, 10), repeat: int = 3, output_format: str = 'csv', seed: int = 0,
+                 baseline_file: list = None):
+        """
+        Times every parse and consolidate path of SpotTrackParser and SpotifyChartsParser over deterministic
+        synthetic inputs, reporting throughput and peak resident set size per path and scale. Results are kept in
+        a JSON baseline, so that regressions show up both in the comparison log and as diffs of the baseline.
+        :param scales: tuple - input volume multipliers, e.g. (1, 10, 100).
+        :param repeat: int - amount of timed runs per case, the median is reported.
+        :param output_format: str - format of parsed and consolidated tables, one of csv, parquet, npy or columnar.
+        :param seed: int - random seed of the synthetic inputs.
+        :param baseline_file: list - inner project path towards the baseline JSON file.
+        """
+
+        # initialise logger.
+        self.logger: InMemoryLogger = InMemoryLogger()
+
+        # assert input.
+        if not isinstance(repeat, int) or repeat < 1:
+            self.logger.error(f'expected a positive integer, but found {repeat} of type {type(repeat)}')
+            raise ValueError(f'expected a positive integer, but found {repeat} of type {type(repeat)}')
+        if not isinstance(scales, (list, tuple)) or len(scales) == 0 or \
+                any(not isinstance(scale, int) or scale < 1 for scale in scales):
+            self.logger.error(f'expected a non empty list of positive integers, but found {scales}')
+            raise ValueError(f'expected a non empty list of positive integers, but found {scales}')
+
+        # settings.
+        self._scales: tuple = tuple(scales)
+        self._repeat: int = repeat
+        self._output_format: str = output_format
+        self._seed: int = seed
+        self._baseline_file: str = os_path_join(
+            base_path, *(baseline_file or ['benchmarks', 'baselines', f'parser_benchmark_{output_format}.json'])
+        )
+
+    @staticmethod
+    def _write_json(file: str, document: dict) -> None:
+
+        with open(file, 'wb') as f:
+            f.write(JsonCodec(backend='json').dumps(document))
+
+    @staticmethod
+    def synthetic_audio_features(file: str, track_ids: list, seed: int = 0) -> str:
+        """
+        Writes a batch audio features file, see synthetic.audio_features_document.
+        :param file: str - path towards the file to write.
+        :param track_ids: list - tracks in the batch.
+        :param seed: int - random seed.
+        :return: str - file path.
+        """
+
+        ParserBenchmark._write_json(file=file, document=synthetic.audio_features_document(track_ids=track_ids,
+                                                                                          seed=seed))
+
+        return file
+
+    @staticmethod
+    def synthetic_track_data(file: str, track_ids: list, seed: int = 0) -> str:
+        """
+        Writes a batch track data file, see synthetic.track_data_document.
+        :param file: str - path towards the file to write.
+        :param track_ids: list - tracks in the batch.
+        :param seed: int - random seed.
+        :return: str - file path.
+        """
+
+        ParserBenchmark._write_json(file=file, document=synthetic.track_data_document(track_ids=track_ids,
+                                                                                      seed=seed))
+
+        return file
+
+    @staticmethod
+    def synthetic_audio_analysis(file: str, track_id: str, n_segments: int = 1000, seed: int = 0) -> str:
+        """
+        Writes an audio analysis file, see synthetic.audio_analysis_document.
+        :param file: str - path towards the file to write.
+        :param track_id: str - analysed track.
+        :param n_segments: int - amount of segments, which dominate the document size.
+        :param seed: int - random seed.
+        :return: str - file path.
+        """
+
+        ParserBenchmark._write_json(file=file, document=synthetic.audio_analysis_document(
+            track_id=track_id, n_segments=n_segments, seed=seed
+        ))
+
+        return file
+
+    @staticmethod
+    def synthetic_weekly_chart(file: str, track_ids: list, rows: int = 200, seed: int = 0) -> str:
+        """
+        Writes a weekly charts CSV file, named {region}_{week}.csv, see synthetic.weekly_chart_text.
+        :param file: str - path towards the file to write.
+        :param track_ids: list - pool of tracks the chart is drawn from.
+        :param rows: int - chart positions.
+        :param seed: int - random seed.
+        :return: str - file path.
+        """
+
+        with open(file, 'w', encoding='utf-8', newline='') as f:
+            f.write(synthetic.weekly_chart_text(track_ids=track_ids, rows=rows, seed=seed))
+
+        return file
+
+    def generate(self, path: str, scale: int) -> dict:
+        """
+        Writes every synthetic input of a scale, the same seed and scale always yield the same files.
+        :param path: str - folder in which the raw input folders are created.
+        :param scale: int - volume multiplier.
+        :return: dict - input folder to amount of records it holds.
+        """
+
+        # random values.
+        rnd = random.Random(f'{self._seed}-{scale}')
+        volumes = self.volumes
+
+        # track pool shared by every input.
+        tracks = [synthetic.spot_id(rnd) for _ in range(volumes['audio_features_per_file'] * 10 * scale)]
+        records: dict = dict()
+
+        # batch audio features.
+        makedirs(os_path_join(path, 'raw-audio-features'), exist_ok=True)
+        for i in range(volumes['audio_features_files'] * scale):
+            self.synthetic_audio_features(
+                file=os_path_join(path, 'raw-audio-features', f'audio_features_{i:05}.json'),
+                track_ids=rnd.sample(tracks, volumes['audio_features_per_file']), seed=rnd.random()
+            )
+        records['raw-audio-features'] = volumes['audio_features_files'] * scale * volumes['audio_features_per_file']
+
+        # batch track data.
+        makedirs(os_path_join(path, 'raw-track-data'), exist_ok=True)
+        for i in range(volumes['track_data_files'] * scale):
+            self.synthetic_track_data(
+                file=os_path_join(path, 'raw-track-data', f'track_data_{i:05}.json'),
+                track_ids=rnd.sample(tracks, volumes['tracks_per_file']), seed=rnd.random()
+            )
+        records['raw-track-data'] = volumes['track_data_files'] * scale * volumes['tracks_per_file']
+
+        # audio analyses, records are segments.
+        makedirs(os_path_join(path, 'raw-audio-analysis'), exist_ok=True)
+        for i, track_id in enumerate(tracks[:volumes['audio_analysis_files'] * scale]):
+            self.synthetic_audio_analysis(
+                file=os_path_join(path, 'raw-audio-analysis', f'{track_id}.json'), track_id=track_id,
+                n_segments=volumes['segments'], seed=rnd.random()
+            )
+        records['raw-audio-analysis'] = volumes['audio_analysis_files'] * scale * volumes['segments']
+
+        # weekly charts, one year of weeks per 10x.
+        makedirs(os_path_join(path, 'raw-weekly-charts'), exist_ok=True)
+        for region in ['global', 'us', 'gb', 'de', 'fr', 'br', 'mx', 'jp'][:volumes['regions']]:
+            for week in range(volumes['weeks'] * scale):
+                date_from = 1577836800 + week * 7 * 86400
+                name = f'{region}_{synthetic.date(date_from)}--{synthetic.date(date_from + 7 * 86400)}.csv'
+                self.synthetic_weekly_chart(file=os_path_join(path, 'raw-weekly-charts', name), track_ids=tracks,
+                                            rows=volumes['chart_rows'], seed=rnd.random())
+        records['raw-weekly-charts'] = volumes['regions'] * volumes['weeks'] * scale * volumes['chart_rows']
+
+        return records
+
+    @staticmethod
+    def _folder_size(path: str) -> int:
+
+        return sum(getsize(os_path_join(root, file)) for root, _, files in walk(path) for file in files)
+
+    def run(self, names: list = None) -> dict:
+        """
+        Generates the inputs of every scale and times every case over them, each run in a fresh process.
+        :param names: list - cases to time, every case when None. Cases read the output of the ones before them,
+        which therefore still run, untimed, when left out.
+        :return: dict - {case}@{scale}x to seconds, MB/s and records/s over the case input, and peak resident set
+        size in MB.
+        """
+
+        # working folder inside the project, parsers take inner project paths.
+        makedirs(os_path_join(base_path, 'data', 'benchmarks'), exist_ok=True)
+        results: dict = dict()
+        for scale in self._scales:
+            work_path = tempfile.mkdtemp(prefix=f'parser-benchmark-{scale}x-', dir=os_path_join(base_path, 'data',
+                                                                                                  'benchmarks'))
+            inner_path = relpath(work_path, base_path).replace('\\', '/').split('/')
+            try:
+                # inputs.
+                self.logger.info(f'generating {scale}x synthetic inputs in {work_path}')
+                records = self.generate(path=work_path, scale=scale)
+                self.logger.info(f'{scale}x inputs generated, '
+                                 f'{self._folder_size(work_path) / 1024 / 1024:.2f} MB in total')
+
+                # cases.
+                for name, parser, method, input_folder, output_folder, kwargs in cases:
+                    # output folders must exist beforehand.
+                    makedirs(os_path_join(work_path, output_folder), exist_ok=True)
+                    kwargs = {'input_files_path': [*inner_path, input_folder],
+                              'output_files_path': [*inner_path, output_folder], **kwargs}
+                    case_records = records['raw-' + input_folder.split('-', 1)[1]]
+                    case_bytes = self._folder_size(os_path_join(work_path, input_folder))
+                    timed = names is None or name in names
+                    samples = [self._spawn(parser=parser, method=method, kwargs=kwargs)
+                               for _ in range(self._repeat if timed else 1)]
+                    if not timed:
+                        continue
+                    # aggregate runs.
+                    seconds = median([sample['seconds'] for sample in samples])
+                    peak = max([sample['peak_rss_mb'] or 0 for sample in samples]) if resource is not None else None
+                    results[f'{name}@{scale}x'] = {
+                        'seconds': round(seconds, 4),
+                        'mb_per_s': round(case_bytes / 1024 / 1024 / seconds, 2),
+                        'records_per_s': round(case_records / seconds, 1),
+                        'peak_rss_mb': round(peak, 1) if peak is not None else None
+                    }
+                    # logger.
+                    self.logger.info(
+                        f'{name}@{scale}x - {seconds * 1000:.1f} ms, '
+                        f'{results[f"{name}@{scale}x"]["mb_per_s"]} MB/s, '
+                        f'{results[f"{name}@{scale}x"]["records_per_s"]} records/s, peak rss {peak} MB'
+                    )
+            finally:
+                # drop inputs and outputs.
+                rmtree(work_path, ignore_errors=True)
+
+        return results
+
+    def _spawn(self, parser: str, method: str, kwargs: dict) -> dict:
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            return executor.submit(_run_case, parser=parser, method=method, output_format=self._output_format,
+                                   kwargs=kwargs).result()
+
+    @staticmethod
+    def host() -> dict:
+        """
+        Describes the machine results are measured on, so that baselines from other machines are recognised.
+        :return: dict - system, machine, cpu model and amount of cpus.
+        """
+
+        # cpu model, platform.processor is empty on most linux distributions.
+        cpu = platform.processor()
+        if isfile('/proc/cpuinfo'):
+            with open('/proc/cpuinfo', 'r', encoding='utf-8', errors='replace') as f:
+                cpu = next((line.split(':', 1)[1].strip() for line in f if line.startswith('model name')), cpu)
+
+        return {'system': platform.system(), 'machine': platform.machine(), 'cpu': cpu, 'cpus': cpu_count()}
+
+    def _read_baseline(self) -> dict:
+
+        if not isfile(self._baseline_file):
+            return dict()
+        with open(self._baseline_file, 'r', encoding='utf-8') as f:
+            return json.loads(f.read())
+
+    def load_baseline(self) -> dict:
+        """
+        Reads the stored baseline.
+        :return: dict - baseline results, empty when there is none.
+        """
+
+        return self._read_baseline().get('results', {})
+
+    def save_baseline(self, results: dict) -> None:
+        """
+        Stores results as the new baseline, merged over the cases of the previous one that were not run. Keys are
+        sorted and values rounded so that the file diffs cleanly.
+        :param results: dict - results of run.
+        :return: None
+        """
+
+        # merge.
+        baseline = {**self.load_baseline(), **results}
+
+        # write baseline atomically.
+        makedirs(os_split_path(self._baseline_file)[0], exist_ok=True)
+        with open(f'{self._baseline_file}.{getpid()}.tmp', 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'output_format': self._output_format, 'python': sys.version.split()[0],
+                                'host': self.host(), 'results': baseline}, indent=2, sort_keys=True))
+            f.write('\n')
+        replace(f'{self._baseline_file}.{getpid()}.tmp', self._baseline_file)
+
+        # logger.
+        self.logger.info(f'{len(results)} results saved to baseline {self._baseline_file}')
+
+    def compare(self, results: dict, threshold: float = 0.15, min_seconds: float = 0.02,
+                min_rss_mb: float = 4.0) -> list:
+        """
+        Compares results against the stored baseline, logging the change of time and peak resident set size per
+        case. A case is only flagged when its change is both relative and absolute, so that cases of a few
+        milliseconds are not flagged on timer and scheduling noise.
+        :param results: dict - results of run.
+        :param threshold: float - relative slowdown or memory growth over which a case is flagged as a regression.
+        :param min_seconds: float - min slowdown in seconds for a case to be flagged.
+        :param min_rss_mb: float - min peak resident set size growth in MB for a case to be flagged.
+        :return: list - regressed case names.
+        """
+
+        # baselines of other machines are compared all the same, but they are told apart.
+        stored = self._read_baseline()
+        baseline = stored.get('results', {})
+        if stored.get('host') != self.host():
+            self.logger.info(f'baseline was measured on {stored.get("host", "an unknown host")}, not on '
+                             f'{self.host()}, differences include the change of machine')
+
+        regressions: list = list()
+        for name, result in results.items():
+            # new case.
+            if name not in baseline:
+                self.logger.info(f'{name} - no baseline')
+                continue
+            # relative and absolute changes.
+            time_delta = result['seconds'] - baseline[name]['seconds']
+            time_change = time_delta / baseline[name]['seconds']
+            rss_delta = result['peak_rss_mb'] - baseline[name]['peak_rss_mb'] \
+                if result.get('peak_rss_mb') and baseline[name].get('peak_rss_mb') else 0.0
+            rss_change = rss_delta / baseline[name]['peak_rss_mb'] if rss_delta else 0.0
+            detail = f'time {time_change * 100:+.1f}% ({time_delta * 1000:+.1f} ms), ' \
+                     f'peak rss {rss_change * 100:+.1f}% ({rss_delta:+.1f} MB)'
+            # logger.
+            if (time_change > threshold and time_delta > min_seconds) or \
+                    (rss_change > threshold and rss_delta > min_rss_mb):
+                regressions.append(name)
+                self.logger.error(f'{name} regressed - {detail}')
+            else:
+                self.logger.info(f'{name} - {detail}')
+
+        return regressions
+
+if __name__ == '__main__':
+
+    # create new benchmark object.
+    bench = ParserBenchmark(scales=(1, 10), repeat=3, output_format='csv')
+
+    # time every case and compare against the stored baseline.
+    bench_results = bench.run()
+    bench.compare(results=bench_results)
+
+    # store the results as the new baseline once the change is accepted.
+    # bench.save_baseline(results=bench_results)
+
+    # time the charts cases only, at 100x.
+    # ParserBenchmark(scales=(100,), repeat=1).run(names=['parse_weekly_files', 'consolidate_weekly_files',
+    #                                                     'build_chart_stores'])
@@ -0,0 +1,179 @@
+import random
+import string
+
+from datetime import datetime, timezone
+
+
+# deterministic synthetic SPOT records and weekly charts, shared by the benchmarks.
+
+
+def spot_id(rnd: random.Random) -> str:
+    """
+    Draws a SPOT like base62 id.
+    :param rnd: random.Random - random values.
+    :return: str
+    """
+
+    return ''.join(rnd.choices(string.ascii_letters + string.digits, k=22))
+
+
+def date(timestamp: int) -> str:
+    """
+    Formats a unix timestamp as a YYYY-MM-DD UTC date.
+    :param timestamp: int - seconds.
+    :return: str
+    """
+
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def audio_features_document(track_ids: list, seed: int = 0) -> dict:
+    """
+    Builds a batch audio features record shaped like the SPOT downloader's records, the endpoint's response
+    is found under raw_data.
+    :param track_ids: list - tracks in the batch.
+    :param seed: int - random seed.
+    :return: dict
+    """
+
+    # random values.
+    rnd = random.Random(seed)
+
+    # record.
+    return {
+        'data_id': 'GET_SEVERAL_TRACKS_AUDIO_FEATURES', 'endpoint': 'audio-features', 'ids': track_ids,
+        'raw_data': {'audio_features': [
+            {
+                'id': track_id, 'type': 'audio_features', 'uri': f'spotify:track:{track_id}',
+                'duration_ms': rnd.randint(90000, 420000), 'time_signature': rnd.choice((3, 4, 4, 4, 5)),
+                'tempo': round(rnd.uniform(60, 200), 3), 'key': rnd.randint(0, 11), 'mode': rnd.randint(0, 1),
+                'valence': round(rnd.random(), 4), 'liveness': round(rnd.random(), 4),
+                'instrumentalness': round(rnd.random() ** 4, 6), 'acousticness': round(rnd.random(), 4),
+                'speechiness': round(rnd.random() / 3, 4), 'loudness': round(rnd.uniform(-20, 0), 3),
+                'energy': round(rnd.random(), 4), 'danceability': round(rnd.random(), 4)
+            }
+            for track_id in track_ids
+        ]}
+    }
+
+
+def track_data_document(track_ids: list, seed: int = 0) -> dict:
+    """
+    Builds a batch track data record shaped like the SPOT downloader's records, the endpoint's response is
+    found under raw_data.
+    :param track_ids: list - tracks in the batch.
+    :param seed: int - random seed.
+    :return: dict
+    """
+
+    # random values.
+    rnd = random.Random(seed)
+
+    # artists, the first one is the main artist.
+    def artists() -> list:
+        return [{'id': spot_id(rnd), 'name': f'artist {rnd.randint(0, 9999)}',
+                 'type': 'artist'} for _ in range(rnd.choice((1, 1, 1, 2, 3)))]
+
+    # record.
+    return {
+        'data_id': 'GET_SEVERAL_TRACKS', 'endpoint': 'tracks', 'ids': track_ids,
+        'raw_data': {'tracks': [
+            {
+                'id': track_id, 'name': f'track {track_id[:8]}', 'type': 'track',
+                'popularity': rnd.randint(0, 100), 'duration_ms': rnd.randint(90000, 420000),
+                'explicit': rnd.random() < 0.2, 'is_local': False, 'artists': artists(),
+                'album': {
+                    'id': spot_id(rnd), 'name': f'album {rnd.randint(0, 9999)}',
+                    'album_type': rnd.choice(('album', 'single', 'compilation')),
+                    'release_date': f'{rnd.randint(1970, 2021)}-{rnd.randint(1, 12):02}-{rnd.randint(1, 28):02}',
+                    'total_tracks': rnd.randint(1, 20)
+                }
+            }
+            for track_id in track_ids
+        ]}
+    }
+
+
+def audio_analysis_document(track_id: str, n_segments: int = 1000, seed: int = 0) -> dict:
+    """
+    Builds an audio analysis record shaped like the SPOT downloader's records, the endpoint's response is
+    found under raw_data.
+    :param track_id: str - analysed track.
+    :param n_segments: int - amount of segments, which dominate the document size.
+    :param seed: int - random seed.
+    :return: dict
+    """
+
+    # random values.
+    rnd = random.Random(seed)
+
+    # time intervals.
+    def intervals(n: int, length: float) -> list:
+        return [{'start': round(i * length, 5), 'duration': length, 'confidence': round(rnd.random(), 3)}
+                for i in range(n)]
+
+    # record.
+    return {
+        'data_id': 'GET_TRACK_AUDIO_ANALYSIS', 'endpoint': 'audio-analysis', 'id': track_id,
+        'raw_data': {
+            'meta': {'analyzer_version': '4.0.0', 'platform': 'Linux', 'detailed_status': 'OK',
+                     'status_code': 0, 'timestamp': 1600000000, 'analysis_time': round(rnd.uniform(1, 20), 5),
+                     'input_process': 'libvorbisfile L+R 44100->22050'},
+            'track': {'num_samples': n_segments * 5512, 'duration': n_segments * 0.25, 'sample_md5': '',
+                      'offset_seconds': 0, 'window_seconds': 0, 'analysis_sample_rate': 22050,
+                      'analysis_channels': 1, 'end_of_fade_in': 0.0, 'start_of_fade_out': n_segments * 0.24,
+                      'loudness': round(rnd.uniform(-20, 0), 3), 'tempo': round(rnd.uniform(60, 200), 3),
+                      'tempo_confidence': round(rnd.random(), 3), 'time_signature': 4,
+                      'time_signature_confidence': 1.0, 'key': rnd.randint(0, 11),
+                      'key_confidence': round(rnd.random(), 3), 'mode': rnd.randint(0, 1),
+                      'mode_confidence': round(rnd.random(), 3)},
+            'bars': intervals(n_segments // 8, 2.0),
+            'beats': intervals(n_segments // 2, 0.5),
+            'sections': [
+                {**section, 'loudness': round(rnd.uniform(-20, 0), 3), 'tempo': round(rnd.uniform(60, 200), 3),
+                 'tempo_confidence': round(rnd.random(), 3), 'key': rnd.randint(0, 11),
+                 'key_confidence': round(rnd.random(), 3), 'mode': rnd.randint(0, 1),
+                 'mode_confidence': round(rnd.random(), 3), 'time_signature': 4,
+                 'time_signature_confidence': 1.0}
+                for section in intervals(max(1, n_segments // 100), 25.0)
+            ],
+            'segments': [
+                {
+                    'start': round(i * 0.25, 5), 'duration': 0.25, 'confidence': round(rnd.random(), 3),
+                    'loudness_start': round(rnd.uniform(-60, 0), 3), 'loudness_max_time': round(rnd.random(), 5),
+                    'loudness_max': round(rnd.uniform(-60, 0), 3), 'loudness_end': 0,
+                    'pitches': [round(rnd.random(), 3) for _ in range(12)],
+                    'timbre': [round(rnd.uniform(-100, 100), 3) for _ in range(12)]
+                }
+                for i in range(n_segments)
+            ],
+            'tatums': intervals(n_segments, 0.25)
+        }
+    }
+
+
+def weekly_chart_text(track_ids: list, rows: int = 200, seed: int = 0) -> str:
+    """
+    Builds a weekly charts CSV document shaped like the charts downloader's files.
+    :param track_ids: list - pool of tracks the chart is drawn from.
+    :param rows: int - chart positions.
+    :param seed: int - random seed.
+    :return: str
+    """
+
+    # random values.
+    rnd = random.Random(seed)
+
+    # chart, streams decrease with position.
+    chart = rnd.sample(track_ids, min(rows, len(track_ids)))
+    streams = sorted([rnd.randint(10000, 2000000) for _ in chart], reverse=True)
+    lines = [
+        ',,"Note that these figures are generated using a formula that protects against any artificial '
+        'inflation of streams.",,',
+        'Position,"Track Name",Artist,Streams,URL'
+    ]
+    for position, (track_id, track_streams) in enumerate(zip(chart, streams)):
+        lines.append(f'{position + 1},"track {track_id[:8]}","artist {rnd.randint(0, 9999)}",{track_streams},'
+                     f'https://open.spotify.com/track/{track_id}')
+
+    return '\n'.join(lines) + '\n'
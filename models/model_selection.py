@@ -0,0 +1,340 @@
+import hashlib
+import pickle
+
+from concurrent.futures import ProcessPoolExecutor
+from os import makedirs, replace, getpid
+from os.path import join as os_path_join, split as os_split_path, realpath, isfile
+
+from utils.logger import InMemoryLogger
+
+try:
+    import numpy as np
+except ImportError:
+    # models are selected through numpy.
+    np = None
+
+
+# arrays shared by every task of a run, sent once to each worker process through the pool initializer.
+_shared: dict = dict()
+
+
+def _init_shared(arrays: dict) -> None:
+
+    _shared.clear()
+    _shared.update(arrays)
+
+
+def _call_shared(function, kwargs: dict):
+    """
+    Calls a task function with the shared arrays of its process. Module level function so that it can be pickled.
+    :param function: callable - module level function.
+    :param kwargs: dict - arguments of the task itself.
+    :return: result of the function.
+    """
+
+    return function(**_shared, **kwargs)
+
+
+def _fit_kmeans(X, k: int, seed: int, n_init: int) -> dict:
+    """
+    Fits a single KMeans model. Module level function so that it can be pickled.
+    :param X: numpy.ndarray - samples.
+    :param k: int - amount of clusters.
+    :param seed: int - random state.
+    :param n_init: int - amount of initialisations.
+    :return: dict - fitted model, labels and inertia.
+    """
+
+    from sklearn.cluster import KMeans
+
+    model = KMeans(n_clusters=k, n_init=n_init, random_state=seed).fit(X)
+
+    return {'model': model, 'labels': model.labels_.astype(np.int32), 'inertia': float(model.inertia_)}
+
+
+def _cluster_metrics(X, labels, sample_size: int, seed: int) -> dict:
+    """
+    Scores a clustering. Module level function so that it can be pickled.
+    :param X: numpy.ndarray - samples.
+    :param labels: numpy.ndarray - cluster per sample.
+    :param sample_size: int - silhouette is computed over a random sample of this size when n is larger.
+    :param seed: int - random state of the silhouette sample.
+    :return: dict - silhouette and Calinski-Harabasz scores.
+    """
+
+    from sklearn.metrics import calinski_harabasz_score, silhouette_score
+
+    sampled = len(X) > sample_size
+
+    return {
+        'silhouette': float(silhouette_score(X, labels, sample_size=sample_size if sampled else None,
+                                             random_state=seed)),
+        'silhouette_sampled': sampled,
+        'calinski_harabasz': float(calinski_harabasz_score(X, labels))
+    }
+
+
+def _fit_fold(estimator, params: dict, X, y, train, test) -> float:
+    """
+    Fits an estimator on a single fold. Module level function so that it can be pickled.
+    :param estimator: sklearn estimator, cloned before fitting.
+    :param params: dict - estimator parameters.
+    :param X: numpy.ndarray - samples.
+    :param y: numpy.ndarray - labels.
+    :param train: numpy.ndarray - train indices.
+    :param test: numpy.ndarray - test indices.
+    :return: float - test accuracy.
+    """
+
+    from sklearn.base import clone
+
+    model = clone(estimator).set_params(**params).fit(X[train], y[train])
+
+    return float(model.score(X[test], y[test]))
+
+
+class ModelSelection:
+
+    def __init__(self, cache_path: list = None, workers: int = 1):
+        """
+        Fits candidate models in a process pool and caches every fit on disk, keyed by a hash of the data and the
+        model settings, so repeated sweeps and metrics never refit an identical model.
+        :param cache_path: list - inner project path where fitted models are cached, None disables the cache.
+        :param workers: int - amount of processes fitting models in parallel, 1 fits on the current process.
+        """
+
+        # assert numpy availability.
+        if np is None:
+            raise ValueError('models are selected through numpy, which is not installed')
+
+        # initialise logger.
+        self.logger: InMemoryLogger = InMemoryLogger()
+
+        # assert input.
+        if not isinstance(workers, int) or workers < 1:
+            self.logger.error(f'expected a positive integer, but found {workers} of type {type(workers)}')
+            raise ValueError(f'expected a positive integer, but found {workers} of type {type(workers)}')
+
+        # base path.
+        self._base_path: str = os_split_path(os_split_path(realpath(__file__))[0])[0]
+
+        # settings.
+        self._cache_path: str = os_path_join(self._base_path, *cache_path) if cache_path else None
+        self._workers: int = workers
+
+    @staticmethod
+    def _key(*parts) -> str:
+        """
+        Hashes arrays by their contents and anything else by its representation, large arrays shared by many keys
+        are hashed once and passed in as their digest.
+        :return: str
+        """
+
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                part = np.ascontiguousarray(part)
+                digest.update(f'{part.dtype}{part.shape}'.encode('utf-8'))
+                digest.update(part.tobytes())
+            else:
+                digest.update(repr(part).encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def _load(self, key: str):
+
+        if self._cache_path is None or not isfile(os_path_join(self._cache_path, f'{key}.pkl')):
+            return None
+        with open(os_path_join(self._cache_path, f'{key}.pkl'), 'rb') as f:
+            return pickle.load(f)
+
+    def _store(self, key: str, value) -> None:
+
+        if self._cache_path is None:
+            return
+        makedirs(self._cache_path, exist_ok=True)
+        file = os_path_join(self._cache_path, f'{key}.pkl')
+        with open(f'{file}.{getpid()}.tmp', 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        replace(f'{file}.{getpid()}.tmp', file)
+
+    def _run(self, tasks: dict, function, shared: dict = None) -> dict:
+        """
+        Runs the tasks missing from the cache, either sequentially or spread across a pool of processes.
+        :param tasks: dict - cache key to keyword arguments of the function.
+        :param function: callable - module level function.
+        :param shared: dict - keyword arguments common to every task, e.g. the samples, sent once per process.
+        :return: dict - cache key to result.
+        """
+
+        shared = shared or dict()
+
+        # cached results.
+        results: dict = {key: self._load(key=key) for key in tasks}
+        pending: list = [key for key, result in results.items() if result is None]
+
+        # logger.
+        self.logger.info(f'{len(tasks) - len(pending)} of {len(tasks)} results cached, {len(pending)} to compute '
+                         f'using {self._workers} processes')
+
+        # sequential mode.
+        if self._workers == 1 or len(pending) <= 1:
+            for key in pending:
+                results[key] = function(**shared, **tasks[key])
+                self._store(key=key, value=results[key])
+            return results
+
+        # parallel mode, results are cached as they arrive.
+        with ProcessPoolExecutor(max_workers=self._workers, initializer=_init_shared, initargs=(shared,)) as executor:
+            futures = {key: executor.submit(_call_shared, function, tasks[key]) for key in pending}
+            for key, future in futures.items():
+                results[key] = future.result()
+                self._store(key=key, value=results[key])
+
+        return results
+
+    def fit_kmeans(self, X, k_values: list, seeds: list = None, n_init: int = 10) -> dict:
+        """
+        Fits KMeans once per k and seed.
+        :param X: numpy.ndarray - scaled samples.
+        :param k_values: list - amounts of clusters, e.g. range(2, 20, 2).
+        :param seeds: list - random states, defaults to [0].
+        :param n_init: int - amount of initialisations per fit.
+        :return: dict - (k, seed) to fitted model, labels and inertia.
+        """
+
+        X = np.asarray(X, dtype=np.float64)
+
+        return self._kmeans_fits(X=X, digest=self._key(X), k_values=k_values, seeds=seeds, n_init=n_init)
+
+    def _kmeans_fits(self, X, digest: str, k_values: list, seeds: list, n_init: int) -> dict:
+
+        # one task per k and seed, the samples are hashed once by the caller.
+        seeds = [0] if seeds is None else list(seeds)
+        tasks = {
+            self._key('kmeans', digest, k, seed, n_init): {'k': int(k), 'seed': int(seed), 'n_init': n_init}
+            for k in k_values for seed in seeds
+        }
+        results = self._run(tasks=tasks, function=_fit_kmeans, shared={'X': X})
+
+        return {(task['k'], task['seed']): results[key] for key, task in tasks.items()}
+
+    def kmeans_sweep(self, X, k_values: list, seeds: list = None, n_init: int = 10,
+                     silhouette_sample: int = 10000) -> list:
+        """
+        Scores KMeans fits of every k and seed by inertia, silhouette and Calinski-Harabasz, all drawn from the
+        same cached fits. Silhouette is computed over a random sample when there are more samples than
+        silhouette_sample, as the full score is quadratic in the amount of samples.
+        :param X: numpy.ndarray - scaled samples.
+        :param k_values: list - amounts of clusters, e.g. range(2, 20, 2).
+        :param seeds: list - random states, defaults to [0].
+        :param n_init: int - amount of initialisations per fit.
+        :param silhouette_sample: int - max amount of samples silhouette is computed over.
+        :return: list - one dict per k and seed, with k, seed, inertia, silhouette, silhouette_sampled and
+        calinski_harabasz keys.
+        """
+
+        # fits.
+        X = np.asarray(X, dtype=np.float64)
+        digest = self._key(X)
+        fits = self._kmeans_fits(X=X, digest=digest, k_values=k_values, seeds=seeds, n_init=n_init)
+
+        # metrics, cached along the fits they score.
+        keys = {
+            fit_key: self._key('kmeans-metrics', digest, fit['labels'], silhouette_sample, fit_key[1])
+            for fit_key, fit in fits.items()
+        }
+        tasks = {
+            keys[fit_key]: {'labels': fit['labels'], 'sample_size': silhouette_sample, 'seed': fit_key[1]}
+            for fit_key, fit in fits.items()
+        }
+        metrics = self._run(tasks=tasks, function=_cluster_metrics, shared={'X': X})
+
+        return [
+            {'k': k, 'seed': seed, 'inertia': fit['inertia'], **metrics[keys[(k, seed)]]}
+            for (k, seed), fit in fits.items()
+        ]
+
+    def cross_validate(self, estimators: dict, X, y, folds: int = 5, seed: int = 0) -> dict:
+        """
+        Cross validates every estimator and parameter combination, running every fold as its own task.
+        :param estimators: dict - name to (estimator, parameter grid) tuples, e.g. {'tree':
+        (DecisionTreeClassifier(), {'max_depth': range(3, 11)})}, pipelines take clf__ prefixed parameters.
+        :param X: numpy.ndarray - samples.
+        :param y: numpy.ndarray - labels.
+        :param folds: int - amount of stratified folds.
+        :param seed: int - random state of the folds.
+        :return: dict - name to a list of {params, mean, std, scores} dicts sorted by mean accuracy, best first.
+        """
+
+        from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+        # assert input.
+        if not isinstance(estimators, dict) or len(estimators) == 0:
+            self.logger.error(f'expected a valid non empty dict, but found {estimators} of type {type(estimators)}')
+            raise ValueError(f'expected a valid non empty dict, but found {estimators} of type {type(estimators)}')
+
+        # shared folds, samples and labels are hashed once.
+        X, y = np.asarray(X), np.asarray(y)
+        splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X, y))
+        digest = self._key(X, y)
+
+        # one task per estimator, parameters and fold.
+        tasks: dict = dict()
+        candidates: dict = dict()
+        for name, (estimator, grid) in estimators.items():
+            candidates[name] = list()
+            for params in ParameterGrid(grid):
+                keys = list()
+                for train, test in splits:
+                    key = self._key('fold', digest, train, repr(estimator), sorted(params.items()))
+                    tasks[key] = {'estimator': estimator, 'params': params, 'train': train, 'test': test}
+                    keys.append(key)
+                candidates[name].append((params, keys))
+        scores = self._run(tasks=tasks, function=_fit_fold, shared={'X': X, 'y': y})
+
+        # aggregate folds.
+        results: dict = dict()
+        for name, items in candidates.items():
+            results[name] = sorted([
+                {'params': params, 'mean': float(np.mean([scores[key] for key in keys])),
+                 'std': float(np.std([scores[key] for key in keys])), 'scores': [scores[key] for key in keys]}
+                for params, keys in items
+            ], key=lambda result: -result['mean'])
+            # logger.
+            self.logger.info(f'{name} best accuracy {results[name][0]["mean"]:.4f} with {results[name][0]["params"]}')
+
+        return results
+
+
+if __name__ == '__main__':
+
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.tree import DecisionTreeClassifier
+    from sklearn.neighbors import KNeighborsClassifier
+
+    from models.training_set import TrainingSetBuilder
+
+    # training set of every region.
+    ts = TrainingSetBuilder(cache_path=['data', 'cache', 'training-set']).build(
+        charts_file=['data', 'consolidated', 'spotify-charts-weekly-top-charts', 'consolidated_weekly_charts.csv'],
+        features_file=['data', 'consolidated', 'spot-track-audio-features', 'consolidated_audio_features.csv']
+    )
+    # missing features are imputed the same way as the success model does.
+    X_scaled = StandardScaler().fit_transform(ts.imputed_X())
+
+    # instantiate a new engine.
+    ms = ModelSelection(cache_path=['data', 'cache', 'model-selection'], workers=4)
+
+    # inertia, silhouette and Calinski-Harabasz of every k from a single set of fits.
+    for row in ms.kmeans_sweep(X=X_scaled, k_values=range(2, 20, 2)):
+        ms.logger.info(str(row))
+
+    # cross validate classifiers.
+    ms.cross_validate(
+        estimators={
+            'KNeighborsClassifier': (KNeighborsClassifier(), {'n_neighbors': range(1, 15)}),
+            'DecisionTreeClassifier': (DecisionTreeClassifier(random_state=0), {'max_depth': range(3, 11)})
+        },
+        X=X_scaled, y=ts.y
+    )
@@ -0,0 +1,418 @@
+import argparse
+import csv
+import json
+import pickle
+import queue
+import threading
+
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import makedirs, replace, getpid
+from os.path import join as os_path_join, split as os_split_path, realpath, dirname
+from time import monotonic, perf_counter
+
+from models.training_set import TrainingSet, TrainingSetBuilder
+from utils.logger import InMemoryLogger
+
+try:
+    import numpy as np
+except ImportError:
+    # models are scored through numpy.
+    np = None
+
+
+# consolidated inputs, as written by the parsers.
+default_features_file = ['data', 'consolidated', 'spot-track-audio-features', 'consolidated_audio_features.csv']
+default_track_data_file = ['data', 'consolidated', 'spot-track-data', 'consolidated_track_data.csv']
+default_charts_file = ['data', 'consolidated', 'spotify-charts-weekly-top-charts', 'consolidated_weekly_charts.csv']
+default_model_file = ['data', 'models', 'spot_success_model.pkl']
+
+# base path.
+base_path: str = os_split_path(os_split_path(realpath(__file__))[0])[0]
+
+
+def train_success_model(training_set: TrainingSet, model_file: list = None, classifier=None) -> dict:
+    """
+    Fits the scaler and classifier of the success model once, and serializes them along with the feature and
+    label names they were fitted with.
+    :param training_set: TrainingSet - built by TrainingSetBuilder.
+    :param model_file: list - inner project path where the model is saved, defaults to data/models.
+    :param classifier: sklearn classifier, defaults to the decision tree picked by the notebook's grid search.
+    :return: dict - serialized model.
+    """
+
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.tree import DecisionTreeClassifier
+
+    # missing features are imputed with their training mean.
+    means = TrainingSet.feature_means(X=training_set.X)
+    X = TrainingSet.impute(X=training_set.X, means=means)
+
+    # fit.
+    scaler = StandardScaler().fit(X)
+    classifier = classifier if classifier is not None else DecisionTreeClassifier(max_depth=6, random_state=0)
+    classifier.fit(scaler.transform(X), training_set.y)
+
+    # serialize atomically.
+    model = {
+        'feature_names': training_set.feature_names, 'label_names': training_set.label_names,
+        'imputation': means, 'scaler': scaler, 'classifier': classifier
+    }
+    file = os_path_join(base_path, *(model_file or default_model_file))
+    makedirs(dirname(file), exist_ok=True)
+    with open(f'{file}.{getpid()}.tmp', 'wb') as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    replace(f'{file}.{getpid()}.tmp', file)
+
+    return model
+
+
+class SuccessPredictor:
+
+    def __init__(self, model_file: list = None, features_file: list = None, track_data_file: list = None):
+        """
+        Scores tracks with a serialized success model. The model and the feature matrix of every known track are
+        loaded once, so scoring a batch is a vectorized lookup followed by a single predict_proba call.
+        :param model_file: list - inner project path towards the serialized model, defaults to data/models.
+        :param features_file: list - inner project path towards the consolidated audio features table.
+        :param track_data_file: list - inner project path towards the consolidated track data table, used when
+        the model was trained with track data features.
+        """
+
+        # assert numpy availability.
+        if np is None:
+            raise ValueError('models are scored through numpy, which is not installed')
+
+        # initialise logger.
+        self.logger: InMemoryLogger = InMemoryLogger()
+
+        # load model.
+        with open(os_path_join(base_path, *(model_file or default_model_file)), 'rb') as f:
+            model = pickle.load(f)
+        self.feature_names: list = model['feature_names']
+        self.label_names: list = model['label_names']
+        self._imputation = model['imputation']
+        self._scaler = model['scaler']
+        self._classifier = model['classifier']
+
+        # classes the classifier saw, mapped onto label columns.
+        self._label_columns = np.asarray(self._classifier.classes_, dtype=np.int64)
+
+        # feature matrix of every track, sorted by track id.
+        uses_track_data = any(name in TrainingSetBuilder.track_fields for name in self.feature_names)
+        track_ids, X, names = TrainingSetBuilder().read_features(
+            features_file=features_file or default_features_file,
+            track_data_file=(track_data_file or default_track_data_file) if uses_track_data else None
+        )
+        if names != self.feature_names:
+            raise ValueError(f'model features {self.feature_names} do not match the available features {names}')
+        order = np.argsort(track_ids, kind='stable')
+        self.track_ids = track_ids[order]
+        X = X[order]
+        self._X = self._scaler.transform(TrainingSet.impute(X=X, means=self._imputation))
+
+        # logger.
+        self.logger.info(f'success model loaded, {len(self.track_ids)} tracks available for scoring')
+
+    def _rows(self, track_ids: list):
+
+        # vectorized lookup.
+        ids = np.asarray(track_ids, dtype=str)
+        positions = np.minimum(np.searchsorted(self.track_ids, ids), max(len(self.track_ids) - 1, 0))
+        found = self.track_ids[positions] == ids if len(self.track_ids) else np.zeros(len(ids), dtype=bool)
+
+        return positions, found
+
+    def predict_proba(self, track_ids: list) -> tuple:
+        """
+        Label probabilities of a batch of tracks.
+        :param track_ids: list - track ids.
+        :return: tuple - bool array flagging tracks with features, and a tracks x labels probability matrix,
+        NaN for tracks without features.
+        """
+
+        positions, found = self._rows(track_ids=track_ids)
+        probabilities = np.full((len(positions), len(self.label_names)), np.nan)
+        if found.any():
+            probabilities[found] = 0.0
+            probabilities[np.ix_(np.flatnonzero(found), self._label_columns)] = \
+                self._classifier.predict_proba(self._X[positions[found]])
+
+        return found, probabilities
+
+    def score(self, track_ids: list) -> dict:
+        """
+        Scores a batch of tracks.
+        :param track_ids: list - track ids.
+        :return: dict - track id to label probabilities and predicted label, None for tracks without features.
+        """
+
+        found, probabilities = self.predict_proba(track_ids=track_ids)
+
+        return {
+            track_id: {
+                'label': self.label_names[int(np.argmax(row))],
+                'probabilities': dict(zip(self.label_names, row.round(6).tolist()))
+            } if is_found else None
+            for track_id, is_found, row in zip(track_ids, found.tolist(), probabilities)
+        }
+
+    def score_catalog(self, chunk_size: int = 10000):
+        """
+        Scores every known track, chunk by chunk.
+        :param chunk_size: int - tracks per chunk.
+        :return: generator - (track ids, probability matrix) tuples.
+        """
+
+        # assert input.
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError(f'expected a positive integer, but found {chunk_size} of type {type(chunk_size)}')
+
+        for start in range(0, len(self.track_ids), chunk_size):
+            rows = self._X[start:start + chunk_size]
+            probabilities = np.zeros((len(rows), len(self.label_names)))
+            probabilities[:, self._label_columns] = self._classifier.predict_proba(rows)
+            yield self.track_ids[start:start + chunk_size], probabilities
+
+    def score_catalog_to_file(self, output_file: list, chunk_size: int = 10000) -> int:
+        """
+        Scores every known track into a CSV file, written chunk by chunk.
+        :param output_file: list - inner project path towards the CSV file.
+        :param chunk_size: int - tracks per chunk.
+        :return: int - tracks scored.
+        """
+
+        file = os_path_join(base_path, *output_file)
+        makedirs(dirname(file), exist_ok=True)
+        rows = 0
+        with open(f'{file}.{getpid()}.tmp', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(['track_id', 'label', *self.label_names])
+            for track_ids, probabilities in self.score_catalog(chunk_size=chunk_size):
+                labels = np.array(self.label_names)[probabilities.argmax(axis=1)]
+                writer.writerows(zip(track_ids.tolist(), labels.tolist(), *probabilities.round(6).T.tolist()))
+                rows += len(track_ids)
+                # logger.
+                self.logger.info(f'{rows} of {len(self.track_ids)} tracks scored')
+        replace(f'{file}.{getpid()}.tmp', file)
+
+        return rows
+
+
+class ScoringService:
+
+    def __init__(self, predictor: SuccessPredictor, max_batch: int = 256, max_wait_ms: float = 2.0,
+                 latency_window: int = 10000):
+        """
+        Micro-batches concurrent scoring requests. Requests are queued and a single batcher thread scores up to
+        max_batch track ids at once, waiting at most max_wait_ms for a batch to fill, so concurrent callers share
+        one predict_proba call.
+        :param predictor: SuccessPredictor - loaded predictor.
+        :param max_batch: int - max amount of track ids scored at once.
+        :param max_wait_ms: float - max milliseconds the first request of a batch waits for others.
+        :param latency_window: int - amount of recent requests latency percentiles are computed over.
+        """
+
+        # assert input.
+        if not isinstance(max_batch, int) or max_batch < 1:
+            raise ValueError(f'expected a positive integer, but found {max_batch} of type {type(max_batch)}')
+        if not isinstance(max_wait_ms, (int, float)) or max_wait_ms < 0:
+            raise ValueError(f'expected a non negative number, but found {max_wait_ms} of type {type(max_wait_ms)}')
+
+        # settings.
+        self.predictor: SuccessPredictor = predictor
+        self._max_batch: int = max_batch
+        self._max_wait: float = max_wait_ms / 1000
+
+        # pending requests and recent latencies in seconds.
+        self._queue: queue.Queue = queue.Queue()
+        self._latencies: deque = deque(maxlen=latency_window)
+        self._batches: int = 0
+        self._lock = threading.Lock()
+
+        # batcher thread.
+        self._running: bool = True
+        self._batcher = threading.Thread(target=self._run_batches, name='scoring-batcher', daemon=True)
+        self._batcher.start()
+
+    def score(self, track_ids: list, timeout: float = 30) -> dict:
+        """
+        Scores tracks through the batcher, blocking until their batch is scored.
+        :param track_ids: list - track ids.
+        :param timeout: float - max seconds to wait.
+        :return: dict - as returned by SuccessPredictor.score.
+        """
+
+        started = perf_counter()
+        future = Future()
+        self._queue.put((list(track_ids), future))
+        result = future.result(timeout=timeout)
+        with self._lock:
+            self._latencies.append(perf_counter() - started)
+
+        return result
+
+    def _run_batches(self) -> None:
+
+        while self._running:
+            # first request of the batch.
+            try:
+                requests = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            size = len(requests[0][0])
+            # fill the batch until it is full or the first request waited long enough.
+            deadline = monotonic() + self._max_wait
+            while size < self._max_batch:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                size += len(request[0])
+            # score every request at once.
+            try:
+                scores = self.predictor.score(track_ids=[track_id for ids, _ in requests for track_id in ids])
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self._batches += 1
+            for ids, future in requests:
+                future.set_result({track_id: scores[track_id] for track_id in ids})
+
+    def stats(self) -> dict:
+        """
+        Latency percentiles in milliseconds over the recent requests.
+        :return: dict
+        """
+
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            batches = self._batches
+        if len(latencies) == 0:
+            return {'requests': 0, 'batches': batches}
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]).round(3).tolist()
+
+        return {'requests': len(latencies), 'batches': batches, 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+                'max_ms': round(float(latencies.max()), 3)}
+
+    def close(self) -> None:
+
+        self._running = False
+        self._batcher.join()
+
+    def serve(self, host: str = '127.0.0.1', port: int = 8765) -> None:
+        """
+        Serves the scoring API over HTTP until interrupted.
+        POST /score with {"track_ids": [...]} returns label probabilities per track, GET /stats latency
+        percentiles and GET /health the amount of tracks available.
+        :param host: str - interface to bind.
+        :param port: int - port to bind.
+        :return: None
+        """
+
+        server = ThreadingHTTPServer((host, port), _handler(service=self))
+        server.daemon_threads = True
+        self.predictor.logger.info(f'scoring service listening on http://{host}:{port}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.close()
+
+
+def _handler(service: ScoringService) -> type:
+
+    class ScoringHandler(BaseHTTPRequestHandler):
+
+        # keep-alive connections.
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self, status: int, body: dict) -> None:
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._reply(200, {'status': 'ok', 'tracks': len(service.predictor.track_ids)})
+            elif self.path == '/stats':
+                self._reply(200, service.stats())
+            else:
+                self._reply(404, {'error': f'unknown path {self.path}'})
+
+        def do_POST(self):
+            if self.path != '/score':
+                self._reply(404, {'error': f'unknown path {self.path}'})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                track_ids = body.get('track_ids')
+                if not isinstance(track_ids, list) or not all(isinstance(x, str) for x in track_ids):
+                    raise ValueError('expected a track_ids list of strings')
+            except (ValueError, AttributeError) as e:
+                self._reply(400, {'error': str(e)})
+                return
+            # score, a failed or late batch is answered instead of dropping the connection.
+            try:
+                scores = service.score(track_ids=track_ids)
+            except FutureTimeoutError:
+                self._reply(503, {'error': 'scoring timed out, try again later'})
+                return
+            except Exception as e:
+                service.predictor.logger.error(f'scoring failed: {e}')
+                self._reply(500, {'error': f'scoring failed: {e}'})
+                return
+            self._reply(200, {'scores': scores})
+
+        def log_message(self, format, *args):
+            # requests are not logged, latency is reported by /stats.
+            pass
+
+    return ScoringHandler
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='SPOT success model scoring')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('train', help='build the training set and serialize a fitted model')
+    serve = commands.add_parser('serve', help='serve the scoring API over HTTP')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--max-batch', type=int, default=256)
+    serve.add_argument('--max-wait-ms', type=float, default=2.0)
+    score = commands.add_parser('score', help='score track ids, or every known track into a CSV file')
+    score.add_argument('track_ids', nargs='*')
+    score.add_argument('--output', help='inner project path of the CSV file every known track is scored into')
+    score.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    # fit and serialize the model.
+    if args.command == 'train':
+        ts = TrainingSetBuilder(cache_path=['data', 'cache', 'training-set']).build(
+            charts_file=default_charts_file, features_file=default_features_file,
+            track_data_file=default_track_data_file
+        )
+        train_success_model(training_set=ts)
+    # serve.
+    elif args.command == 'serve':
+        ScoringService(
+            predictor=SuccessPredictor(), max_batch=args.max_batch, max_wait_ms=args.max_wait_ms
+        ).serve(host=args.host, port=args.port)
+    # score.
+    elif args.output:
+        SuccessPredictor().score_catalog_to_file(output_file=args.output.split('/'), chunk_size=args.chunk_size)
+    else:
+        print(json.dumps(SuccessPredictor().score(track_ids=args.track_ids), indent=2))
@@ -0,0 +1,408 @@
+import json
+
+from os import makedirs, replace, getpid
+from os.path import join as os_path_join, split as os_split_path, realpath, isfile
+
+from models.training_set import TrainingSet, TrainingSetBuilder
+from utils.logger import InMemoryLogger
+from utils.vector_store import VectorStore, VectorStoreWriter
+
+try:
+    import numpy as np
+except ImportError:
+    # indexes are built and searched through numpy.
+    np = None
+
+
+# file extensions of the index settings and of the cluster of every row.
+meta_extension = '.meta.json'
+lists_extension = '.ivf.i32'
+
+
+def _kmeans(X, n_clusters: int, iterations: int = 20, seed: int = 0):
+    """
+    Plain Lloyd iterations, enough to partition vectors into inverted lists.
+    :param X: numpy.ndarray - float32 vectors.
+    :param n_clusters: int - amount of centroids.
+    :param iterations: int - amount of iterations.
+    :param seed: int - random state of the initial centroids.
+    :return: numpy.ndarray - n_clusters x width float32 centroids.
+    """
+
+    rng = np.random.RandomState(seed)
+    centroids = X[rng.choice(len(X), size=n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest(X=X, centroids=centroids)
+        sums = np.zeros_like(centroids, dtype=np.float64)
+        np.add.at(sums, assignments, X)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # empty clusters keep their previous centroid.
+        filled = counts > 0
+        centroids[filled] = (sums[filled] / counts[filled, None]).astype(np.float32)
+
+    return centroids
+
+
+def _nearest(X, centroids, block: int = 65536):
+    """
+    Nearest centroid of every vector, in blocks.
+    :return: numpy.ndarray - int32 centroid per vector.
+    """
+
+    norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(X), dtype=np.int32)
+    for start in range(0, len(X), block):
+        assignments[start:start + block] = (norms - 2 * X[start:start + block] @ centroids.T).argmin(axis=1)
+
+    return assignments
+
+
+class SimilarTrackIndex:
+
+    def __init__(self, index_path: list, name: str = 'audio_features'):
+        """
+        Nearest neighbour index over scaled audio features. Vectors are stored as a float32 vector store, one row
+        per track, and memory mapped on load. Queries are answered either exactly, by blocked brute force, or
+        approximately, by only scanning the inverted lists of the centroids nearest to each query.
+        :param index_path: list - inner project path where the index is stored.
+        :param name: str - index name, without extension.
+        """
+
+        # assert numpy availability.
+        if np is None:
+            raise ValueError('indexes are built and searched through numpy, which is not installed')
+
+        # initialise logger.
+        self.logger: InMemoryLogger = InMemoryLogger()
+
+        # base path.
+        self._base_path: str = os_split_path(os_split_path(realpath(__file__))[0])[0]
+        self._file_base: str = os_path_join(self._base_path, *index_path, name)
+
+        # loaded index.
+        self.track_ids: list = list()
+        self._rows: dict = dict()
+        self._vectors = None
+        self._norms = None
+        self._meta: dict = None
+        self._lists = None
+        self._list_offsets = None
+
+    @property
+    def file_base(self) -> str:
+        """
+        Getter for property file_base.
+        :return: str
+        """
+
+        return self._file_base
+
+    def __len__(self) -> int:
+
+        return len(self.track_ids)
+
+    def __contains__(self, track_id: str) -> bool:
+
+        return track_id in self._rows
+
+    @staticmethod
+    def _latest_rows(track_ids):
+
+        # positions of the latest row of every track, in table order.
+        _, last = np.unique(track_ids[::-1], return_index=True)
+
+        return np.sort(len(track_ids) - 1 - last)
+
+    def _scale(self, X):
+
+        # missing features are imputed with the mean they were scaled with.
+        mean = np.asarray(self._meta['mean'])
+        X = TrainingSet.impute(X=X, means=mean)
+
+        return ((X - mean) / np.asarray(self._meta['scale'])).astype(np.float32)
+
+    def build(self, features_file: list, n_lists: int = None, seed: int = 0) -> None:
+        """
+        Builds the index from scratch, fitting the feature scaling and the inverted list centroids.
+        :param features_file: list - inner project path towards the consolidated audio features table.
+        :param n_lists: int - amount of inverted lists, defaults to the square root of the amount of tracks.
+        :param seed: int - random state of the centroids.
+        :return: None
+        """
+
+        # logger.
+        self.logger.info('initialising similar track index building')
+
+        # features.
+        track_ids, X, feature_names = TrainingSetBuilder().read_features(features_file=features_file)
+        if len(track_ids) == 0:
+            self.logger.error('no features were found, at least one track is required')
+            raise ValueError('no features were found, at least one track is required')
+
+        # unique tracks, the latest row wins.
+        keep = self._latest_rows(track_ids=track_ids)
+        track_ids, X = track_ids[keep], X[keep]
+
+        # standard scaling.
+        mean = TrainingSet.feature_means(X=X)
+        scale = np.nanstd(X, axis=0)
+        scale = np.where(np.isnan(scale) | (scale == 0), 1.0, scale)
+        self._meta = {'feature_names': feature_names, 'mean': mean.tolist(), 'scale': scale.tolist()}
+        vectors = self._scale(X=X)
+
+        # inverted lists.
+        n_lists = max(1, int(np.sqrt(len(vectors)))) if n_lists is None else n_lists
+        n_lists = min(n_lists, len(vectors))
+        centroids = _kmeans(X=vectors, n_clusters=n_lists, seed=seed)
+        self._meta['centroids'] = centroids.tolist()
+
+        # write vectors, cluster assignments and settings.
+        with VectorStoreWriter(file_base=self._file_base, width=vectors.shape[1]) as store:
+            for track_id, vector in zip(track_ids.tolist(), vectors):
+                store.write(key=track_id, rows=[vector.tolist()])
+        self._write_lists(assignments=_nearest(X=vectors, centroids=centroids), append=False)
+        self._write_meta()
+
+        # logger.
+        self.logger.info(f'similar track index built with {len(track_ids)} tracks and {n_lists} lists')
+
+        # reload.
+        self.load()
+
+    def update(self, features_file: list) -> int:
+        """
+        Appends the tracks missing from the index, scaled and assigned with the settings the index was built with.
+        As in build, the latest row of a track wins. When the features of an indexed track changed, the index is
+        rebuilt instead, with as many inverted lists as before, since rows can not be replaced in place.
+        :param features_file: list - inner project path towards the consolidated audio features table.
+        :return: int - amount of tracks added or changed.
+        """
+
+        # load settings.
+        if self._meta is None:
+            self.load()
+
+        # latest row of every track.
+        track_ids, X, feature_names = TrainingSetBuilder().read_features(features_file=features_file)
+        if feature_names != self._meta['feature_names']:
+            raise ValueError(f'index features {self._meta["feature_names"]} do not match {feature_names}')
+        keep = self._latest_rows(track_ids=track_ids)
+        indexed = np.isin(track_ids[keep], self.track_ids)
+
+        # indexed tracks whose features changed.
+        rows = [self._rows[track_id] for track_id in track_ids[keep[indexed]].tolist()]
+        changed = int((self._scale(X=X[keep[indexed]]) != np.asarray(self._vectors[rows])).any(axis=1).sum()) \
+            if len(rows) else 0
+        if changed > 0:
+            # logger.
+            self.logger.info(f'features of {changed} indexed tracks changed, rebuilding the similar track index')
+            added = int((~indexed).sum())
+            self.build(features_file=features_file, n_lists=len(self._meta['centroids']))
+            return added + changed
+
+        # new tracks only.
+        new = keep[~indexed]
+        if len(new) == 0:
+            self.logger.info('similar track index is up to date')
+            return 0
+
+        # scale and assign.
+        vectors = self._scale(X=X[new])
+        assignments = _nearest(X=vectors, centroids=np.asarray(self._meta['centroids'], dtype=np.float32))
+
+        # append, the lists first so that rows are never visible without their list.
+        self._write_lists(assignments=assignments, append=True)
+        with VectorStoreWriter(file_base=self._file_base, width=vectors.shape[1], append=True) as store:
+            for track_id, vector in zip(track_ids[new].tolist(), vectors):
+                store.write(key=track_id, rows=[vector.tolist()])
+
+        # logger.
+        self.logger.info(f'{len(new)} tracks added to the similar track index')
+
+        # reload.
+        self.load()
+
+        return len(new)
+
+    def _write_lists(self, assignments, append: bool) -> None:
+
+        file = f'{self._file_base}{lists_extension}'
+        if not append:
+            assignments.astype(np.int32).tofile(f'{file}.{getpid()}.tmp')
+            replace(f'{file}.{getpid()}.tmp', file)
+            return
+        with open(file, 'r+b') as f:
+            # drop assignments past the stored rows, e.g. left by an interrupted update.
+            f.truncate(len(self.track_ids) * 4)
+            f.seek(0, 2)
+            assignments.astype(np.int32).tofile(f)
+
+    def _write_meta(self) -> None:
+
+        makedirs(os_split_path(self._file_base)[0], exist_ok=True)
+        file = f'{self._file_base}{meta_extension}'
+        with open(f'{file}.{getpid()}.tmp', 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self._meta))
+        replace(f'{file}.{getpid()}.tmp', file)
+
+    def load(self) -> None:
+        """
+        Memory maps the index.
+        :return: None
+        """
+
+        # assert index availability.
+        if not isfile(f'{self._file_base}{meta_extension}'):
+            self.logger.error(f'no index was found at {self._file_base}, build it first')
+            raise ValueError(f'no index was found at {self._file_base}, build it first')
+
+        # settings.
+        with open(f'{self._file_base}{meta_extension}', 'r', encoding='utf-8') as f:
+            self._meta = json.loads(f.read())
+
+        # vectors, rows follow the store's key order.
+        store = VectorStore(file_base=self._file_base)
+        self.track_ids = list(store.keys)
+        self._rows = {track_id: row for row, track_id in enumerate(self.track_ids)}
+        self._vectors = store.matrix
+        self._norms = np.einsum('ij,ij->i', self._vectors, self._vectors)
+
+        # inverted lists, rows grouped by centroid.
+        assignments = np.fromfile(f'{self._file_base}{lists_extension}', dtype=np.int32,
+                                  count=len(self.track_ids))
+        self._lists = np.argsort(assignments, kind='stable').astype(np.int64)
+        self._list_offsets = np.searchsorted(assignments[self._lists], np.arange(len(self._meta['centroids']) + 1))
+
+    def _query_vectors(self, track_ids: list):
+
+        rows = [self._rows.get(track_id) for track_id in track_ids]
+        missing = [track_id for track_id, row in zip(track_ids, rows) if row is None]
+        if missing:
+            raise ValueError(f'tracks {missing[:5]} are not indexed')
+
+        return np.asarray(self._vectors[rows], dtype=np.float32), np.asarray(rows, dtype=np.int64)
+
+    def search(self, vectors, k: int = 10, approximate: bool = False, n_probe: int = 8, exclude=None,
+               block: int = 65536) -> tuple:
+        """
+        Batched k nearest neighbours of scaled vectors, by euclidean distance.
+        :param vectors: numpy.ndarray - queries x width scaled vectors.
+        :param k: int - amount of neighbours per query.
+        :param approximate: bool - whether only the n_probe inverted lists nearest to each query are scanned.
+        :param n_probe: int - amount of inverted lists scanned per query in approximate mode.
+        :param exclude: numpy.ndarray - optional row per query to leave out, e.g. the query track itself.
+        :param block: int - amount of indexed vectors scanned at a time in exact mode.
+        :return: tuple - queries x k row and squared distance matrices, rows are -1 when there are fewer than k
+        candidates.
+        """
+
+        # load index.
+        if self._vectors is None:
+            self.load()
+
+        # assert input.
+        if not isinstance(k, int) or k < 1:
+            self.logger.error(f'expected a positive integer, but found {k} of type {type(k)}')
+            raise ValueError(f'expected a positive integer, but found {k} of type {type(k)}')
+        queries = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        exclude = np.full(len(queries), -1, dtype=np.int64) if exclude is None else np.asarray(exclude)
+
+        # results, padded for queries with fewer candidates than k.
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        query_norms = np.einsum('ij,ij->i', queries, queries)
+
+        # exact mode, every query against a block of indexed vectors at a time, merging the running top k.
+        if not approximate:
+            for start in range(0, len(self._vectors), block):
+                block_rows = np.arange(start, min(start + block, len(self._vectors)))
+                block_distances = query_norms[:, None] - 2 * queries @ self._vectors[block_rows].T + \
+                    self._norms[block_rows]
+                block_distances[block_rows[None, :] == exclude[:, None]] = np.inf
+                rows, distances = self._merge(rows=rows, distances=distances,
+                                              candidate_rows=np.broadcast_to(block_rows, block_distances.shape),
+                                              candidate_distances=block_distances, k=k)
+            return rows, distances
+
+        # approximate mode, candidates are the rows of the lists nearest to each query.
+        centroids = np.asarray(self._meta['centroids'], dtype=np.float32)
+        n_probe = min(n_probe, len(centroids))
+        probes = np.argpartition((centroids ** 2).sum(axis=1) - 2 * queries @ centroids.T, n_probe - 1,
+                                 axis=1)[:, :n_probe]
+        for query, lists in enumerate(probes):
+            candidates = np.concatenate([
+                self._lists[self._list_offsets[index]:self._list_offsets[index + 1]] for index in lists
+            ])
+            candidates = candidates[candidates != exclude[query]]
+            if len(candidates) == 0:
+                continue
+            candidate_distances = query_norms[query] - 2 * self._vectors[candidates] @ queries[query] + \
+                self._norms[candidates]
+            top, top_distances = self._merge(rows=rows[query:query + 1], distances=distances[query:query + 1],
+                                             candidate_rows=candidates[None, :],
+                                             candidate_distances=candidate_distances[None, :], k=k)
+            rows[query], distances[query] = top[0], top_distances[0]
+
+        return rows, distances
+
+    @staticmethod
+    def _merge(rows, distances, candidate_rows, candidate_distances, k: int) -> tuple:
+
+        # running top k and candidates, partially sorted and then ordered by distance.
+        merged_rows = np.concatenate([rows, candidate_rows], axis=1)
+        merged_distances = np.concatenate([distances, candidate_distances.astype(np.float32)], axis=1)
+        if merged_rows.shape[1] > k:
+            top = np.argpartition(merged_distances, k - 1, axis=1)[:, :k]
+            merged_rows = np.take_along_axis(merged_rows, top, axis=1)
+            merged_distances = np.take_along_axis(merged_distances, top, axis=1)
+        order = np.argsort(merged_distances, axis=1, kind='stable')
+        merged_rows = np.take_along_axis(merged_rows, order, axis=1)
+        merged_distances = np.take_along_axis(merged_distances, order, axis=1)
+        merged_rows[np.isinf(merged_distances)] = -1
+
+        return merged_rows, merged_distances
+
+    def similar(self, track_ids: list, k: int = 10, approximate: bool = False, n_probe: int = 8) -> dict:
+        """
+        Tracks most similar to each of the given tracks, leaving the track itself out.
+        :param track_ids: list - indexed track ids.
+        :param k: int - amount of similar tracks per track.
+        :param approximate: bool - whether only the n_probe inverted lists nearest to each track are scanned.
+        :param n_probe: int - amount of inverted lists scanned per track in approximate mode.
+        :return: dict - track id to a list of (similar track id, distance) tuples, most similar first.
+        """
+
+        # load index.
+        if self._vectors is None:
+            self.load()
+
+        # search.
+        queries, query_rows = self._query_vectors(track_ids=track_ids)
+        rows, distances = self.search(vectors=queries, k=k, approximate=approximate, n_probe=n_probe,
+                                      exclude=query_rows)
+
+        return {
+            track_id: [(self.track_ids[row], float(np.sqrt(max(distance, 0.0))))
+                       for row, distance in zip(row_list.tolist(), distance_list.tolist()) if row >= 0]
+            for track_id, row_list, distance_list in zip(track_ids, rows, distances)
+        }
+
+
+if __name__ == '__main__':
+
+    # instantiate a new index.
+    sti = SimilarTrackIndex(index_path=['data', 'index', 'similar-tracks'])
+
+    # build the index from the consolidated audio features.
+    sti.build(
+        features_file=['data', 'consolidated', 'spot-track-audio-features', 'consolidated_audio_features.csv']
+    )
+
+    # append tracks parsed since the index was built.
+    # sti.update(
+    #     features_file=['data', 'consolidated', 'spot-track-audio-features', 'consolidated_audio_features.csv']
+    # )
+
+    # tracks most similar to Starboy.
+    for similar_id, distance in sti.similar(track_ids=['5aAx2yezTd8zXrkmtKl66Z'], k=10)['5aAx2yezTd8zXrkmtKl66Z']:
+        sti.logger.info(f'{similar_id} - {distance:.4f}')
@@ -0,0 +1,388 @@
+import hashlib
+import json
+
+from os import listdir, makedirs, replace, getpid
+from os.path import join as os_path_join, split as os_split_path, realpath, isdir, isfile, exists
+
+from parsers.spot.spot_parser import SpotTrackParser
+from utils.chart_store import weekly_charts_schema
+from utils.logger import InMemoryLogger
+from utils.table_writer import read_columns
+
+try:
+    import numpy as np
+except ImportError:
+    # training sets are built through numpy.
+    np = None
+
+
+def _schema_types(schema: dict, fields: list) -> list:
+    """
+    Types of the given fields of a parsed table, so that inputs are read with the columns the parsers write.
+    :param schema: dict - fields and types of the table, as declared by its parser.
+    :param fields: list - column names.
+    :return: list - column types.
+    """
+
+    missing = [field for field in fields if field not in schema['fields']]
+    if missing:
+        raise ValueError(f'fields {missing} are not written by the parsers, which write {schema["fields"]}')
+
+    return [schema['types'][schema['fields'].index(field)] for field in fields]
+
+
+class TrainingSet:
+
+    def __init__(self, arrays: dict):
+        """
+        Feature and label matrix of the SPOT success model, one row per track and region.
+        :param arrays: dict - arrays built by TrainingSetBuilder, or loaded from its cache.
+        """
+
+        # row identification.
+        self.regions = arrays['regions']
+        self.track_ids = arrays['track_ids']
+
+        # features.
+        self.feature_names: list = arrays['feature_names'].tolist()
+        self.X = arrays['X']
+
+        # labels, y holds codes into label_names.
+        self.label_names: list = arrays['label_names'].tolist()
+        self.y = arrays['y']
+
+        # peak of every row, the chart entry labels are drawn from.
+        self.peak_position = arrays['peak_position']
+        self.peak_streams = arrays['peak_streams']
+        self.peak_date = arrays['peak_date']
+        self.weeks_on_chart = arrays['weeks_on_chart']
+
+    def __len__(self) -> int:
+
+        return len(self.track_ids)
+
+    @property
+    def labels(self):
+        """
+        Getter for property labels, label names per row, e.g. top 10.
+        :return: numpy.ndarray
+        """
+
+        return np.array(self.label_names)[self.y]
+
+    @staticmethod
+    def feature_means(X):
+        """
+        Mean of every feature over the rows where it is present, the value missing features are imputed with.
+        Features missing from every row are imputed with 0.
+        :param X: numpy.ndarray - feature matrix, NaN where a feature is missing.
+        :return: numpy.ndarray - mean per feature.
+        """
+
+        X = np.asarray(X, dtype=np.float64)
+        means = np.nanmean(X, axis=0) if len(X) else np.zeros(X.shape[1])
+
+        return np.where(np.isnan(means), 0.0, means)
+
+    @staticmethod
+    def impute(X, means):
+        """
+        Fills missing features with the given means, the single missing value policy of every model fitted on
+        training sets, so that the same rows are selected, trained, scored and indexed.
+        :param X: numpy.ndarray - feature matrix, NaN where a feature is missing.
+        :param means: numpy.ndarray - mean per feature, see feature_means.
+        :return: numpy.ndarray - float64 feature matrix without missing values.
+        """
+
+        X = np.asarray(X, dtype=np.float64)
+
+        return np.where(np.isnan(X), np.asarray(means, dtype=np.float64), X)
+
+    def imputed_X(self):
+        """
+        Feature matrix with missing features imputed with their mean over this set.
+        :return: numpy.ndarray
+        """
+
+        return self.impute(X=self.X, means=self.feature_means(X=self.X))
+
+    def arrays(self) -> dict:
+
+        return {
+            'regions': self.regions, 'track_ids': self.track_ids, 'feature_names': np.array(self.feature_names),
+            'X': self.X, 'label_names': np.array(self.label_names), 'y': self.y,
+            'peak_position': self.peak_position, 'peak_streams': self.peak_streams, 'peak_date': self.peak_date,
+            'weeks_on_chart': self.weeks_on_chart
+        }
+
+    def to_frame(self):
+        """
+        Training set as a pandas DataFrame, as the notebook used to build it.
+        :return: pandas.DataFrame
+        """
+
+        import pandas as pd
+
+        frame = pd.DataFrame(self.X, columns=self.feature_names)
+        frame.insert(0, 'track_id', self.track_ids)
+        frame.insert(0, 'region', self.regions)
+        frame['track_position'] = self.peak_position
+        frame['track_streams'] = self.peak_streams
+        frame['peak_date'] = self.peak_date
+        frame['weeks_on_chart'] = self.weeks_on_chart
+        frame['label'] = self.labels
+
+        return frame
+
+
+class TrainingSetBuilder:
+
+    # chart input, consolidated weekly charts.
+    chart_fields = ['region', 'date_to', 'track_id', 'track_position', 'track_streams']
+    chart_types = _schema_types(schema=weekly_charts_schema, fields=chart_fields)
+
+    # audio features, every numeric column is a feature.
+    feature_fields = list(SpotTrackParser.schemas['audio_features']['fields'])
+    feature_types = list(SpotTrackParser.schemas['audio_features']['types'])
+
+    # track data, optional features.
+    track_fields = ['track_id', 'popularity', 'is_explicit', 'album_total_tracks']
+    track_types = _schema_types(schema=SpotTrackParser.schemas['track_data'], fields=track_fields)
+
+    # build version, sets cached by an earlier build are not reused.
+    cache_version = 2
+
+    # label buckets, the best position a track reached is labelled with the first bound it does not exceed.
+    label_bounds = [10, 25, 50, 100, 200]
+
+    def __init__(self, cache_path: list = None, delimiter: str = ','):
+        """
+        Builds the feature and label matrix of the SPOT success model straight from the consolidated tables,
+        for every region at once. Labels come from each track's best position per region, taken on the latest
+        week it was reached, and are bucketed into top 10, 25, 50, 100 and 200.
+        :param cache_path: list - inner project path where built sets are cached, keyed by a hash of the inputs
+        and settings. None disables the cache.
+        :param delimiter: str - delimiter of CSV inputs.
+        """
+
+        # assert numpy availability.
+        if np is None:
+            raise ValueError('training sets are built through numpy, which is not installed')
+
+        # initialise logger.
+        self.logger: InMemoryLogger = InMemoryLogger()
+
+        # base path.
+        self._base_path: str = os_split_path(os_split_path(realpath(__file__))[0])[0]
+
+        # settings.
+        self._cache_path: str = os_path_join(self._base_path, *cache_path) if cache_path else None
+        self._delimiter: str = delimiter
+
+    def build(self, charts_file: list, features_file: list, track_data_file: list = None, regions: list = None,
+              use_cache: bool = True) -> TrainingSet:
+        """
+        Builds the training set, or loads it from the cache when none of its inputs changed.
+        :param charts_file: list - inner project path towards the consolidated weekly charts table.
+        :param features_file: list - inner project path towards the consolidated audio features table.
+        :param track_data_file: list - inner project path towards the consolidated track data table, optional.
+        :param regions: list - regions to label, every region when None.
+        :param use_cache: bool - whether a cached set is reused.
+        :return: TrainingSet
+        """
+
+        # assert input.
+        for name, value in (('charts_file', charts_file), ('features_file', features_file)):
+            if not isinstance(value, list) or len(value) == 0:
+                self.logger.error(f'expected a valid non empty list for {name}, but found {value}')
+                raise ValueError(f'expected a valid non empty list for {name}, but found {value}')
+        if regions is not None and (not isinstance(regions, list) or len(regions) == 0):
+            self.logger.error(f'expected a valid non empty list, but found {regions} of type {type(regions)}')
+            raise ValueError(f'expected a valid non empty list, but found {regions} of type {type(regions)}')
+
+        # resolve inputs.
+        files = {'charts': os_path_join(self._base_path, *charts_file),
+                 'features': os_path_join(self._base_path, *features_file)}
+        if track_data_file:
+            files['track_data'] = os_path_join(self._base_path, *track_data_file)
+        for file in files.values():
+            if not exists(file):
+                self.logger.error(f'input table {file} does not exist')
+                raise ValueError(f'input table {file} does not exist')
+
+        # cached set.
+        cache_file = None
+        if self._cache_path is not None:
+            cache_file = os_path_join(self._cache_path, f'{self._cache_key(files=files, regions=regions)}.npz')
+            if use_cache and isfile(cache_file):
+                self.logger.info(f'training set loaded from cache {cache_file}')
+                with np.load(cache_file, allow_pickle=False) as cached:
+                    return TrainingSet(arrays=dict(cached))
+
+        # build.
+        training_set = self._build(files=files, regions=regions)
+
+        # cache set.
+        if cache_file is not None:
+            makedirs(self._cache_path, exist_ok=True)
+            with open(f'{cache_file}.{getpid()}.tmp', 'wb') as f:
+                np.savez(f, **training_set.arrays())
+            replace(f'{cache_file}.{getpid()}.tmp', cache_file)
+            self.logger.info(f'training set cached at {cache_file}')
+
+        return training_set
+
+    def _cache_key(self, files: dict, regions: list) -> str:
+        """
+        Hashes the contents of every input along with the build settings.
+        :param files: dict - input name and path, npy tables are directories.
+        :param regions: list - regions to label.
+        :return: str
+        """
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps({
+            'version': self.cache_version, 'regions': sorted(regions) if regions is not None else None,
+            'bounds': self.label_bounds,
+            'features': self.feature_fields, 'tracks': self.track_fields if 'track_data' in files else None
+        }).encode('utf-8'))
+        for name in sorted(files):
+            paths = [os_path_join(files[name], file) for file in sorted(listdir(files[name]))] \
+                if isdir(files[name]) else [files[name]]
+            for file in paths:
+                digest.update(name.encode('utf-8'))
+                with open(file, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def _build(self, files: dict, regions: list) -> TrainingSet:
+
+        # logger.
+        self.logger.info('initialising training set building')
+
+        # charts.
+        charts = read_columns(file=files['charts'], fields=self.chart_fields, types=self.chart_types,
+                              delimiter=self._delimiter)
+        keep = (charts['track_position'] > 0) & (charts['track_id'] != '')
+        if regions is not None:
+            keep &= np.isin(charts['region'], regions)
+        charts = {field: values[keep] for field, values in charts.items()}
+
+        # one group per region and track.
+        region_names, region_codes = np.unique(charts['region'], return_inverse=True)
+        track_names, track_codes = np.unique(charts['track_id'], return_inverse=True)
+        groups = region_codes.astype(np.int64) * len(track_names) + track_codes
+        _, date_codes = np.unique(charts['date_to'], return_inverse=True)
+
+        # best position first within each group, latest week first among ties.
+        order = np.lexsort((-date_codes, charts['track_position'], groups))
+        sorted_groups = groups[order]
+        starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]) if len(order) else order
+        peaks = order[starts]
+
+        # distinct weeks per group, duplicated chart rows count once.
+        n_dates = int(date_codes.max(initial=-1)) + 1
+        weeks = np.unique(groups * n_dates + date_codes)
+        weeks_on_chart = np.unique(weeks // n_dates, return_counts=True)[1] if n_dates else weeks
+
+        # logger.
+        self.logger.info(f'{len(peaks)} track and region pairs found over {len(region_names)} regions')
+
+        # bucket peak positions into labels.
+        peak_position = charts['track_position'][peaks]
+        y = np.searchsorted(self.label_bounds, peak_position, side='left')
+        labelled = y < len(self.label_bounds)
+
+        # features of every track, joined by sorted track id.
+        features, feature_names = self._features(files=files)
+        feature_ids = features.pop('track_id')
+        feature_order = np.argsort(feature_ids, kind='stable')
+        row_ids = charts['track_id'][peaks]
+        positions = np.searchsorted(feature_ids[feature_order], row_ids)
+        positions = np.minimum(positions, max(len(feature_ids) - 1, 0))
+        matched = feature_ids[feature_order][positions] == row_ids if len(feature_ids) else np.zeros(len(peaks), bool)
+        rows = labelled & matched
+        feature_rows = feature_order[positions[rows]]
+
+        # logger.
+        self.logger.info(f'{int(rows.sum())} rows labelled, {int((~matched).sum())} without features and '
+                         f'{int((~labelled).sum())} beyond the top {self.label_bounds[-1]} dropped')
+
+        return TrainingSet(arrays={
+            'regions': charts['region'][peaks][rows], 'track_ids': row_ids[rows],
+            'feature_names': np.array(feature_names),
+            'X': np.column_stack([features[name][feature_rows] for name in feature_names]) if feature_names else
+            np.empty((int(rows.sum()), 0)),
+            'label_names': np.array([f'top {bound}' for bound in self.label_bounds]),
+            'y': y[rows].astype(np.int8),
+            'peak_position': peak_position[rows].astype(np.int32),
+            'peak_streams': charts['track_streams'][peaks][rows],
+            'peak_date': charts['date_to'][peaks][rows],
+            'weeks_on_chart': weeks_on_chart[rows].astype(np.int32)
+        })
+
+    def read_features(self, features_file: list, track_data_file: list = None) -> tuple:
+        """
+        Reads the feature matrix of every track, with the same columns the training set is built with.
+        :param features_file: list - inner project path towards the consolidated audio features table.
+        :param track_data_file: list - inner project path towards the consolidated track data table, optional.
+        :return: tuple - track ids, tracks x features float64 matrix and feature names.
+        """
+
+        # resolve inputs.
+        files = {'features': os_path_join(self._base_path, *features_file)}
+        if track_data_file:
+            files['track_data'] = os_path_join(self._base_path, *track_data_file)
+
+        # read features.
+        features, feature_names = self._features(files=files)
+        track_ids = features.pop('track_id')
+
+        return track_ids, np.column_stack([features[name] for name in feature_names]), feature_names
+
+    def _features(self, files: dict) -> tuple:
+        """
+        Reads audio features, and track data when available, into one array per feature keyed by track.
+        :param files: dict - input name and path.
+        :return: tuple - arrays per field including track_id, and feature names in column order.
+        """
+
+        # audio features.
+        features = read_columns(file=files['features'], fields=self.feature_fields, types=self.feature_types,
+                                delimiter=self._delimiter)
+        feature_names = self.feature_fields[1:]
+
+        # track data, left joined into the audio features.
+        if 'track_data' in files:
+            tracks = read_columns(file=files['track_data'], fields=self.track_fields, types=self.track_types,
+                                  delimiter=self._delimiter)
+            track_order = np.argsort(tracks['track_id'], kind='stable')
+            positions = np.minimum(np.searchsorted(tracks['track_id'][track_order], features['track_id']),
+                                   max(len(track_order) - 1, 0))
+            matched = tracks['track_id'][track_order][positions] == features['track_id'] \
+                if len(track_order) else np.zeros(len(features['track_id']), bool)
+            for name in self.track_fields[1:]:
+                values = np.full(len(features['track_id']), np.nan)
+                values[matched] = tracks[name][track_order[positions[matched]]]
+                features[name] = values
+                feature_names.append(name)
+
+        return features, feature_names
+
+
+if __name__ == '__main__':
+
+    # instantiate a new builder, caching sets keyed by their inputs.
+    tsb = TrainingSetBuilder(cache_path=['data', 'cache', 'training-set'])
+
+    # build the training set of every region.
+    ts = tsb.build(
+        charts_file=['data', 'consolidated', 'spotify-charts-weekly-top-charts', 'consolidated_weekly_charts.csv'],
+        features_file=['data', 'consolidated', 'spot-track-audio-features', 'consolidated_audio_features.csv'],
+        track_data_file=['data', 'consolidated', 'spot-track-data', 'consolidated_track_data.csv'],
+        # regions=['global']
+    )
+    tsb.logger.info(f'{len(ts)} rows and {len(ts.feature_names)} features, label counts '
+                    f'{dict(zip(ts.label_names, np.bincount(ts.y, minlength=len(ts.label_names)).tolist()))}')
@@ -0,0 +1,355 @@
+import re
+
+from os.path import join as os_path_join, splitext, split as os_split_path, realpath
+
+from utils.html_tables import iter_table_rows
+from utils.parser import Parser
+
+
+class KworbParser(Parser):
+
+    # parsed tables, column names and types.
+    schemas = {
+        'track_charts': {
+            'fields': ['track_id', 'region', 'date', 'position', 'streams'],
+            'types': ['str', 'str', 'str', 'int', 'int']
+        },
+        'region_totals': {
+            'fields': [
+                'region', 'interval', 'track_id', 'artist_id', 'artist_and_title', 'weeks', 'top_10', 'peak',
+                'peak_count', 'peak_streams', 'total_streams'
+            ],
+            'types': ['str', 'str', 'str', 'str', 'str', 'int', 'int', 'int', 'int', 'int', 'int']
+        }
+    }
+
+    # region totals headers, as shown by kworb, and the column each one is stored into.
+    region_totals_headers = {
+        'artist and title': 'artist_and_title', 'wks': 'weeks', 't10': 'top_10', 'pk': 'peak', '(x?)': 'peak_count',
+        'pkstreams': 'peak_streams', 'total': 'total_streams'
+    }
+
+    # numbers within a cell, e.g. "3 (1,234,567)" holds a position and its streams.
+    _number = re.compile(r'\d[\d,]*')
+    _streams = re.compile(r'\(\s*(\d[\d,]*)\s*\)')
+
+    def __init__(self, output_format: str = 'csv'):
+        """
+        Initialise kworb charts parser.
+        :param output_format: str - format of parsed and consolidated tables, one of csv, parquet, npy or columnar.
+        """
+
+        # initialise superclass.
+        super().__init__(output_format=output_format)
+
+        # base path.
+        self._base_path = os_split_path(os_split_path(os_split_path(realpath(__file__))[0])[0])[0]
+
+        # initialise data container.
+        self._data_container: list = list()
+
+    def _clear_containers(self):
+
+        # clear all containers.
+        super()._clear_containers()
+        self._data_container.clear()
+
+    @classmethod
+    def _to_number(cls, value: str):
+
+        # first number of a cell, without thousands separators.
+        match = cls._number.search(value or '')
+
+        return int(match.group(0).replace(',', '')) if match is not None else None
+
+    @staticmethod
+    def _link_id(links: list, kind: str):
+
+        # id of the first link towards a kworb page of the given kind, e.g. ../track/<id>.html.
+        for link in links:
+            parts = link.replace('\\', '/').split('/')
+            if len(parts) >= 2 and parts[-2] == kind:
+                return splitext(parts[-1])[0]
+
+        return None
+
+    def parse_track_files(self, input_files_path: list, output_files_path: list, limit: int = 99999,
+                          workers: int = 1, shard: str = None):
+        """
+        Parses kworb track chart history HTML files into long format rows of track, region, date, position and
+        streams.
+        :param input_files_path: str - inner project path from which to draw files.
+        :param output_files_path: str - inner project path from which to store parsed files.
+        :param limit: int - max files to parse.
+        :param workers: int - amount of processes parsing files in parallel.
+        :param shard: str - i/n, parse only the i-th of n deterministic shards of the input files.
+        :return:
+        """
+
+        # logger.
+        self.logger.info('initialising kworb track files parsing')
+
+        # parse files.
+        self._parse_html_files(
+            input_files_path=input_files_path, output_files_path=output_files_path, limit=limit, workers=workers,
+            shard=shard, method_name='_parse_track_files'
+        )
+
+    def _parse_track_files(self, output_path: list, raw_data: str, file_name: str):
+
+        # track id, files are stored as <track_id>.html.
+        track_id: str = os_split_path(splitext(file_name)[0])[1]
+
+        # chart history tables are headed by a date column followed by one column per region.
+        regions: dict = dict()
+        for table, header, cells, _ in iter_table_rows(file=raw_data):
+            # header row.
+            if header:
+                regions[table] = [cell.lower() for cell in cells[1:]] if cells[0].lower() == 'date' else None
+                continue
+            # other tables.
+            if regions.get(table) is None:
+                continue
+            # one row per charting region.
+            column_date: str = cells[0].replace('/', '-')
+            for column_region, cell in zip(regions[table], cells[1:]):
+                # parse data into sql format.
+                column_position = self._to_number(value=self._streams.sub('', cell))
+                if column_position is None:
+                    continue
+                streams = self._streams.search(cell)
+                column_streams = self._to_number(value=streams.group(1)) if streams is not None else None
+                # append data to container.
+                self._data_container.append(
+                    tuple([track_id, column_region, column_date, column_position, column_streams])
+                )
+
+        # logger.
+        self.logger.info(f'track file {file_name} parsed, now saving data to a new file')
+
+        # save file to parsed folder.
+        super()._write_table(
+            output_path=output_path, file_name=track_id, fields=self.schemas['track_charts']['fields'],
+            types=self.schemas['track_charts']['types'], rows=self._data_container
+        )
+        # clear data container.
+        self._data_container.clear()
+        # logger.
+        self.logger.info(f'track file {file_name} parsed data saved')
+
+    def parse_region_files(self, input_files_path: list, output_files_path: list, limit: int = 99999,
+                           workers: int = 1, shard: str = None):
+        """
+        Parses kworb region totals HTML files into one row per track and region.
+        :param input_files_path: str - inner project path from which to draw files.
+        :param output_files_path: str - inner project path from which to store parsed files.
+        :param limit: int - max files to parse.
+        :param workers: int - amount of processes parsing files in parallel.
+        :param shard: str - i/n, parse only the i-th of n deterministic shards of the input files.
+        :return:
+        """
+
+        # logger.
+        self.logger.info('initialising kworb region files parsing')
+
+        # parse files.
+        self._parse_html_files(
+            input_files_path=input_files_path, output_files_path=output_files_path, limit=limit, workers=workers,
+            shard=shard, method_name='_parse_region_files'
+        )
+
+    def _parse_region_files(self, output_path: list, raw_data: str, file_name: str):
+
+        # region and interval, files are stored as <region>-<interval>.html.
+        parsed_name: str = os_split_path(splitext(file_name)[0])[1]
+        column_region, _, column_interval = parsed_name.rpartition('-')
+
+        # totals table, located by its headers.
+        positions: dict = dict()
+        for table, header, cells, links in iter_table_rows(file=raw_data):
+            # header row.
+            if header:
+                columns = [self.region_totals_headers.get(cell.lower()) for cell in cells]
+                positions[table] = {column: index for index, column in enumerate(columns) if column is not None} \
+                    if 'artist_and_title' in columns else None
+                continue
+            # other tables.
+            position = positions.get(table)
+            if position is None:
+                continue
+            # parse data into sql format.
+            title = position.get('artist_and_title')
+            column_track_id: str = self._link_id(links=links[title], kind='track')
+            column_artist_id: str = self._link_id(links=links[title], kind='artist')
+            values = [
+                self._to_number(value=cells[position[column]]) if column in position and position[column] < len(cells)
+                else None
+                for column in ('weeks', 'top_10', 'peak', 'peak_count', 'peak_streams', 'total_streams')
+            ]
+            # append data to container.
+            self._data_container.append(
+                tuple([column_region, column_interval, column_track_id, column_artist_id, cells[title], *values])
+            )
+
+        # logger.
+        self.logger.info(f'region file {file_name} parsed, now saving data to a new file')
+
+        # save file to parsed folder.
+        super()._write_table(
+            output_path=output_path, file_name=parsed_name, fields=self.schemas['region_totals']['fields'],
+            types=self.schemas['region_totals']['types'], rows=self._data_container
+        )
+        # clear data container.
+        self._data_container.clear()
+        # logger.
+        self.logger.info(f'region file {file_name} parsed data saved')
+
+    def _parse_html_files(self, input_files_path: list, output_files_path: list, limit: int, workers: int,
+                          shard: str, method_name: str):
+
+        # clear all containers.
+        self._clear_containers()
+
+        # assert files_path.
+        if not isinstance(input_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(input_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(input_files_path)}')
+        elif len(input_files_path) == 0:
+            self.logger.error('empty input_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty input_files_path list was supplied, at least one valid path is required')
+        if not isinstance(output_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(output_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(output_files_path)}')
+        elif len(output_files_path) == 0:
+            self.logger.error('empty output_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty output_files_path list was supplied, at least one valid path is required')
+
+        # list files from container folder, keeping only the requested shard.
+        files: list = super()._shard_files(
+            files=super()._list_files(path=os_path_join(self._base_path, *input_files_path),
+                                      allowed_extensions=('.html',), max_files=limit),
+            shard=shard
+        )
+
+        # iterate and parse files, pages are tokenized as they are read.
+        super()._parse_files(
+            files=files, method_name=method_name, workers=workers, output_path=output_files_path
+        )
+
+    def consolidate_track_files(self, input_files_path: list, output_files_path: list, output_file_name: str,
+                                delimiter: str = ',', limit: int = 99999, incremental: bool = True):
+        """
+        Consolidates parsed kworb track files into a single file.
+        :param input_files_path: str - inner project path from which to draw files.
+        :param output_files_path: str - inner project path from which to store parsed files.
+        :param output_file_name: str - name of the consolidated file that will be created.
+        :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
+        :param limit: int - max files to parse.
+        :param incremental: bool - whether only new files are appended to the previous consolidated file, which is
+        rebuilt from scratch when any file it holds was modified or deleted.
+        :return:
+        """
+
+        # logger.
+        self.logger.info('initialising kworb track files consolidation')
+
+        # consolidate files.
+        self._consolidate_html_files(
+            input_files_path=input_files_path, output_files_path=output_files_path,
+            output_file_name=output_file_name, delimiter=delimiter, limit=limit, incremental=incremental
+        )
+
+    def consolidate_region_files(self, input_files_path: list, output_files_path: list, output_file_name: str,
+                                 delimiter: str = ',', limit: int = 99999, incremental: bool = True):
+        """
+        Consolidates parsed kworb region files into a single file.
+        :param input_files_path: str - inner project path from which to draw files.
+        :param output_files_path: str - inner project path from which to store parsed files.
+        :param output_file_name: str - name of the consolidated file that will be created.
+        :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
+        :param limit: int - max files to parse.
+        :param incremental: bool - whether only new files are appended to the previous consolidated file, which is
+        rebuilt from scratch when any file it holds was modified or deleted.
+        :return:
+        """
+
+        # logger.
+        self.logger.info('initialising kworb region files consolidation')
+
+        # consolidate files.
+        self._consolidate_html_files(
+            input_files_path=input_files_path, output_files_path=output_files_path,
+            output_file_name=output_file_name, delimiter=delimiter, limit=limit, incremental=incremental
+        )
+
+    def _consolidate_html_files(self, input_files_path: list, output_files_path: list, output_file_name: str,
+                                delimiter: str, limit: int, incremental: bool):
+
+        # clear all containers.
+        self._clear_containers()
+
+        # input files path.
+        if not isinstance(input_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(input_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(input_files_path)}')
+        elif len(input_files_path) == 0:
+            self.logger.error('empty input_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty input_files_path list was supplied, at least one valid path is required')
+        # output files path.
+        if not isinstance(output_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(output_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(output_files_path)}')
+        elif len(output_files_path) == 0:
+            self.logger.error('empty output_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty output_files_path list was supplied, at least one valid path is required')
+        # output file name.
+        if not isinstance(output_file_name, str) or len(output_file_name) == 0:
+            self.logger.error(f'expected a non empty string argument, not {type(output_file_name)}')
+            raise ValueError(f'expected a non empty string argument, not {type(output_file_name)}')
+
+        # read files from container folder.
+        super()._read_files(path=os_path_join(self._base_path, *input_files_path),
+                            allowed_extensions=super()._table_extensions(), max_files=limit)
+
+        # csv files are concatenated at byte level whenever they share header and dialect.
+        super()._consolidate_output(
+            output_path=output_files_path, file_name=output_file_name, delimiter=delimiter, incremental=incremental
+        )
+
+
+if __name__ == '__main__':
+
+    # instantiate a new kworb parser.
+    kp = KworbParser()
+
+    # typed columnar output, parquet when pyarrow is installed and one .npy file per column otherwise.
+    # kp = KworbParser(output_format='columnar')
+
+    # trigger track files parsing.
+    # kp.parse_track_files(
+    #     input_files_path=['data', 'raw', 'kworb-charts-track'],
+    #     output_files_path=['data', 'parsed', 'kworb-charts-track'],
+    #     # limit=2,
+    #     # workers=8
+    # )
+
+    # trigger track files consolidating.
+    # kp.consolidate_track_files(
+    #     input_files_path=['data', 'parsed', 'kworb-charts-track'],
+    #     output_files_path=['data', 'consolidated', 'kworb-charts-track'],
+    #     output_file_name='consolidated_kworb_track_charts'
+    # )
+
+    # trigger region files parsing.
+    # kp.parse_region_files(
+    #     input_files_path=['data', 'raw', 'kworb-charts-region'],
+    #     output_files_path=['data', 'parsed', 'kworb-charts-region'],
+    #     # workers=8
+    # )
+
+    # trigger region files consolidating.
+    # kp.consolidate_region_files(
+    #     input_files_path=['data', 'parsed', 'kworb-charts-region'],
+    #     output_files_path=['data', 'consolidated', 'kworb-charts-region'],
+    #     output_file_name='consolidated_kworb_region_totals'
+    # )
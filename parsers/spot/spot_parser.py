@@ -1,19 +1,104 @@
-import csv
-
 from operator import itemgetter
 from os.path import join as os_path_join, splitext, split as os_split_path, realpath
 
 from apis.spot.base.spot_endpoints import SpotifyTrackEndpoints
 
+from utils.interval_index import interval_levels
 from utils.parser import Parser
 
 
 class SpotTrackParser(Parser):
 
-    def __init__(self):
+    # parsed tables, column names and types.
+    schemas = {
+        'audio_features': {
+            'fields': [
+                'track_id', 'duration_ms', 'time_signature', 'tempo', 'key', 'mode', 'valence', 'liveness',
+                'instrumentalness', 'acousticness', 'speechiness', 'loudness', 'energy', 'danceability'
+            ],
+            'types': [
+                'str', 'int', 'int', 'float', 'int', 'int', 'float', 'float', 'float', 'float', 'float', 'float',
+                'float', 'float'
+            ]
+        },
+        'track_data': {
+            'fields': [
+                'track_id', 'track_name', 'type', 'popularity', 'duration_ms', 'is_explicit', 'is_local', 'artist_id',
+                'artist_name', 'artist_type', 'feat_artists_id', 'feat_artists_name', 'album_id', 'album_name',
+                'album_type', 'album_release_date', 'album_total_tracks'
+            ],
+            'types': [
+                'str', 'str', 'str', 'int', 'int', 'bool', 'bool', 'str', 'str', 'str', 'str', 'str', 'str', 'str',
+                'str', 'str', 'int'
+            ]
+        },
+        'meta': {
+            'fields': [
+                'track_id', 'analyzer_version', 'platform', 'detailed_status', 'status_code', 'timestamp',
+                'analysis_time', 'input_process'
+            ],
+            'types': ['str', 'str', 'str', 'str', 'int', 'int', 'float', 'str']
+        },
+        'track': {
+            'fields': [
+                'track_id', 'num_samples', 'duration', 'sample_md5', 'offset_seconds', 'window_seconds',
+                'analysis_sample_rate', 'analysis_channels', 'end_of_fade_in', 'start_of_fade_out', 'loudness',
+                'tempo', 'tempo_confidence', 'time_signature', 'time_signature_confidence', 'key', 'key_confidence',
+                'mode', 'mode_confidence', 'code_string', 'code_version', 'echo_print_string', 'echo_print_version',
+                'synch_string', 'synch_string_version', 'rhythm_string', 'rhythm_string_version'
+            ],
+            'types': [
+                'str', 'int', 'float', 'str', 'float', 'float', 'int', 'int', 'float', 'float', 'float', 'float',
+                'float', 'int', 'float', 'int', 'float', 'int', 'float', 'str', 'float', 'str', 'float', 'str',
+                'float', 'str', 'float'
+            ]
+        },
+        'bars': {
+            'fields': ['track_id', 'bar_index', 'start', 'duration', 'confidence'],
+            'types': ['str', 'int', 'float', 'float', 'float']
+        },
+        'beats': {
+            'fields': ['track_id', 'beat_index', 'start', 'duration', 'confidence'],
+            'types': ['str', 'int', 'float', 'float', 'float']
+        },
+        'sections': {
+            'fields': [
+                'track_id', 'section_index', 'start', 'duration', 'confidence', 'loudness', 'tempo',
+                'tempo_confidence', 'key', 'key_confidence', 'mode', 'mode_confidence', 'time_signature',
+                'time_signature_confidence'
+            ],
+            'types': [
+                'str', 'int', 'float', 'float', 'float', 'float', 'float', 'float', 'int', 'float', 'int', 'float',
+                'int', 'float'
+            ]
+        },
+        'segments': {
+            'fields': [
+                'track_id', 'segment_index', 'start', 'duration', 'confidence', 'loudness_start', 'loudness_max_time',
+                'loudness_max', 'loudness_end', 'pitches', 'timbre'
+            ],
+            'types': ['str', 'int', 'float', 'float', 'float', 'float', 'float', 'float', 'float', 'str', 'str']
+        },
+        'tatums': {
+            'fields': ['track_id', 'tatum_index', 'start', 'duration', 'confidence'],
+            'types': ['str', 'int', 'float', 'float', 'float']
+        }
+    }
+
+    # segment vectors stored as float32 matrices, values per segment.
+    segment_vectors = {'pitches': 12, 'timbre': 12}
+
+    # levels stored as float64 [start, duration] interval matrices.
+    interval_levels = interval_levels
+
+    def __init__(self, output_format: str = 'csv'):
+        """
+        Initialise SPOT track parser.
+        :param output_format: str - format of parsed and consolidated tables, one of csv, parquet, npy or columnar.
+        """
 
         # initialise superclass.
-        super().__init__()
+        super().__init__(output_format=output_format)
 
         # base path.
         self._base_path = os_split_path(os_split_path(os_split_path(realpath(__file__))[0])[0])[0]
@@ -28,12 +113,15 @@ class SpotTrackParser(Parser):
         self._data_container.clear()
         self._track_data_container.clear()
 
-    def parse_audio_features_files(self, input_files_path: list, output_files_path: list, limit=999999):
+    def parse_audio_features_files(self, input_files_path: list, output_files_path: list, limit=999999,
+                                   workers: int = 1, shard: str = None):
         """
         Parses SPOT audio features JSON files.
         :param input_files_path: str - inner project path from which to draw files.
         :param output_files_path: str - inner project path from which to store parsed files.
         :param limit: int - max files to parse.
+        :param workers: int - amount of processes parsing files in parallel.
+        :param shard: str - i/n, parse only the i-th of n deterministic shards of the input files.
         :return:
         """
 
@@ -57,19 +145,17 @@ class SpotTrackParser(Parser):
             self.logger.error('empty output_files_path list was supplied, at least one valid path is required')
             raise ValueError('empty output_files_path list was supplied, at least one valid path is required')
 
-        # read files from container folder.
-        super()._read_files(path=os_path_join(self._base_path, *input_files_path), allowed_extensions=('.json',),
-                            max_files=limit)
-
-        # iterate and parse files container.
-        files: int = len(self._raw_data_container)
-        for index, file in enumerate(self._raw_data_container):
-            # logger.
-            self.logger.info(f'iterating file {self._files_container[index]} - {index + 1} of {files}')
-            # summon parser.
-            self._parse_audio_features_files(
-                output_path=output_files_path, raw_data=file, file_name=self._files_container[index]
-            )
+        # list files from container folder, keeping only the requested shard.
+        files: list = super()._shard_files(
+            files=super()._list_files(path=os_path_join(self._base_path, *input_files_path),
+                                      allowed_extensions=('.json',), max_files=limit),
+            shard=shard
+        )
+
+        # iterate and parse files.
+        super()._parse_files(
+            files=files, method_name='_parse_audio_features_files', workers=workers, output_path=output_files_path
+        )
 
     def _parse_audio_features_files(self, output_path: list, raw_data: dict, file_name: str):
 
@@ -89,23 +175,15 @@ class SpotTrackParser(Parser):
         self.logger.info(f'audio features file {file_name} parsed, now saving data to a new file')
 
         # save file to parsed folder.
-        fields = [
-            'track_id', 'duration_ms', 'time_signature', 'tempo', 'key', 'mode', 'valence', 'liveness',
-            'instrumentalness',
-            'acousticness', 'speechiness', 'loudness', 'energy', 'danceability'
-        ]
-        parsed_file_path = os_path_join(self._base_path, *output_path, f'{parsed_name}.csv')
-        with open(parsed_file_path, 'w', newline='', encoding='utf-8') as f:
-            # instantiate a new csv writer.
-            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
-            # write headers.
-            writer.writerow(fields)
-            # write contents.
-            writer.writerows(self._data_container)
-            # clear data container.
-            self._data_container.clear()
-            # logger.
-            self.logger.info(f'audio features file {file_name} parsed data saved')
+        fields = self.schemas['audio_features']['fields']
+        types = self.schemas['audio_features']['types']
+        super()._write_table(
+            output_path=output_path, file_name=parsed_name, fields=fields, types=types, rows=self._data_container
+        )
+        # clear data container.
+        self._data_container.clear()
+        # logger.
+        self.logger.info(f'audio features file {file_name} parsed data saved')
 
     def _parse_audio_features_file(self, data: dict):
 
@@ -138,7 +216,7 @@ class SpotTrackParser(Parser):
         self.logger.info(f'successfully parsed track id {column_id}')
 
     def consolidate_audio_files_files(self, input_files_path: list, output_files_path: list, output_file_name: str,
-                                      delimiter: str = ',', limit: int = 99999):
+                                      delimiter: str = ',', limit: int = 99999, incremental: bool = True):
         """
         Consolidates parsed audio features CSV files into a single CSV file.
         :param input_files_path: str - inner project path from which to draw files.
@@ -146,6 +224,8 @@ class SpotTrackParser(Parser):
         :param output_file_name: str - name of the consolidated CSV file that will be created.
         :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
         :param limit: int - max files to parse.
+        :param incremental: bool - whether only new files are appended to the previous consolidated file, which is
+        rebuilt from scratch when any file it holds was modified or deleted.
         :return:
         """
 
@@ -175,50 +255,32 @@ class SpotTrackParser(Parser):
             raise ValueError(f'expected a non empty string argument, not {type(output_file_name)}')
 
         # read files from container folder.
-        super()._read_files(path=os_path_join(self._base_path, *input_files_path), allowed_extensions=('.csv',),
-                            max_files=limit)
+        super()._read_files(path=os_path_join(self._base_path, *input_files_path),
+                            allowed_extensions=super()._table_extensions(), max_files=limit)
 
         # consolidate files.
         self._consolidate_files(
-            output_path=output_files_path, file_name=output_file_name, delimiter=delimiter
+            output_path=output_files_path, file_name=output_file_name, delimiter=delimiter,
+            incremental=incremental
         )
 
-    def _consolidate_files(self, output_path: list, file_name: str, delimiter: str):
-
-        # open consolidated file.
-        final_output_path = os_path_join(self._base_path, *output_path, f'{file_name}.csv')
-        with open(final_output_path, 'w', newline='', encoding='utf-8') as output_csv:
-
-            # instantiate a new csv writer.
-            writer = csv.writer(output_csv, quoting=csv.QUOTE_ALL)
-
-            # iterate and parse files container.
-            files: int = len(self._raw_data_container)
-            for index, file in enumerate(self._raw_data_container):
-                # logger.
-                self.logger.info(f'iterating file {self._files_container[index]} - {index + 1} of {files}')
-                # open input csv.
-                with open(file, 'r', encoding='utf-8') as input_file:
-                    # read input csv file.
-                    csv_reader = csv.reader(input_file, delimiter=delimiter)
-                    # skip header, except for the first file.
-                    if index != 0:
-                        next(csv_reader, None)
-                    # write lines to output file.
-                    for row in csv_reader:
-                        writer.writerow(row)
-                    # logger.
-                    self.logger.info(f'file {file} consolidated')
+    def _consolidate_files(self, output_path: list, file_name: str, delimiter: str, incremental: bool = False):
 
-        # logger.
-        self.logger.info('all files have been consolidated')
+        # csv files are concatenated at byte level whenever they share header and dialect, columnar tables are
+        # appended by column batches.
+        super()._consolidate_output(
+            output_path=output_path, file_name=file_name, delimiter=delimiter, incremental=incremental
+        )
 
-    def parse_track_data_files(self, input_files_path: list, output_files_path: list, limit=99999):
+    def parse_track_data_files(self, input_files_path: list, output_files_path: list, limit=99999,
+                               workers: int = 1, shard: str = None):
         """
         Parses SPOT track data JSON files.
         :param input_files_path: str - inner project path from which to draw files.
         :param output_files_path: str - inner project path from which to store parsed files.
         :param limit: int - max files to parse.
+        :param workers: int - amount of processes parsing files in parallel.
+        :param shard: str - i/n, parse only the i-th of n deterministic shards of the input files.
         :return:
         """
 
@@ -242,19 +304,17 @@ class SpotTrackParser(Parser):
             self.logger.error('empty output_files_path list was supplied, at least one valid path is required')
             raise ValueError('empty output_files_path list was supplied, at least one valid path is required')
 
-        # read files from container folder.
-        super()._read_files(path=os_path_join(self._base_path, *input_files_path), allowed_extensions=('.json',),
-                            max_files=limit)
-
-        # iterate and parse files container.
-        files: int = len(self._raw_data_container)
-        for index, file in enumerate(self._raw_data_container):
-            # logger.
-            self.logger.info(f'iterating file {self._files_container[index]} - {index + 1} of {files}')
-            # summon parser.
-            self._parse_track_data_files(
-                output_path=output_files_path, raw_data=file, file_name=self._files_container[index]
-            )
+        # list files from container folder, keeping only the requested shard.
+        files: list = super()._shard_files(
+            files=super()._list_files(path=os_path_join(self._base_path, *input_files_path),
+                                      allowed_extensions=('.json',), max_files=limit),
+            shard=shard
+        )
+
+        # iterate and parse files.
+        super()._parse_files(
+            files=files, method_name='_parse_track_data_files', workers=workers, output_path=output_files_path
+        )
 
     def _parse_track_data_files(self, output_path: list, raw_data: dict, file_name: str):
 
@@ -274,23 +334,15 @@ class SpotTrackParser(Parser):
         self.logger.info(f'track data file {file_name} parsed, now saving data to a new file')
 
         # save file to parsed folder.
-        fields = [
-            'track_id', 'track_name', 'type', 'popularity', 'duration_ms', 'is_explicit', 'is_local', 'artist_id',
-            'artist_name', 'artist_type', 'feat_artists_id', 'feat_artists_name', 'album_id', 'album_name',
-            'album_type', 'album_release_date', 'album_total_tracks'
-        ]
-        parsed_file_path = os_path_join(self._base_path, *output_path, f'{parsed_name}.csv')
-        with open(parsed_file_path, 'w', newline='', encoding='utf-8') as f:
-            # instantiate a new csv writer.
-            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
-            # write headers.
-            writer.writerow(fields)
-            # write contents.
-            writer.writerows(self._data_container)
-            # clear data container.
-            self._data_container.clear()
-            # logger.
-            self.logger.info(f'track data file {file_name} parsed data saved')
+        fields = self.schemas['track_data']['fields']
+        types = self.schemas['track_data']['types']
+        super()._write_table(
+            output_path=output_path, file_name=parsed_name, fields=fields, types=types, rows=self._data_container
+        )
+        # clear data container.
+        self._data_container.clear()
+        # logger.
+        self.logger.info(f'track data file {file_name} parsed data saved')
 
     def _parse_track_data_file(self, data: dict):
 
@@ -332,7 +384,7 @@ class SpotTrackParser(Parser):
         self.logger.info(f'successfully parsed track id {column_track_id}')
 
     def consolidate_track_data_files(self, input_files_path: list, output_files_path: list, output_file_name: str,
-                                     delimiter: str = ',', limit: int = 99999):
+                                     delimiter: str = ',', limit: int = 99999, incremental: bool = True):
         """
         Consolidates parsed track data CSV files into a single CSV file.
         :param input_files_path: str - inner project path from which to draw files.
@@ -340,6 +392,8 @@ class SpotTrackParser(Parser):
         :param output_file_name: str - name of the consolidated CSV file that will be created.
         :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
         :param limit: int - max files to parse.
+        :param incremental: bool - whether only new files are appended to the previous consolidated file, which is
+        rebuilt from scratch when any file it holds was modified or deleted.
         :return:
         """
 
@@ -369,20 +423,24 @@ class SpotTrackParser(Parser):
             raise ValueError(f'expected a non empty string argument, not {type(output_file_name)}')
 
         # read files from container folder.
-        super()._read_files(path=os_path_join(self._base_path, *input_files_path), allowed_extensions=('.csv',),
-                            max_files=limit)
+        super()._read_files(path=os_path_join(self._base_path, *input_files_path),
+                            allowed_extensions=super()._table_extensions(), max_files=limit)
 
         # consolidate files.
         self._consolidate_files(
-            output_path=output_files_path, file_name=output_file_name, delimiter=delimiter
+            output_path=output_files_path, file_name=output_file_name, delimiter=delimiter,
+            incremental=incremental
         )
 
-    def parse_audio_analysis_files(self, input_files_path: list, output_files_path: list, limit=999999):
+    def parse_audio_analysis_files(self, input_files_path: list, output_files_path: list, limit=999999,
+                                   workers: int = 1, shard: str = None):
         """
         Parses SPOT audio analysis JSON files.
         :param input_files_path: str - inner project path from which to draw files.
         :param output_files_path: str - inner project path from which to store parsed files.
         :param limit: int - max files to parse.
+        :param workers: int - amount of processes parsing files in parallel.
+        :param shard: str - i/n, parse only the i-th of n deterministic shards of the input files.
         :return:
         """
 
@@ -406,25 +464,48 @@ class SpotTrackParser(Parser):
             self.logger.error('empty output_files_path list was supplied, at least one valid path is required')
             raise ValueError('empty output_files_path list was supplied, at least one valid path is required')
 
-        # read files from container folder.
-        super()._read_files(path=os_path_join(self._base_path, *input_files_path), allowed_extensions=('.json',),
-                            max_files=limit)
-
-        # iterate and parse files container.
-        files: int = len(self._raw_data_container)
-        for index, file in enumerate(self._raw_data_container):
-            # logger.
-            self.logger.info(f'iterating file {self._files_container[index]} - {index + 1} of {files}')
-            # summon parser.
-            self._parse_audio_analysis_files(
-                output_path=output_files_path, raw_data=file, file_name=self._files_container[index]
-            )
+        # list files from container folder, keeping only the requested shard.
+        files: list = super()._shard_files(
+            files=super()._list_files(path=os_path_join(self._base_path, *input_files_path),
+                                      allowed_extensions=('.json',), max_files=limit),
+            shard=shard
+        )
+
+        # iterate and parse files.
+        super()._parse_files(
+            files=files, method_name='_parse_audio_analysis_files', workers=workers, output_path=output_files_path
+        )
 
     def _parse_audio_analysis_files(self, output_path: list, raw_data: dict, file_name: str):
 
         # fetch filename.
         parsed_name: str = os_split_path(splitext(file_name)[0])[1]
 
+        # build track tables.
+        self._build_audio_analysis_tables(raw_data=raw_data)
+
+        # logger.
+        self.logger.info(f'audio analysis file {file_name} parsed, now saving data to new files')
+
+        # iterate track data keys.
+        for key, value in self._track_data_container.items():
+            # create files.
+            super()._write_table(
+                output_path=output_path, file_name=f'{key}_{parsed_name}', fields=value.get('fields'),
+                types=value.get('types'), rows=value.get('data')
+            )
+
+        # logger.
+        self.logger.info(f'audio analysis file {file_name} parsed data saved')
+
+    def _build_audio_analysis_tables(self, raw_data: dict) -> None:
+        """
+        Builds the meta, track, bars, beats, sections, segments and tatums tables of a single audio analysis
+        document into the track data container.
+        :param raw_data: dict - downloaded audio analysis document.
+        :return: None
+        """
+
         # track id.
         track_id = raw_data.get('id')
 
@@ -435,10 +516,8 @@ class SpotTrackParser(Parser):
 
         # parsing meta.
         self._track_data_container['meta'] = {}
-        self._track_data_container['meta']['fields'] = [
-            'track_id', 'analyzer_version', 'platform', 'detailed_status', 'status_code', 'timestamp',
-            'analysis_time', 'input_process'
-        ]
+        self._track_data_container['meta']['fields'] = self.schemas['meta']['fields']
+        self._track_data_container['meta']['types'] = self.schemas['meta']['types']
         self._track_data_container['meta']['data'] = []
         # destructure data.
         column_analyzer_version: str = meta.get('analyzer_version')
@@ -458,14 +537,8 @@ class SpotTrackParser(Parser):
 
         # parsing track.
         self._track_data_container['track'] = {}
-        self._track_data_container['track']['fields'] = [
-            'track_id', 'num_samples', 'duration', 'sample_md5', 'offset_seconds', 'window_seconds',
-            'analysis_sample_rate', 'analysis_channels', 'end_of_fade_in', 'start_of_fade_out', 'loudness',
-            'tempo', 'tempo_confidence', 'time_signature', 'time_signature_confidence', 'key',
-            'key_confidence', 'mode', 'mode_confidence', 'code_string', 'code_version', 'echo_print_string',
-            'echo_print_version', 'synch_string', 'synch_string_version', 'rhythm_string',
-            'rhythm_string_version'
-        ]
+        self._track_data_container['track']['fields'] = self.schemas['track']['fields']
+        self._track_data_container['track']['types'] = self.schemas['track']['types']
         self._track_data_container['track']['data'] = []
         # destructure data.
         column_num_samples: int = track.get('num_samples')
@@ -510,7 +583,8 @@ class SpotTrackParser(Parser):
 
         # parsing bars.
         self._track_data_container['bars'] = {}
-        self._track_data_container['bars']['fields'] = ['track_id', 'bar_index', 'start', 'duration', 'confidence']
+        self._track_data_container['bars']['fields'] = self.schemas['bars']['fields']
+        self._track_data_container['bars']['types'] = self.schemas['bars']['types']
         self._track_data_container['bars']['data'] = []
         for index, bar in enumerate(bars):
             # destructure data.
@@ -526,7 +600,8 @@ class SpotTrackParser(Parser):
 
         # parsing beats.
         self._track_data_container['beats'] = {}
-        self._track_data_container['beats']['fields'] = ['track_id', 'beat_index', 'start', 'duration', 'confidence']
+        self._track_data_container['beats']['fields'] = self.schemas['beats']['fields']
+        self._track_data_container['beats']['types'] = self.schemas['beats']['types']
         self._track_data_container['beats']['data'] = []
         for index, beat in enumerate(beats):
             # destructure data.
@@ -542,11 +617,8 @@ class SpotTrackParser(Parser):
 
         # parsing sections.
         self._track_data_container['sections'] = {}
-        self._track_data_container['sections']['fields'] = [
-            'track_id', 'section_index', 'start', 'duration', 'confidence',
-            'loudness', 'tempo', 'tempo_confidence', 'key', 'key_confidence', 'mode', 'mode_confidence',
-            'time_signature', 'time_signature_confidence'
-        ]
+        self._track_data_container['sections']['fields'] = self.schemas['sections']['fields']
+        self._track_data_container['sections']['types'] = self.schemas['sections']['types']
         self._track_data_container['sections']['data'] = []
         for index, section in enumerate(sections):
             # destructure data.
@@ -574,11 +646,8 @@ class SpotTrackParser(Parser):
 
         # parsing segments.
         self._track_data_container['segments'] = {}
-        self._track_data_container['segments']['fields'] = [
-            'track_id', 'segment_index', 'start', 'duration', 'confidence',
-            'loudness_start', 'loudness_max_time', 'loudness_max', 'loudness_end',
-            'pitches', 'timbre'
-        ]
+        self._track_data_container['segments']['fields'] = self.schemas['segments']['fields']
+        self._track_data_container['segments']['types'] = self.schemas['segments']['types']
         self._track_data_container['segments']['data'] = []
         for index, segment in enumerate(segments):
             # destructure data.
@@ -602,13 +671,14 @@ class SpotTrackParser(Parser):
 
         # parsing tatums.
         self._track_data_container['tatums'] = {}
-        self._track_data_container['tatums']['fields'] = ['track_id', 'tatum_index', 'start', 'duration', 'confidence']
+        self._track_data_container['tatums']['fields'] = self.schemas['tatums']['fields']
+        self._track_data_container['tatums']['types'] = self.schemas['tatums']['types']
         self._track_data_container['tatums']['data'] = []
-        for index, segment in enumerate(segments):
+        for index, tatum in enumerate(tatums):
             # destructure data.
-            column_start: float = segment.get('start')
-            column_duration: float = segment.get('duration')
-            column_confidence: float = segment.get('confidence')
+            column_start: float = tatum.get('start')
+            column_duration: float = tatum.get('duration')
+            column_confidence: float = tatum.get('confidence')
             # append data.
             self._track_data_container['tatums']['data'].append(
                 tuple([
@@ -616,29 +686,8 @@ class SpotTrackParser(Parser):
                 ])
             )
 
-        # logger.
-        self.logger.info(f'audio analysis file {file_name} parsed, now saving data to new files')
-
-        # iterate track data keys.
-        for key, value in self._track_data_container.items():
-            # destructure container.
-            key_fields = value.get('fields')
-            key_data = value.get('data')
-            # create files.
-            parsed_file_path = os_path_join(self._base_path, *output_path, f'{key}_{parsed_name}.csv')
-            with open(parsed_file_path, 'w', newline='', encoding='utf-8') as f:
-                # instantiate a new csv writer.
-                writer = csv.writer(f, quoting=csv.QUOTE_ALL)
-                # write headers.
-                writer.writerow(key_fields)
-                # write contents.
-                writer.writerows(key_data)
-
-        # logger.
-        self.logger.info(f'audio analysis file {file_name} parsed data saved')
-
     def consolidate_audio_analysis_files(self, input_files_path: list, output_files_path: list, output_file_name: str,
-                                         delimiter: str = ',', limit: int = 99999):
+                                         delimiter: str = ',', limit: int = 99999, incremental: bool = True):
         """
         Consolidates parsed audio analysis CSV files into a single CSV file.
         :param input_files_path: str - inner project path from which to draw files.
@@ -646,6 +695,8 @@ class SpotTrackParser(Parser):
         :param output_file_name: str - name of the consolidated CSV file that will be created.
         :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
         :param limit: int - max files to parse.
+        :param incremental: bool - whether only new files are appended to the previous consolidated file, which is
+        rebuilt from scratch when any file it holds was modified or deleted.
         :return:
         """
 
@@ -676,19 +727,360 @@ class SpotTrackParser(Parser):
             # clear all containers.
             self._clear_containers()
             # read files.
-            super()._read_files(path=os_path_join(self._base_path, *input_files_path), allowed_extensions=('.csv',),
-                                max_files=limit, qualifier=key)
+            super()._read_files(path=os_path_join(self._base_path, *input_files_path),
+                                allowed_extensions=super()._table_extensions(), max_files=limit, qualifier=key)
             # consolidate files.
             self._consolidate_files(
-                output_path=output_files_path, file_name=f'{output_file_name}_{key}', delimiter=delimiter
+                output_path=output_files_path, file_name=f'{output_file_name}_{key}', delimiter=delimiter,
+                incremental=incremental
             )
 
+    def parse_and_consolidate_audio_analysis_files(self, input_files_path: list, output_files_path: list,
+                                                   output_file_name: str, parsed_files_path: list = None,
+                                                   vector_files_path: list = None, limit: int = 999999,
+                                                   shard: str = None):
+        """
+        Parses SPOT audio analysis JSON files straight into the consolidated meta, track, bars, beats, sections,
+        segments and tatums tables in a single pass, without going through one file per track and table.
+        :param input_files_path: str - inner project path from which to draw files.
+        :param output_files_path: str - inner project path from which to store consolidated files.
+        :param output_file_name: str - prefix of the consolidated files that will be created.
+        :param parsed_files_path: str - inner project path where per track parsed files are also stored, they are
+        not written when None.
+        :param vector_files_path: str - inner project path where segment pitches and timbre are also stored as
+        float32 matrices indexed by track_id, along with the interval index of every level, they are not written
+        when None.
+        :param limit: int - max files to parse.
+        :param shard: str - i/n, parse only the i-th of n deterministic shards of the input files.
+        :return:
+        """
+
+        # logger.
+        self.logger.info('initialising audio analysis files parsing and consolidation')
+
+        # clear all containers.
+        self._clear_containers()
+
+        # input files path.
+        if not isinstance(input_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(input_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(input_files_path)}')
+        elif len(input_files_path) == 0:
+            self.logger.error('empty input_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty input_files_path list was supplied, at least one valid path is required')
+        # output files path.
+        if not isinstance(output_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(output_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(output_files_path)}')
+        elif len(output_files_path) == 0:
+            self.logger.error('empty output_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty output_files_path list was supplied, at least one valid path is required')
+        # output file name.
+        if not isinstance(output_file_name, str) or len(output_file_name) == 0:
+            self.logger.error(f'expected a non empty string argument, not {type(output_file_name)}')
+            raise ValueError(f'expected a non empty string argument, not {type(output_file_name)}')
+        # parsed files path.
+        if parsed_files_path is not None and (not isinstance(parsed_files_path, list) or len(parsed_files_path) == 0):
+            self.logger.error(f'expected a non empty list argument, not {type(parsed_files_path)}')
+            raise ValueError(f'expected a non empty list argument, not {type(parsed_files_path)}')
+        # vector files path.
+        if vector_files_path is not None and (not isinstance(vector_files_path, list) or len(vector_files_path) == 0):
+            self.logger.error(f'expected a non empty list argument, not {type(vector_files_path)}')
+            raise ValueError(f'expected a non empty list argument, not {type(vector_files_path)}')
+
+        # list files from container folder, keeping only the requested shard.
+        files: list = super()._shard_files(
+            files=super()._list_files(path=os_path_join(self._base_path, *input_files_path),
+                                      allowed_extensions=('.json',), max_files=limit),
+            shard=shard
+        )
+
+        # consolidated tables, opened along with the first document.
+        tables: dict = dict()
+        # segment vector stores.
+        stores: dict = dict() if vector_files_path is None else self._open_vector_stores(
+            output_path=vector_files_path, file_name=output_file_name
+        )
+
+        try:
+            # iterate documents, one in memory at a time.
+            for index, (file, raw_data) in enumerate(super()._stream_files(files=files)):
+                # logger.
+                self.logger.info(f'iterating file {file} - {index + 1} of {len(files)}')
+                # build track tables.
+                self._build_audio_analysis_tables(raw_data=raw_data)
+                # append rows to every consolidated table.
+                for key, value in self._track_data_container.items():
+                    if key not in tables:
+                        tables[key] = super()._open_table(
+                            output_path=output_files_path, file_name=f'{output_file_name}_{key}',
+                            fields=value.get('fields'), types=value.get('types')
+                        )
+                    tables[key].write_rows(rows=value.get('data'))
+                    # keep per track files when requested.
+                    if parsed_files_path is not None:
+                        super()._write_table(
+                            output_path=parsed_files_path,
+                            file_name=f'{key}_{os_split_path(splitext(file)[0])[1]}',
+                            fields=value.get('fields'), types=value.get('types'), rows=value.get('data')
+                        )
+                # append segment vectors and intervals.
+                self._write_vectors(stores=stores, raw_data=raw_data)
+        finally:
+            # finish consolidated tables and stores.
+            for table in tables.values():
+                table.close()
+            for store in stores.values():
+                store.close()
+
+        # logger.
+        self.logger.info('all files have been parsed and consolidated')
+
+    def parse_audio_analysis_vectors(self, input_files_path: list, output_files_path: list, output_file_name: str,
+                                     limit: int = 999999, shard: str = None):
+        """
+        Parses segment pitches and timbre of SPOT audio analysis JSON files into float32 matrices, one row per
+        segment in segment_index order, indexed by track_id and loadable through numpy.memmap with VectorStore.
+        Start and duration of every level are stored the same way, as float64 matrices queried with IntervalIndex.
+        :param input_files_path: str - inner project path from which to draw files.
+        :param output_files_path: str - inner project path from which to store the vector files.
+        :param output_file_name: str - prefix of the vector files that will be created.
+        :param limit: int - max files to parse.
+        :param shard: str - i/n, parse only the i-th of n deterministic shards of the input files.
+        :return:
+        """
+
+        # logger.
+        self.logger.info('initialising audio analysis vectors parsing')
+
+        # clear all containers.
+        self._clear_containers()
+
+        # input files path.
+        if not isinstance(input_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(input_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(input_files_path)}')
+        elif len(input_files_path) == 0:
+            self.logger.error('empty input_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty input_files_path list was supplied, at least one valid path is required')
+        # output files path.
+        if not isinstance(output_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(output_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(output_files_path)}')
+        elif len(output_files_path) == 0:
+            self.logger.error('empty output_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty output_files_path list was supplied, at least one valid path is required')
+        # output file name.
+        if not isinstance(output_file_name, str) or len(output_file_name) == 0:
+            self.logger.error(f'expected a non empty string argument, not {type(output_file_name)}')
+            raise ValueError(f'expected a non empty string argument, not {type(output_file_name)}')
+
+        # list files from container folder, keeping only the requested shard.
+        files: list = super()._shard_files(
+            files=super()._list_files(path=os_path_join(self._base_path, *input_files_path),
+                                      allowed_extensions=('.json',), max_files=limit),
+            shard=shard
+        )
+
+        # iterate documents, one in memory at a time.
+        stores: dict = self._open_vector_stores(output_path=output_files_path, file_name=output_file_name)
+        try:
+            for index, (file, raw_data) in enumerate(super()._stream_files(files=files)):
+                # logger.
+                self.logger.info(f'iterating file {file} - {index + 1} of {len(files)}')
+                # append segment vectors and intervals.
+                self._write_vectors(stores=stores, raw_data=raw_data)
+        finally:
+            # write indexes.
+            for store in stores.values():
+                store.close()
+
+        # logger.
+        self.logger.info(f'segment vectors and intervals of {len(files)} files have been stored')
+
+    def _open_vector_stores(self, output_path: list, file_name: str) -> dict:
+
+        # one store per vector, e.g. <file_name>_pitches.f32 and <file_name>_pitches.index.json.
+        stores: dict = dict()
+        for key, width in self.segment_vectors.items():
+            stores[key] = super()._open_vector_store(output_path=output_path, file_name=f'{file_name}_{key}',
+                                                     width=width)
+        # one interval store per level, e.g. <file_name>_intervals_beats.f64.
+        for level in self.interval_levels:
+            stores[f'intervals_{level}'] = super()._open_vector_store(
+                output_path=output_path, file_name=f'{file_name}_intervals_{level}', width=2, dtype='float64'
+            )
+
+        return stores
+
+    def _write_vectors(self, stores: dict, raw_data: dict) -> None:
+
+        # no stores open.
+        if not stores:
+            return
+
+        # row i holds <level>_index i + 1.
+        track_id = raw_data.get('id')
+        document = raw_data.get('raw_data')
+        for key in self.segment_vectors:
+            stores[key].write(key=track_id, rows=[segment.get(key, []) for segment in document.get('segments')])
+        for level in self.interval_levels:
+            stores[f'intervals_{level}'].write(
+                key=track_id, rows=[[item.get('start'), item.get('duration')] for item in document.get(level)]
+            )
+
+    def load_audio_features_files_into_sqlite(self, input_files_path: list, database_files_path: list,
+                                              database_file_name: str, table_name: str = 'audio_features',
+                                              delimiter: str = ',', limit: int = 99999):
+        """
+        Bulk loads parsed or consolidated audio features files into a SQLite table indexed by track_id.
+        :param input_files_path: str - inner project path from which to draw files.
+        :param database_files_path: str - inner project path where the database is stored.
+        :param database_file_name: str - name of the database file, without extension.
+        :param table_name: str - name of the table that will be created, replacing any previous one.
+        :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
+        :param limit: int - max files to load.
+        :return:
+        """
+
+        # logger.
+        self.logger.info('initialising audio features files loading')
+
+        # clear all containers.
+        self._clear_containers()
+
+        # input files path.
+        if not isinstance(input_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(input_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(input_files_path)}')
+        elif len(input_files_path) == 0:
+            self.logger.error('empty input_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty input_files_path list was supplied, at least one valid path is required')
+        # database files path.
+        if not isinstance(database_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(database_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(database_files_path)}')
+        # database file name.
+        if not isinstance(database_file_name, str) or len(database_file_name) == 0:
+            self.logger.error(f'expected a non empty string argument, not {type(database_file_name)}')
+            raise ValueError(f'expected a non empty string argument, not {type(database_file_name)}')
+
+        # read files from container folder.
+        super()._read_files(path=os_path_join(self._base_path, *input_files_path),
+                            allowed_extensions=super()._table_extensions(), max_files=limit)
+
+        # load files.
+        with super()._open_sqlite(database_path=database_files_path, database_name=database_file_name) as sink:
+            super()._load_tables_into_sqlite(
+                sink=sink, table_name=table_name, schema=self.schemas['audio_features'], delimiter=delimiter
+            )
+
+    def load_track_data_files_into_sqlite(self, input_files_path: list, database_files_path: list,
+                                          database_file_name: str, table_name: str = 'track_data',
+                                          delimiter: str = ',', limit: int = 99999):
+        """
+        Bulk loads parsed or consolidated track data files into a SQLite table indexed by track_id and
+        artist_id.
+        :param input_files_path: str - inner project path from which to draw files.
+        :param database_files_path: str - inner project path where the database is stored.
+        :param database_file_name: str - name of the database file, without extension.
+        :param table_name: str - name of the table that will be created, replacing any previous one.
+        :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
+        :param limit: int - max files to load.
+        :return:
+        """
+
+        # logger.
+        self.logger.info('initialising track data files loading')
+
+        # clear all containers.
+        self._clear_containers()
+
+        # input files path.
+        if not isinstance(input_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(input_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(input_files_path)}')
+        elif len(input_files_path) == 0:
+            self.logger.error('empty input_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty input_files_path list was supplied, at least one valid path is required')
+        # database files path.
+        if not isinstance(database_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(database_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(database_files_path)}')
+        # database file name.
+        if not isinstance(database_file_name, str) or len(database_file_name) == 0:
+            self.logger.error(f'expected a non empty string argument, not {type(database_file_name)}')
+            raise ValueError(f'expected a non empty string argument, not {type(database_file_name)}')
+
+        # read files from container folder.
+        super()._read_files(path=os_path_join(self._base_path, *input_files_path),
+                            allowed_extensions=super()._table_extensions(), max_files=limit)
+
+        # load files.
+        with super()._open_sqlite(database_path=database_files_path, database_name=database_file_name) as sink:
+            super()._load_tables_into_sqlite(
+                sink=sink, table_name=table_name, schema=self.schemas['track_data'], delimiter=delimiter
+            )
+
+    def load_audio_analysis_files_into_sqlite(self, input_files_path: list, database_files_path: list,
+                                              database_file_name: str, table_prefix: str = 'audio_analysis',
+                                              delimiter: str = ',', limit: int = 99999):
+        """
+        Bulk loads parsed or consolidated audio analysis files into one SQLite table per key, indexed by
+        track_id.
+        :param input_files_path: str - inner project path from which to draw files.
+        :param database_files_path: str - inner project path where the database is stored.
+        :param database_file_name: str - name of the database file, without extension.
+        :param table_prefix: str - prefix of the tables that will be created, replacing any previous ones.
+        :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
+        :param limit: int - max files to load.
+        :return:
+        """
+
+        # logger.
+        self.logger.info('initialising audio analysis files loading')
+
+        # clear all containers.
+        self._clear_containers()
+
+        # input files path.
+        if not isinstance(input_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(input_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(input_files_path)}')
+        elif len(input_files_path) == 0:
+            self.logger.error('empty input_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty input_files_path list was supplied, at least one valid path is required')
+        # database files path.
+        if not isinstance(database_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(database_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(database_files_path)}')
+        # database file name.
+        if not isinstance(database_file_name, str) or len(database_file_name) == 0:
+            self.logger.error(f'expected a non empty string argument, not {type(database_file_name)}')
+            raise ValueError(f'expected a non empty string argument, not {type(database_file_name)}')
+
+        # load files, one table per key.
+        with super()._open_sqlite(database_path=database_files_path, database_name=database_file_name) as sink:
+            for key in ('meta', 'track', 'bars', 'beats', 'sections', 'segments', 'tatums'):
+                # clear all containers.
+                self._clear_containers()
+                # read files.
+                super()._read_files(path=os_path_join(self._base_path, *input_files_path),
+                                    allowed_extensions=super()._table_extensions(), max_files=limit, qualifier=key)
+                # load files.
+                super()._load_tables_into_sqlite(
+                    sink=sink, table_name=f'{table_prefix}_{key}', schema=self.schemas[key], delimiter=delimiter
+                )
+
 
 if __name__ == '__main__':
 
     # create new track parser object.
     stp = SpotTrackParser()
 
+    # typed columnar output, parquet when pyarrow is installed and one .npy file per column otherwise.
+    # stp = SpotTrackParser(output_format='columnar')
+
     # parse raw json files into CSV files.
     # stp.parse_audio_features_files(
     #     input_files_path=['data', 'raw', 'spot-track-audio-features'],
@@ -723,7 +1115,9 @@ if __name__ == '__main__':
     # stp.parse_audio_analysis_files(
     #     input_files_path=['data', 'raw', 'spot-track-audio-analysis'],
     #     output_files_path=['data', 'parsed', 'spot-track-audio-analysis'],
-    #     # limit=10
+    #     # limit=10,
+    #     # workers=8,
+    #     # shard='0/2'
     # )
 
     # consolidate parsed CSV files into a single CSV.
@@ -733,3 +1127,33 @@ if __name__ == '__main__':
         output_file_name='consolidated_audio_analysis_data',
         # limit=10
     )
+
+    # parse raw json files straight into consolidated files, in a single pass.
+    # stp.parse_and_consolidate_audio_analysis_files(
+    #     input_files_path=['data', 'raw', 'spot-track-audio-analysis'],
+    #     output_files_path=['data', 'consolidated', 'spot-track-audio-analysis'],
+    #     output_file_name='consolidated_audio_analysis_data',
+    #     # parsed_files_path=['data', 'parsed', 'spot-track-audio-analysis'],
+    #     # limit=10
+    # )
+
+    # parse segment pitches and timbre into float32 matrices, loaded with utils.vector_store.VectorStore, and the
+    # start and duration of every level, queried with utils.interval_index.IntervalIndex.
+    # stp.parse_audio_analysis_vectors(
+    #     input_files_path=['data', 'raw', 'spot-track-audio-analysis'],
+    #     output_files_path=['data', 'consolidated', 'spot-track-audio-analysis'],
+    #     output_file_name='audio_analysis_segments',
+    #     # limit=10
+    # )
+
+    # load consolidated files into the SQLite warehouse.
+    # stp.load_audio_features_files_into_sqlite(
+    #     input_files_path=['data', 'consolidated', 'spot-track-audio-features'],
+    #     database_files_path=['data', 'warehouse'],
+    #     database_file_name='spot'
+    # )
+    # stp.load_track_data_files_into_sqlite(
+    #     input_files_path=['data', 'consolidated', 'spot-track-data'],
+    #     database_files_path=['data', 'warehouse'],
+    #     database_file_name='spot'
+    # )
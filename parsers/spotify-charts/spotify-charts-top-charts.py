@@ -2,15 +2,25 @@ import csv
 
 from os.path import join as os_path_join, splitext, split as os_split_path, realpath
 
+from utils.chart_store import weekly_charts_schema
 from utils.parser import Parser
 
 
 class SpotifyChartsParser(Parser):
 
-    def __init__(self):
+    # parsed tables, column names and types.
+    schemas = {
+        'weekly_charts': weekly_charts_schema
+    }
+
+    def __init__(self, output_format: str = 'csv'):
+        """
+        Initialise SPOT charts parser.
+        :param output_format: str - format of parsed and consolidated tables, one of csv, parquet, npy or columnar.
+        """
 
         # initialise superclass.
-        super().__init__()
+        super().__init__(output_format=output_format)
 
         # base path.
         self._base_path = os_split_path(os_split_path(os_split_path(realpath(__file__))[0])[0])[0]
@@ -25,13 +35,15 @@ class SpotifyChartsParser(Parser):
         self._data_container.clear()
 
     def parse_weekly_files(self, input_files_path: list, output_files_path: list, delimiter: str = ',',
-                           limit: int = 99999):
+                           limit: int = 99999, workers: int = 1, shard: str = None):
         """
         Parses weekly SPOT charts CSV files.
         :param input_files_path: str - inner project path from which to draw files.
         :param output_files_path: str - inner project path from which to store parsed files.
         :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
         :param limit: int - max files to parse.
+        :param workers: int - amount of processes parsing files in parallel.
+        :param shard: str - i/n, parse only the i-th of n deterministic shards of the input files.
         :return:
         """
 
@@ -55,20 +67,18 @@ class SpotifyChartsParser(Parser):
             self.logger.error('empty output_files_path list was supplied, at least one valid path is required')
             raise ValueError('empty output_files_path list was supplied, at least one valid path is required')
 
-        # read files from container folder.
-        super()._read_files(path=os_path_join(self._base_path, *input_files_path), allowed_extensions=('.csv',),
-                            max_files=limit)
+        # list files from container folder, keeping only the requested shard.
+        files: list = super()._shard_files(
+            files=super()._list_files(path=os_path_join(self._base_path, *input_files_path),
+                                      allowed_extensions=('.csv',), max_files=limit),
+            shard=shard
+        )
 
-        # iterate and parse files container.
-        files: int = len(self._raw_data_container)
-        for index, file in enumerate(self._raw_data_container):
-            # logger.
-            self.logger.info(f'iterating file {self._files_container[index]} - {index + 1} of {files}')
-            # summon parser.
-            self._parse_weekly_files(
-                output_path=output_files_path, raw_data=file, file_name=self._files_container[index],
-                delimiter=delimiter
-            )
+        # iterate and parse files.
+        super()._parse_files(
+            files=files, method_name='_parse_weekly_files', workers=workers, output_path=output_files_path,
+            delimiter=delimiter
+        )
 
     def _parse_weekly_files(self, output_path: list, raw_data: str, file_name: str, delimiter: str = ','):
 
@@ -107,23 +117,19 @@ class SpotifyChartsParser(Parser):
         self.logger.info(f'weekly file {file_name} parsed, now saving data to a new file')
 
         # save file to parsed folder.
-        fields = ['region', 'week', 'date_from', 'date_to', 'track_id', 'track_name', 'artist',
-                  'track_position', 'track_streams', 'track_url']
-        parsed_file_path = os_path_join(self._base_path, *output_path, f'{column_region}_{column_week}.csv')
-        with open(parsed_file_path, 'w', newline='', encoding='utf-8') as f:
-            # instantiate a new csv writer.
-            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
-            # write headers.
-            writer.writerow(fields)
-            # write contents.
-            writer.writerows(self._data_container)
-            # clear data container.
-            self._data_container.clear()
-            # logger.
-            self.logger.info(f'weekly file {file_name} parsed data saved')
+        fields = self.schemas['weekly_charts']['fields']
+        types = self.schemas['weekly_charts']['types']
+        super()._write_table(
+            output_path=output_path, file_name=f'{column_region}_{column_week}', fields=fields, types=types,
+            rows=self._data_container
+        )
+        # clear data container.
+        self._data_container.clear()
+        # logger.
+        self.logger.info(f'weekly file {file_name} parsed data saved')
 
     def consolidate_weekly_files(self, input_files_path: list, output_files_path: list, output_file_name: str,
-                                 delimiter: str = ',', limit: int = 99999):
+                                 delimiter: str = ',', limit: int = 99999, incremental: bool = True):
         """
         Consolidates parsed weekly SPOT charts CSV files into a single CSV file.
         :param input_files_path: str - inner project path from which to draw files.
@@ -131,6 +137,8 @@ class SpotifyChartsParser(Parser):
         :param output_file_name: str - name of the consolidated CSV file that will be created.
         :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
         :param limit: int - max files to parse.
+        :param incremental: bool - whether only new files are appended to the previous consolidated file, which is
+        rebuilt from scratch when any file it holds was modified or deleted.
         :return:
         """
 
@@ -160,43 +168,132 @@ class SpotifyChartsParser(Parser):
             raise ValueError(f'expected a non empty string argument, not {type(output_file_name)}')
 
         # read files from container folder.
-        super()._read_files(path=os_path_join(self._base_path, *input_files_path), allowed_extensions=('.csv',),
-                            max_files=limit)
+        super()._read_files(path=os_path_join(self._base_path, *input_files_path),
+                            allowed_extensions=super()._table_extensions(), max_files=limit)
 
         # consolidate files.
         self._consolidate_weekly_files(
-            output_path=output_files_path, file_name=output_file_name, delimiter=delimiter
+            output_path=output_files_path, file_name=output_file_name, delimiter=delimiter,
+            incremental=incremental
         )
 
-    def _consolidate_weekly_files(self, output_path: list, file_name: str, delimiter: str):
-
-        # open consolidated file.
-        final_output_path = os_path_join(self._base_path, *output_path, f'{file_name}.csv')
-        with open(final_output_path, 'w', newline='', encoding='utf-8') as output_csv:
-
-            # instantiate a new csv writer.
-            writer = csv.writer(output_csv, quoting=csv.QUOTE_ALL)
-
-            # iterate and parse files container.
-            files: int = len(self._raw_data_container)
-            for index, file in enumerate(self._raw_data_container):
-                # logger.
-                self.logger.info(f'iterating file {self._files_container[index]} - {index + 1} of {files}')
-                # open input csv.
-                with open(file, 'r', encoding='utf-8') as input_file:
-                    # read input csv file.
-                    csv_reader = csv.reader(input_file, delimiter=delimiter)
-                    # skip header, except for the first file.
-                    if index != 0:
-                        next(csv_reader, None)
-                    # write lines to output file.
-                    for row in csv_reader:
-                        writer.writerow(row)
-                    # logger.
-                    self.logger.info(f'file {file} consolidated')
+    def _consolidate_weekly_files(self, output_path: list, file_name: str, delimiter: str, incremental: bool = False):
+
+        # csv files are concatenated at byte level whenever they share header and dialect, columnar tables are
+        # appended by column batches.
+        super()._consolidate_output(
+            output_path=output_path, file_name=file_name, delimiter=delimiter, incremental=incremental
+        )
+
+    def load_weekly_files_into_sqlite(self, input_files_path: list, database_files_path: list,
+                                      database_file_name: str, table_name: str = 'weekly_charts',
+                                      delimiter: str = ',', limit: int = 99999):
+        """
+        Bulk loads parsed or consolidated weekly SPOT charts files into a SQLite table indexed by track_id and
+        (region, week).
+        :param input_files_path: str - inner project path from which to draw files.
+        :param database_files_path: str - inner project path where the database is stored.
+        :param database_file_name: str - name of the database file, without extension.
+        :param table_name: str - name of the table that will be created, replacing any previous one.
+        :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
+        :param limit: int - max files to load.
+        :return:
+        """
 
         # logger.
-        self.logger.info('all files have been consolidated')
+        self.logger.info('initialising weekly charts files loading')
+
+        # clear all containers.
+        self._clear_containers()
+
+        # input files path.
+        if not isinstance(input_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(input_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(input_files_path)}')
+        elif len(input_files_path) == 0:
+            self.logger.error('empty input_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty input_files_path list was supplied, at least one valid path is required')
+        # database files path.
+        if not isinstance(database_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(database_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(database_files_path)}')
+        # database file name.
+        if not isinstance(database_file_name, str) or len(database_file_name) == 0:
+            self.logger.error(f'expected a non empty string argument, not {type(database_file_name)}')
+            raise ValueError(f'expected a non empty string argument, not {type(database_file_name)}')
+
+        # read files from container folder.
+        super()._read_files(path=os_path_join(self._base_path, *input_files_path),
+                            allowed_extensions=super()._table_extensions(), max_files=limit)
+
+        # load files.
+        with super()._open_sqlite(database_path=database_files_path, database_name=database_file_name) as sink:
+            super()._load_tables_into_sqlite(
+                sink=sink, table_name=table_name, schema=self.schemas['weekly_charts'], delimiter=delimiter
+            )
+
+    def build_chart_stores(self, input_files_path: list, output_files_path: list, regions: list = None,
+                           delimiter: str = ',', limit: int = 99999):
+        """
+        Materializes parsed or consolidated weekly SPOT charts files into one memory mapped chart store per region,
+        a dense tracks x weeks matrix of positions and streams along with precomputed per track metrics.
+        :param input_files_path: str - inner project path from which to draw files.
+        :param output_files_path: str - inner project path where the stores are saved, one per region.
+        :param regions: list - regions to materialize, every region found when None.
+        :param delimiter: str - delimiter to use while parsing CSVs, defaults to ','.
+        :param limit: int - max files to read.
+        :return: list - regions materialized.
+        """
+
+        # logger.
+        self.logger.info('initialising weekly charts stores building')
+
+        # clear all containers.
+        self._clear_containers()
+
+        # input files path.
+        if not isinstance(input_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(input_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(input_files_path)}')
+        elif len(input_files_path) == 0:
+            self.logger.error('empty input_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty input_files_path list was supplied, at least one valid path is required')
+        # output files path.
+        if not isinstance(output_files_path, list):
+            self.logger.error(f'expected a list argument, not {type(output_files_path)}')
+            raise ValueError(f'expected a list argument, not {type(output_files_path)}')
+        elif len(output_files_path) == 0:
+            self.logger.error('empty output_files_path list was supplied, at least one valid path is required')
+            raise ValueError('empty output_files_path list was supplied, at least one valid path is required')
+
+        # read files from container folder.
+        super()._read_files(path=os_path_join(self._base_path, *input_files_path),
+                            allowed_extensions=super()._table_extensions(), max_files=limit)
+
+        # one store per region, entries are collected across files.
+        stores: dict = dict()
+        fields: list = ['region', 'week', 'track_id', 'track_position', 'track_streams']
+        files: int = len(self._raw_data_container)
+        for index, file in enumerate(self._raw_data_container):
+            # logger.
+            self.logger.info(f'iterating file {self._files_container[index]} - {index + 1} of {files}')
+            # iterate rows.
+            for region, week, track_id, position, streams in super()._iter_table_rows(
+                    file=file, fields=fields, delimiter=delimiter):
+                if regions is not None and region not in regions:
+                    continue
+                if region not in stores:
+                    stores[region] = super()._open_chart_store(output_path=output_files_path, file_name=region)
+                stores[region].add(track_id=track_id, week=week, position=int(position or 0),
+                                   streams=int(streams or 0))
+
+        # materialize stores.
+        for region, store in stores.items():
+            store.close()
+            # logger.
+            self.logger.info(f'{region} chart store saved, {len(store.tracks)} tracks over {len(store.weeks)} weeks')
+
+        return list(stores)
 
 
 if __name__ == '__main__':
@@ -204,12 +301,16 @@ if __name__ == '__main__':
     # instantiate a new spotify charts parser.
     wcp = SpotifyChartsParser()
 
+    # typed columnar output, parquet when pyarrow is installed and one .npy file per column otherwise.
+    # wcp = SpotifyChartsParser(output_format='columnar')
+
     # trigger weekly files parsing.
     # wcp.parse_weekly_files(
     #     input_files_path=['data', 'raw', 'spotify-charts-weekly-top-charts'],
     #     output_files_path=['data', 'parsed', 'spotify-charts-weekly-top-charts'],
     #     delimiter=',',
-    #     # limit=2
+    #     # limit=2,
+    #     # workers=8
     # )
 
     # trigger weekly files consolidating.
@@ -220,3 +321,16 @@ if __name__ == '__main__':
         delimiter=',',
         # limit=10
     )
+
+    # materialize one memory mapped chart store per region, see utils.chart_store.ChartStore.
+    # wcp.build_chart_stores(
+    #     input_files_path=['data', 'consolidated', 'spotify-charts-weekly-top-charts'],
+    #     output_files_path=['data', 'stores', 'spotify-charts-weekly-top-charts']
+    # )
+
+    # load consolidated weekly charts into the SQLite warehouse.
+    # wcp.load_weekly_files_into_sqlite(
+    #     input_files_path=['data', 'consolidated', 'spotify-charts-weekly-top-charts'],
+    #     database_files_path=['data', 'warehouse'],
+    #     database_file_name='spot'
+    # )
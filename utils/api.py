@@ -1,11 +1,13 @@
 import logging
-
-from json import dumps
+import threading
 
 from os import path, makedirs
 
+from utils.cache import ResponseCache
 from utils.config import Config
+from utils.json_codec import codec
 from utils.logger import InMemoryLogger
+from utils.transport import HttpTransport
 
 
 class Api:
@@ -17,6 +19,13 @@ class Api:
     # logger instance.
     logger = object
 
+    # HTTP transport shared by every API class.
+    _transport = None
+    _transport_lock = threading.Lock()
+
+    # opt in response cache shared by every API class.
+    _cache = None
+
     def __init__(self) -> None:
         """
         Initialize API base class.
@@ -47,6 +56,114 @@ class Api:
 
         return self._environment
 
+    @property
+    def transport(self) -> HttpTransport:
+        """
+        Getter for property transport, the pooled HTTP transport is shared by every API class.
+        :return: HttpTransport
+        """
+
+        # lazily create the default transport.
+        if Api._transport is None:
+            with Api._transport_lock:
+                if Api._transport is None:
+                    Api._transport = HttpTransport()
+
+        return Api._transport
+
+    @staticmethod
+    def configure_transport(pool_connections: int = 10, pool_maxsize: int = 16, timeout: tuple = (5, 30)) -> None:
+        """
+        Replaces the shared HTTP transport, closing the connections held by the previous one.
+        :param pool_connections: int - max amount of hosts whose connection pool is kept alive.
+        :param pool_maxsize: int - max amount of connections kept alive per host.
+        :param timeout: tuple - default (connect, read) timeout in seconds.
+        :return: None
+        """
+
+        with Api._transport_lock:
+            # close previous transport.
+            if Api._transport is not None:
+                Api._transport.close()
+            # set new transport.
+            Api._transport = HttpTransport(
+                pool_connections=pool_connections, pool_maxsize=pool_maxsize, timeout=timeout
+            )
+
+    @staticmethod
+    def configure_cache(cache_path: str, memory_entries: int = 256, memory_bytes: int = 64 * 1024 * 1024) -> None:
+        """
+        Enables the response cache shared by every API class, pass None as cache_path to disable it.
+        :param cache_path: str - directory holding the on disk store.
+        :param memory_entries: int - max amount of responses kept in memory.
+        :param memory_bytes: int - max amount of body bytes kept in memory.
+        :return: None
+        """
+
+        Api._cache = ResponseCache(
+            cache_path=cache_path, memory_entries=memory_entries, memory_bytes=memory_bytes
+        ) if cache_path else None
+
+    def _cached_get(self, url: str, headers: dict = None, params: dict = None, ttl: float = 0):
+        """
+        Performs a GET request through the response cache, when enabled. Fresh entries are served without
+        contacting the server, stale ones are revalidated through ETag / Last-Modified when available.
+        :param url: str - request url.
+        :param headers: dict - request headers.
+        :param params: dict - query string parameters.
+        :param ttl: float - seconds a response stays fresh, None for responses that never change.
+        :return: requests.Response or CachedResponse
+        """
+
+        # cache disabled.
+        if Api._cache is None:
+            return self.transport.get(url=url, headers=headers, params=params)
+
+        # look entry up.
+        key = ResponseCache.key(url=url, params=params)
+        entry = Api._cache.get(key=key)
+        if entry is not None and ResponseCache.is_fresh(entry=entry):
+            self.logger.info(f'serving {url} from cache')
+            return ResponseCache.to_response(entry=entry)
+
+        # revalidate stale entry.
+        request_headers = {**(headers or {}), **(ResponseCache.conditional_headers(entry=entry) if entry else {})}
+        r = self.transport.get(url=url, headers=request_headers, params=params)
+
+        # entry did not change.
+        if r.status_code == 304 and entry is not None:
+            self.logger.info(f'{url} revalidated, serving it from cache')
+            return ResponseCache.to_response(entry=Api._cache.touch(key=key, entry=entry, ttl=ttl))
+
+        # store new response.
+        if r.ok:
+            Api._cache.put(
+                key=key, url=url, status_code=r.status_code, headers=r.headers, content=r.content,
+                encoding=r.encoding, ttl=ttl
+            )
+
+        return r
+
+    def log_transport_stats(self) -> None:
+        """
+        Logs the requests performed and connections opened and reused by the shared transport, along with the
+        response cache usage when enabled.
+        :return: None
+        """
+
+        # fetch stats.
+        stats = self.transport.stats()
+
+        # logger.
+        self.logger.info(
+            f'{stats["requests"]} requests performed, {stats["opened"]} connections opened and '
+            f'{stats["reused"]} reused'
+        )
+
+        # cache usage.
+        if Api._cache is not None:
+            self.logger.info(f'response cache usage: {Api._cache.stats}')
+
     def _init_logger(self, logger_name: str, file_name: str, system_logger: bool = True) -> None:
         """
         Initializes logger instance. Log is printed during execution and
@@ -109,8 +226,8 @@ class Api:
         filename = f'{path.join(*output_path)}.json'
 
         # open file.
-        with open(filename, 'w') as output:
+        with open(filename, 'wb') as output:
             # write to disk.
-            output.write(dumps(data))
+            output.write(codec.dumps(data))
             # logger.
             self.logger.info(f'file {"/".join(output_path)}.json has been created')
@@ -0,0 +1,272 @@
+import hashlib
+import threading
+
+from collections import OrderedDict
+from json import dumps, loads
+from os import path, makedirs, replace, getpid
+from time import time
+
+
+class CachedResponse:
+
+    def __init__(self, url: str, status_code: int, headers: dict, content: bytes, encoding: str = None,
+                 from_cache: bool = True):
+        """
+        Minimal response object served from the response cache, exposing the attributes used by the API classes.
+        :param url: str - request url.
+        :param status_code: int - original status code.
+        :param headers: dict - stored response headers.
+        :param content: bytes - response body.
+        :param encoding: str - body encoding.
+        :param from_cache: bool - whether the response was served without downloading its body.
+        """
+
+        self.url: str = url
+        self.status_code: int = status_code
+        self.headers: dict = headers
+        self.content: bytes = content
+        self.encoding: str = encoding or 'utf-8'
+        self.from_cache: bool = from_cache
+
+    @property
+    def ok(self) -> bool:
+
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self):
+
+        return loads(self.content)
+
+
+class ResponseCache:
+
+    # response headers kept alongside the body, used for revalidation.
+    stored_headers = ('ETag', 'Last-Modified', 'Content-Type')
+
+    def __init__(self, cache_path: str, memory_entries: int = 256, memory_bytes: int = 64 * 1024 * 1024):
+        """
+        Two tier response cache, a bounded in process LRU in front of a content addressed on disk store.
+        Entries are keyed by request, bodies are stored once per content hash.
+        :param cache_path: str - directory holding the on disk store.
+        :param memory_entries: int - max amount of entries kept in memory.
+        :param memory_bytes: int - max amount of body bytes kept in memory.
+        """
+
+        # assert input.
+        if not isinstance(memory_entries, int) or memory_entries < 0:
+            raise ValueError(f'expected a non negative integer, but found {memory_entries} of type '
+                             f'{type(memory_entries)}')
+
+        # on disk store.
+        self._cache_path: str = cache_path
+        self._index_path: str = path.join(cache_path, 'index')
+        self._objects_path: str = path.join(cache_path, 'objects')
+
+        # in memory tier.
+        self._memory: OrderedDict = OrderedDict()
+        self._memory_entries: int = memory_entries
+        self._memory_bytes: int = memory_bytes
+        self._memory_size: int = 0
+        self._lock = threading.Lock()
+
+        # usage counters.
+        self.stats: dict = {'memory_hits': 0, 'disk_hits': 0, 'revalidated': 0, 'misses': 0}
+
+    @staticmethod
+    def key(url: str, params: dict = None) -> str:
+        """
+        Builds the cache key of a request.
+        :param url: str - request url.
+        :param params: dict - query string parameters.
+        :return: str
+        """
+
+        return hashlib.sha256(dumps([url, sorted((params or {}).items())]).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def is_fresh(entry: dict) -> bool:
+        """
+        Checks whether an entry can be served without contacting the server.
+        :param entry: dict - cache entry.
+        :return: bool
+        """
+
+        # immutable entries never expire.
+        if entry.get('ttl') is None:
+            return True
+
+        return time() < entry.get('stored_at', 0) + entry.get('ttl')
+
+    def get(self, key: str):
+        """
+        Looks an entry up, memory first and disk afterwards.
+        :param key: str - cache key.
+        :return: dict or None - entry holding metadata and body.
+        """
+
+        # memory tier.
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry
+
+        # disk tier.
+        entry = self._read_entry(key=key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+
+        # promote entry.
+        self.stats['disk_hits'] += 1
+        self._remember(key=key, entry=entry)
+
+        return entry
+
+    def put(self, key: str, url: str, status_code: int, headers: dict, content: bytes, encoding: str = None,
+            ttl: float = None) -> dict:
+        """
+        Stores a response.
+        :param key: str - cache key.
+        :param url: str - request url.
+        :param status_code: int - response status code.
+        :param headers: dict - response headers.
+        :param content: bytes - response body.
+        :param encoding: str - body encoding.
+        :param ttl: float - seconds the entry stays fresh, None for immutable entries.
+        :return: dict - stored entry.
+        """
+
+        # store body by content hash.
+        digest = hashlib.sha256(content).hexdigest()
+        object_file = self._object_file(digest=digest)
+        if not path.isfile(object_file):
+            self._write_atomically(file=object_file, data=content)
+
+        # store entry metadata.
+        entry = {
+            'url': url, 'status_code': status_code, 'encoding': encoding, 'stored_at': time(), 'ttl': ttl,
+            'headers': {name: headers.get(name) for name in self.stored_headers if headers.get(name) is not None},
+            'body': digest
+        }
+        self._write_atomically(file=self._index_file(key=key), data=dumps(entry).encode('utf-8'))
+
+        # keep entry in memory.
+        entry['content'] = content
+        self._remember(key=key, entry=entry)
+
+        return entry
+
+    def touch(self, key: str, entry: dict, ttl: float = None) -> dict:
+        """
+        Marks an entry as fresh again after the server confirmed it did not change.
+        :param key: str - cache key.
+        :param entry: dict - revalidated entry.
+        :param ttl: float - seconds the entry stays fresh, None for immutable entries.
+        :return: dict - updated entry.
+        """
+
+        # update metadata.
+        self.stats['revalidated'] += 1
+        entry = {**entry, 'stored_at': time(), 'ttl': ttl}
+        self._write_atomically(
+            file=self._index_file(key=key),
+            data=dumps({k: v for k, v in entry.items() if k != 'content'}).encode('utf-8')
+        )
+        self._remember(key=key, entry=entry)
+
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict:
+        """
+        Builds revalidation headers out of an entry's validators.
+        :param entry: dict - cache entry.
+        :return: dict
+        """
+
+        headers = dict()
+        if entry.get('headers', {}).get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry.get('headers', {}).get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+
+        return headers
+
+    @staticmethod
+    def to_response(entry: dict, from_cache: bool = True) -> CachedResponse:
+        """
+        Wraps an entry into a response object.
+        :param entry: dict - cache entry.
+        :param from_cache: bool - whether the body was served from the cache.
+        :return: CachedResponse
+        """
+
+        return CachedResponse(
+            url=entry.get('url'), status_code=entry.get('status_code'), headers=entry.get('headers', {}),
+            content=entry.get('content'), encoding=entry.get('encoding'), from_cache=from_cache
+        )
+
+    def _remember(self, key: str, entry: dict) -> None:
+
+        # memory tier disabled.
+        if self._memory_entries == 0:
+            return
+
+        with self._lock:
+            # replace previous entry.
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= len(previous.get('content', b''))
+            # add entry as most recently used.
+            self._memory[key] = entry
+            self._memory_size += len(entry.get('content', b''))
+            # evict least recently used entries.
+            while self._memory and (len(self._memory) > self._memory_entries or
+                                    self._memory_size > self._memory_bytes):
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted.get('content', b''))
+
+    def _read_entry(self, key: str):
+
+        # check file existence.
+        index_file = self._index_file(key=key)
+        if not path.isfile(index_file):
+            return None
+
+        # read metadata and body, a missing or corrupted file is treated as a miss.
+        try:
+            with open(index_file, 'rb') as f:
+                entry = loads(f.read())
+            with open(self._object_file(digest=entry.get('body')), 'rb') as f:
+                entry['content'] = f.read()
+        except (OSError, ValueError, TypeError):
+            return None
+
+        return entry
+
+    def _index_file(self, key: str) -> str:
+
+        return path.join(self._index_path, key[:2], f'{key}.json')
+
+    def _object_file(self, digest: str) -> str:
+
+        return path.join(self._objects_path, digest[:2], digest)
+
+    @staticmethod
+    def _write_atomically(file: str, data: bytes) -> None:
+
+        # check for location.
+        makedirs(path.dirname(file), exist_ok=True)
+
+        # readers never see a partial file.
+        tmp_file = f'{file}.{getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        replace(tmp_file, file)
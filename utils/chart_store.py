@@ -0,0 +1,275 @@
+import json
+
+from array import array
+from os import path, makedirs, replace, getpid
+
+try:
+    import numpy as np
+except ImportError:
+    # chart stores are built and read through numpy.
+    np = None
+
+
+# data file extension per matrix.
+chart_extensions = {'positions': '.positions.i16', 'streams': '.streams.u32', 'metrics': '.metrics.i32'}
+
+# file extension of the id index.
+chart_index_extension = '.chart.json'
+
+# consolidated weekly charts table, as written by the charts parser and read by the success model.
+weekly_charts_schema = {
+    'fields': [
+        'region', 'week', 'date_from', 'date_to', 'track_id', 'track_name', 'artist', 'track_position',
+        'track_streams', 'track_url'
+    ],
+    'types': ['str', 'str', 'str', 'str', 'str', 'str', 'str', 'int', 'int', 'str']
+}
+
+# per track metrics, one column each in storage order.
+chart_metrics = ['peak', 'peak_streams', 'weeks_on_chart', 'debut_week', 'last_week', 'longest_run']
+
+
+def compute_chart_metrics(positions, streams):
+    """
+    Computes every chart metric of every track at once.
+    :param positions: numpy.ndarray - tracks x weeks int16 matrix, 0 where the track did not chart.
+    :param streams: numpy.ndarray - tracks x weeks uint32 matrix.
+    :return: numpy.ndarray - tracks x len(chart_metrics) int32 matrix, week metrics are week columns and -1 or 0
+    when the track never charted.
+    """
+
+    charted = positions > 0
+    weeks = positions.shape[1]
+
+    # best position and highest streams.
+    peak = np.where(charted, positions, np.iinfo(np.int16).max).min(axis=1, initial=np.iinfo(np.int16).max)
+    peak = np.where(charted.any(axis=1), peak, 0)
+    peak_streams = streams.max(axis=1, initial=0).astype(np.int64)
+
+    # first and last charting weeks.
+    weeks_on_chart = charted.sum(axis=1)
+    debut_week = np.where(weeks_on_chart > 0, charted.argmax(axis=1), -1)
+    last_week = np.where(weeks_on_chart > 0, weeks - 1 - charted[:, ::-1].argmax(axis=1), -1)
+
+    # longest run of consecutive charting weeks, counting charted weeks since the latest week off the chart.
+    counts = np.cumsum(charted, axis=1, dtype=np.int32)
+    resets = np.maximum.accumulate(np.where(charted, 0, counts), axis=1) if weeks > 0 else counts
+    longest_run = (counts - resets).max(axis=1, initial=0)
+
+    return np.stack(
+        [peak, np.minimum(peak_streams, np.iinfo(np.int32).max), weeks_on_chart, debut_week, last_week, longest_run],
+        axis=1
+    ).astype(np.int32)
+
+
+class ChartStoreWriter:
+
+    def __init__(self, file_base: str):
+        """
+        Collects chart entries of a single region and materializes them, on close, as a dense tracks x weeks int16
+        positions matrix and uint32 streams matrix, along with per track metrics and the id to row and week to
+        column dictionaries. Weeks are sorted chronologically and tracks by their first appearance.
+        :param file_base: str - path towards the store, without extension.
+        """
+
+        # assert numpy availability.
+        if np is None:
+            raise ValueError('chart stores are built through numpy, which is not installed')
+
+        # check for location to save the store.
+        makedirs(path.dirname(file_base) or '.', exist_ok=True)
+
+        # settings.
+        self.file_base: str = file_base
+
+        # id to code dictionaries.
+        self.tracks: dict = dict()
+        self.weeks: dict = dict()
+
+        # entries, as parallel typed arrays.
+        self._track_codes = array('i')
+        self._week_codes = array('i')
+        self._positions = array('i')
+        self._streams = array('q')
+        self._closed: bool = False
+
+    def add(self, track_id: str, week: str, position: int, streams: int) -> None:
+        """
+        Adds a chart entry, a later entry for the same track and week replaces the previous one.
+        :param track_id: str - track id.
+        :param week: str - week formatted as YYYY-MM-DD--YYYY-MM-DD.
+        :param position: int - chart position, starting at 1.
+        :param streams: int - streams during the week.
+        :return: None
+        """
+
+        self._track_codes.append(self.tracks.setdefault(track_id, len(self.tracks)))
+        self._week_codes.append(self.weeks.setdefault(week, len(self.weeks)))
+        self._positions.append(int(position or 0))
+        self._streams.append(int(streams or 0))
+
+    def close(self) -> None:
+
+        # already closed.
+        if self._closed:
+            return
+        self._closed = True
+
+        # chronological week columns.
+        weeks = sorted(self.weeks)
+        columns = np.empty(len(weeks), dtype=np.int64)
+        columns[[self.weeks[week] for week in weeks]] = np.arange(len(weeks))
+        shape = (len(self.tracks), len(weeks))
+
+        # dense matrices.
+        rows = np.frombuffer(self._track_codes, dtype=np.int32)
+        cols = columns[np.frombuffer(self._week_codes, dtype=np.int32)] if len(weeks) else np.empty(0, np.int64)
+        positions = np.zeros(shape, dtype=np.int16)
+        streams = np.zeros(shape, dtype=np.uint32)
+        positions[rows, cols] = np.clip(np.frombuffer(self._positions, dtype=np.int32), 0, np.iinfo(np.int16).max)
+        streams[rows, cols] = np.clip(np.frombuffer(self._streams, dtype=np.int64), 0, np.iinfo(np.uint32).max)
+
+        # write matrices, moved into place once complete.
+        for name, matrix in (('positions', positions), ('streams', streams),
+                             ('metrics', compute_chart_metrics(positions=positions, streams=streams))):
+            file = f'{self.file_base}{chart_extensions[name]}'
+            matrix.tofile(f'{file}.{getpid()}.tmp')
+            replace(f'{file}.{getpid()}.tmp', file)
+
+        # write index atomically.
+        index_file = f'{self.file_base}{chart_index_extension}'
+        with open(f'{index_file}.{getpid()}.tmp', 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'tracks': list(self.tracks), 'weeks': weeks, 'metrics': chart_metrics}))
+        replace(f'{index_file}.{getpid()}.tmp', index_file)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        self.close()
+
+
+class ChartStore:
+
+    def __init__(self, file_base: str):
+        """
+        Read only, memory mapped view over a region store written by ChartStoreWriter. Trajectories and metrics
+        of a track are constant time lookups, and week level queries are vectorized over a single column.
+        :param file_base: str - path towards the store, without extension.
+        """
+
+        # assert numpy availability.
+        if np is None:
+            raise ValueError('chart stores are memory mapped through numpy, which is not installed')
+
+        # read index.
+        with open(f'{file_base}{chart_index_extension}', 'r', encoding='utf-8') as f:
+            index = json.loads(f.read())
+
+        # id to row and week to column dictionaries.
+        self.file_base: str = file_base
+        self.track_ids: list = index.get('tracks')
+        self.weeks: list = index.get('weeks')
+        self.track_rows: dict = {track_id: row for row, track_id in enumerate(self.track_ids)}
+        self.week_columns: dict = {week: column for column, week in enumerate(self.weeks)}
+        self._metric_columns: dict = {metric: column for column, metric in enumerate(index.get('metrics'))}
+
+        # map data, empty stores cannot be mapped.
+        shape = (len(self.track_ids), len(self.weeks))
+        self.positions = self._map(name='positions', dtype=np.int16, shape=shape)
+        self.streams = self._map(name='streams', dtype=np.uint32, shape=shape)
+        self.metrics = self._map(name='metrics', dtype=np.int32, shape=(shape[0], len(self._metric_columns)))
+
+    def _map(self, name: str, dtype, shape: tuple):
+
+        if 0 in shape:
+            return np.zeros(shape, dtype=dtype)
+
+        return np.memmap(f'{self.file_base}{chart_extensions[name]}', dtype=dtype, mode='r', shape=shape)
+
+    def __len__(self) -> int:
+
+        return len(self.track_ids)
+
+    def __contains__(self, track_id: str) -> bool:
+
+        return track_id in self.track_rows
+
+    def trajectory(self, track_id: str):
+        """
+        Weekly positions and streams of a track.
+        :param track_id: str - track id.
+        :return: tuple - positions and streams views, one value per week, None when the track never charted.
+        """
+
+        row = self.track_rows.get(track_id)
+        if row is None:
+            return None
+
+        return self.positions[row], self.streams[row]
+
+    def metric(self, metric: str, track_id: str = None):
+        """
+        Metric of a track, or of every track at once.
+        :param metric: str - one of peak, peak_streams, weeks_on_chart, debut_week, last_week or longest_run.
+        :param track_id: str - track id, None returns the metric of every track in row order.
+        :return: int or numpy.ndarray - None when the track never charted in the region.
+        """
+
+        # assert input.
+        if metric not in self._metric_columns:
+            raise ValueError(f'the metric value specified {metric} is not allowed')
+
+        # every track.
+        column = self._metric_columns[metric]
+        if track_id is None:
+            return self.metrics[:, column]
+
+        # single track.
+        row = self.track_rows.get(track_id)
+
+        return None if row is None else int(self.metrics[row, column])
+
+    def track_metrics(self, track_id: str) -> dict:
+        """
+        Every metric of a track, week metrics are returned as weeks.
+        :param track_id: str - track id.
+        :return: dict - None when the track never charted in the region.
+        """
+
+        row = self.track_rows.get(track_id)
+        if row is None:
+            return None
+        values = dict(zip(self._metric_columns, self.metrics[row].tolist()))
+        for metric in ('debut_week', 'last_week'):
+            values[metric] = self.weeks[values[metric]] if values[metric] >= 0 else None
+
+        return values
+
+    def movers(self, week: str, top: int = 10) -> list:
+        """
+        Week over week movers, tracks charting both on the given week and the previous one.
+        :param week: str - week formatted as YYYY-MM-DD--YYYY-MM-DD.
+        :param top: int - amount of tracks to return, biggest climbers first.
+        :return: list - (track_id, previous position, position, places gained) tuples.
+        """
+
+        # assert input.
+        column = self.week_columns.get(week)
+        if column is None:
+            raise ValueError(f'week {week} is not stored in {self.file_base}')
+        if column == 0:
+            return list()
+
+        # vectorized over the two week columns.
+        previous, current = self.positions[:, column - 1], self.positions[:, column]
+        rows = np.flatnonzero((previous > 0) & (current > 0))
+        gained = previous[rows].astype(np.int32) - current[rows].astype(np.int32)
+        order = rows[np.argsort(-gained, kind='stable')][:top]
+
+        return [
+            (self.track_ids[row], int(previous[row]), int(current[row]), int(previous[row]) - int(current[row]))
+            for row in order
+        ]
@@ -0,0 +1,157 @@
+import hashlib
+import json
+
+from os import path, stat, replace, getpid, listdir
+
+
+class ConsolidationManifest:
+
+    # consolidation plans.
+    REBUILD = 'rebuild'
+    APPEND = 'append'
+    UP_TO_DATE = 'up_to_date'
+
+    def __init__(self, manifest_file: str):
+        """
+        Record of the inputs already consolidated into an output, with their size, mtime and content hash.
+        Used to append only new inputs and to rebuild the output whenever a consolidated input changed or went
+        missing.
+        :param manifest_file: str - path towards the manifest file, stored next to the consolidated output.
+        """
+
+        # manifest location.
+        self._manifest_file: str = manifest_file
+
+        # previous run.
+        self._output: dict = dict()
+        self._output_format: str = ''
+        self._inputs: dict = dict()
+
+        # load previous run.
+        self._load()
+
+    @property
+    def manifest_file(self) -> str:
+        """
+        Getter for property manifest_file.
+        :return: str
+        """
+
+        return self._manifest_file
+
+    def _load(self) -> None:
+
+        # check file existence.
+        if not path.isfile(self._manifest_file):
+            return
+
+        # a corrupted manifest simply leads to a rebuild.
+        try:
+            with open(self._manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.loads(f.read())
+        except (OSError, ValueError):
+            return
+
+        self._output = manifest.get('output', {})
+        self._output_format = manifest.get('output_format', '')
+        self._inputs = manifest.get('inputs', {})
+
+    @staticmethod
+    def hash_file(file: str, block_size: int = 1024 * 1024) -> str:
+        """
+        Hashes a file's contents.
+        :param file: str - file path.
+        :param block_size: int - bytes read at a time.
+        :return: str
+        """
+
+        digest = hashlib.blake2b(digest_size=16)
+
+        # directory tables, e.g. npy columns, are hashed file by file in name order.
+        files = [path.join(file, name) for name in sorted(listdir(file))] if path.isdir(file) else [file]
+        for name in files:
+            digest.update(path.basename(name).encode('utf-8'))
+            with open(name, 'rb') as f:
+                for block in iter(lambda: f.read(block_size), b''):
+                    digest.update(block)
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def _stat(file: str) -> dict:
+
+        file_stat = stat(file)
+
+        # directory tables are sized by their contents.
+        size = sum([stat(path.join(file, name)).st_size for name in listdir(file)]) if path.isdir(file) \
+            else file_stat.st_size
+
+        return {'size': size, 'mtime_ns': file_stat.st_mtime_ns}
+
+    def plan(self, inputs: dict, output_file: str, output_format: str) -> tuple:
+        """
+        Compares the current inputs against the ones already consolidated. Unchanged size and mtime are trusted,
+        the hash is only checked when they differ, so touched but identical files are not treated as modified.
+        :param inputs: dict - input name and path, names are stable keys such as the path relative to the project.
+        :param output_file: str - consolidated output.
+        :param output_format: str - output format, changing it forces a rebuild.
+        :return: tuple - plan, new input names in input order, and the reason for the plan.
+        """
+
+        # nothing consolidated yet, or the output was changed by someone else.
+        if not self._inputs or not path.exists(output_file):
+            return self.REBUILD, list(inputs), 'no previous consolidation was found'
+        if output_format != self._output_format:
+            return self.REBUILD, list(inputs), f'output format changed from {self._output_format} to {output_format}'
+        if self._stat(output_file) != {k: self._output.get(k) for k in ('size', 'mtime_ns')}:
+            return self.REBUILD, list(inputs), 'consolidated output was modified'
+
+        # deleted inputs.
+        deleted = [name for name in self._inputs if name not in inputs]
+        if deleted:
+            return self.REBUILD, list(inputs), f'{len(deleted)} consolidated inputs were deleted, e.g. {deleted[0]}'
+
+        # modified inputs.
+        for name, entry in self._inputs.items():
+            current = self._stat(inputs[name])
+            if current == {k: entry.get(k) for k in ('size', 'mtime_ns')}:
+                continue
+            if current.get('size') != entry.get('size') or self.hash_file(inputs[name]) != entry.get('hash'):
+                return self.REBUILD, list(inputs), f'consolidated input {name} was modified'
+            # same contents, only the mtime moved.
+            entry.update(current)
+
+        # new inputs.
+        new = [name for name in inputs if name not in self._inputs]
+        if not new:
+            return self.UP_TO_DATE, new, 'every input has already been consolidated'
+
+        return self.APPEND, new, f'{len(new)} new inputs'
+
+    def record(self, inputs: dict, consolidated: list, output_file: str, output_format: str,
+               rebuilt: bool) -> None:
+        """
+        Records the inputs consolidated by the latest run and writes the manifest atomically.
+        :param inputs: dict - input name and path.
+        :param consolidated: list - names of the inputs consolidated by the latest run.
+        :param output_file: str - consolidated output.
+        :param output_format: str - output format.
+        :param rebuilt: bool - whether the output was rebuilt, which drops every previous entry.
+        :return: None
+        """
+
+        # previous entries survive appends only.
+        if rebuilt:
+            self._inputs = dict()
+        for name in consolidated:
+            self._inputs[name] = {**self._stat(inputs[name]), 'hash': self.hash_file(inputs[name])}
+
+        # output state.
+        self._output = self._stat(output_file)
+        self._output_format = output_format
+
+        # write atomically.
+        tmp_file = f'{self._manifest_file}.{getpid()}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'output': self._output, 'output_format': self._output_format, 'inputs': self._inputs}))
+        replace(tmp_file, self._manifest_file)
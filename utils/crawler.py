@@ -0,0 +1,242 @@
+import threading
+
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+
+from utils.logger import InMemoryLogger
+
+
+# a single page to crawl, task is a callable without arguments which fetches and saves the page.
+CrawlJob = namedtuple('CrawlJob', ['host', 'key', 'task'])
+
+
+def crawl_job(url: str, key: str, task) -> CrawlJob:
+    """
+    Builds a crawl job, queued on the host of the given url.
+    :param url: str - url fetched by the task.
+    :param key: str - job identification used in logs, e.g. region_week.
+    :param task: callable - fetches and saves the page, its return value is handed to on_result.
+    :return: CrawlJob
+    """
+
+    return CrawlJob(host=urlsplit(url).netloc.lower(), key=key, task=task)
+
+
+class HostPolicy:
+
+    def __init__(self, max_concurrency: int = 2, min_interval: float = 1.0):
+        """
+        Politeness towards a single host. The policy books the request slots of every host it applies to, so both
+        the requests dispatched by a Crawler and the retries performed within its jobs keep the min interval.
+        :param max_concurrency: int - max amount of requests in flight against the host.
+        :param min_interval: float - min seconds between two consecutive requests to the host.
+        """
+
+        # assert input.
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            raise ValueError(f'expected a positive integer, but found {max_concurrency} of type '
+                             f'{type(max_concurrency)}')
+        if not isinstance(min_interval, (int, float)) or min_interval < 0:
+            raise ValueError(f'expected a non negative number, but found {min_interval} of type {type(min_interval)}')
+
+        self.max_concurrency: int = max_concurrency
+        self.min_interval: float = float(min_interval)
+
+        # next free slot of each host, shared by every thread.
+        self._next_slot: dict = dict()
+        self._lock = threading.Lock()
+
+    def delay(self, host: str) -> float:
+        """
+        Seconds until the next free slot of a host, without booking it.
+        :param host: str - host name.
+        :return: float
+        """
+
+        with self._lock:
+            return max(self._next_slot.get(host, 0.0) - monotonic(), 0.0)
+
+    def reserve(self, host: str, after: float = 0.0) -> float:
+        """
+        Books the first free slot of a host that starts at least after the given seconds.
+        :param host: str - host name.
+        :param after: float - seconds from now before which the request will not be sent, e.g. a backoff wait.
+        :return: float - seconds from now until the booked slot.
+        """
+
+        with self._lock:
+            now = monotonic()
+            slot = max(now + after, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.min_interval
+
+        return slot - now
+
+
+def retry_pacing(host: str):
+    """
+    Builds a backoff on_backoff handler which books every retry of an Api method on the host_policy of its
+    instance, waiting past the backoff delay when the host has no free slot by then.
+    :param host: str - host the retried method requests.
+    :return: callable
+    """
+
+    def on_backoff(details: dict) -> None:
+        # backoff sleeps the remaining wait itself.
+        slot = details['args'][0].host_policy.reserve(host=host, after=details['wait'])
+        sleep(max(slot - details['wait'], 0.0))
+
+    return on_backoff
+
+
+class Crawler:
+
+    def __init__(self, max_concurrency: int = 8, default_policy: HostPolicy = None, policies: dict = None,
+                 progress_every: int = 25, logger=None):
+        """
+        Crawls jobs spread over several hosts with a pool of threads. Every host gets its own queue, which is only
+        dispatched while the host is below its max concurrency and its min interval since the previous request has
+        elapsed, so a slow host never holds back the others. The pool size caps the requests in flight overall.
+        :param max_concurrency: int - max amount of requests in flight across every host.
+        :param default_policy: HostPolicy - politeness for hosts without a policy of their own.
+        :param policies: dict - host to HostPolicy, e.g. {'kworb.net': HostPolicy(2, 0.5)}.
+        :param progress_every: int - amount of finished jobs between progress reports.
+        :param logger: logger instance, defaults to an in memory logger.
+        """
+
+        # initialise logger.
+        self.logger = logger or InMemoryLogger()
+
+        # assert input.
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            self.logger.error(f'expected a positive integer, but found {max_concurrency} of type '
+                              f'{type(max_concurrency)}')
+            raise ValueError(f'expected a positive integer, but found {max_concurrency} of type '
+                             f'{type(max_concurrency)}')
+        if not isinstance(progress_every, int) or progress_every < 1:
+            self.logger.error(f'expected a positive integer, but found {progress_every} of type {type(progress_every)}')
+            raise ValueError(f'expected a positive integer, but found {progress_every} of type {type(progress_every)}')
+
+        self._max_concurrency: int = max_concurrency
+        self._default_policy: HostPolicy = default_policy or HostPolicy()
+        self._policies: dict = {host.lower(): policy for host, policy in (policies or {}).items()}
+        self._progress_every: int = progress_every
+
+    def policy(self, host: str) -> HostPolicy:
+
+        return self._policies.get(host, self._default_policy)
+
+    def crawl(self, jobs: list, on_result=None) -> dict:
+        """
+        Runs every job, honouring the politeness of each host. Pages are saved by the jobs themselves as soon as
+        they arrive, results are handed to on_result on the calling thread in completion order.
+        :param jobs: list - CrawlJob instances, in the order each host should be crawled.
+        :param on_result: callable - optional, receives (job, result) for every job that did not raise, jobs
+        report a failure by raising.
+        :return: dict - amount of completed and failed jobs.
+        """
+
+        # assert input.
+        if not isinstance(jobs, list):
+            self.logger.error(f'expected a list argument, not {type(jobs)}')
+            raise ValueError(f'expected a list argument, not {type(jobs)}')
+
+        # one queue per host, preserving job order within each host.
+        queues: dict = dict()
+        for job in jobs:
+            queues.setdefault(job.host, deque()).append(job)
+
+        # host state, slots are booked on the host policies.
+        in_flight: dict = {host: 0 for host in queues}
+
+        # logger.
+        self.logger.info(f'crawling {len(jobs)} jobs over {len(queues)} hosts with {self._max_concurrency} workers')
+
+        counters: dict = {'completed': 0, 'failed': 0}
+        running: dict = dict()
+        started = monotonic()
+        with ThreadPoolExecutor(max_workers=self._max_concurrency) as executor:
+            while queues or running:
+                # dispatch every host that is ready, round robin so hosts are crawled side by side.
+                for host in list(queues):
+                    if len(running) >= self._max_concurrency:
+                        break
+                    policy = self.policy(host=host)
+                    if in_flight[host] >= policy.max_concurrency or policy.delay(host=host) > 0:
+                        continue
+                    # submit next job of the host.
+                    job = queues[host].popleft()
+                    if not queues[host]:
+                        del queues[host]
+                    policy.reserve(host=host)
+                    running[executor.submit(job.task)] = job
+                    in_flight[host] += 1
+
+                # earliest slot of a host that still has room for another request.
+                timeout = min([
+                    self.policy(host=host).delay(host=host) for host in queues
+                    if in_flight[host] < self.policy(host=host).max_concurrency
+                ], default=None) if len(running) < self._max_concurrency else None
+
+                # wait for a job to complete or for the next host slot.
+                if not running:
+                    sleep(timeout or 0.0)
+                    continue
+                done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                # collect results.
+                for future in done:
+                    job = running.pop(future)
+                    in_flight[job.host] -= 1
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.logger.error(f'job {job.key} on {job.host} failed: {e}')
+                        counters['failed'] += 1
+                    else:
+                        counters['completed'] += 1
+                        if on_result is not None:
+                            on_result(job, result)
+                    # report progress and throughput.
+                    finished = counters['completed'] + counters['failed']
+                    if finished % self._progress_every == 0 or finished == len(jobs):
+                        elapsed = monotonic() - started
+                        rate = finished / elapsed if elapsed > 0 else 0.0
+                        eta = (len(jobs) - finished) / rate if rate > 0 else 0.0
+                        self.logger.info(
+                            f'crawled {finished} of {len(jobs)} ({100 * finished / len(jobs):.1f}%) - '
+                            f'{rate:.2f} jobs/s - eta {eta:.0f}s - {counters["failed"]} failed'
+                        )
+
+        return counters
+
+
+def crawl_downloaders(downloaders: list, jobs: list, max_concurrency: int = 8, logger=None) -> dict:
+    """
+    Crawls the jobs of several downloaders side by side with a single crawler, so that every host keeps the
+    politeness of its downloader while max_concurrency caps the requests in flight across all of them.
+    :param downloaders: list - Api instances exposing the host they crawl and its host_policy.
+    :param jobs: list - CrawlJob instances of every downloader, e.g. kworb track jobs + weekly charts jobs.
+    :param max_concurrency: int - max amount of requests in flight across every host.
+    :param logger: logger instance, defaults to the first downloader's logger.
+    :return: dict - amount of completed and failed jobs.
+    """
+
+    # assert input.
+    if not isinstance(downloaders, list) or len(downloaders) == 0:
+        raise ValueError(f'expected a valid non empty list, but found {downloaders} of type {type(downloaders)}')
+
+    # one policy per host.
+    crawler = Crawler(
+        max_concurrency=max_concurrency,
+        policies={downloader.host: downloader.host_policy for downloader in downloaders},
+        logger=logger or downloaders[0].logger
+    )
+    counters: dict = crawler.crawl(jobs=jobs)
+
+    # every downloader shares the same transport.
+    crawler.logger.info(f'crawl over {len(downloaders)} downloaders completed')
+    downloaders[0].log_transport_stats()
+
+    return counters
@@ -0,0 +1,269 @@
+import csv
+import io
+import os
+
+from shutil import copyfileobj
+from time import perf_counter
+
+
+class CsvConsolidator:
+
+    # consolidation modes.
+    BYTES = 'bytes'
+    ROWS = 'rows'
+    UNION = 'union'
+
+    def __init__(self, delimiter: str = ',', logger=None, block_size: int = 1024 * 1024, count_rows: bool = True):
+        """
+        Concatenates CSV files sharing a header into a single fully quoted CSV file. When every input was written
+        with the same header and the output dialect, bodies are copied at byte level through copy_file_range or
+        sendfile. Inputs in another dialect are re-encoded row by row, and inputs with different headers are
+        merged row by row under the union of their headers.
+        :param delimiter: str - delimiter of the input files.
+        :param logger: logger instance, nothing is logged when None.
+        :param block_size: int - bytes per copy call.
+        :param count_rows: bool - whether rows copied at byte level are counted, which reads every body once.
+        """
+
+        # settings.
+        self._delimiter: str = delimiter
+        self._block_size: int = block_size
+        self._count_rows: bool = count_rows
+        self.logger = logger
+
+    @staticmethod
+    def _encode_row(row: list) -> bytes:
+
+        # same encoding csv.writer(..., quoting=csv.QUOTE_ALL) produces.
+        buffer = io.StringIO()
+        csv.writer(buffer, quoting=csv.QUOTE_ALL).writerow(row)
+
+        return buffer.getvalue().encode('utf-8')
+
+    def _inspect(self, file: str) -> dict:
+        """
+        Reads the header of a file and checks whether its body can be copied as it is.
+        :param file: str - CSV file.
+        :return: dict - header fields, header size in bytes and whether the file is in the output dialect.
+        """
+
+        with open(file, 'rb') as f:
+            # header and first row.
+            header_line = f.readline()
+            first_line = f.readline()
+            # last bytes, a file must end with a line terminator to be concatenated.
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 2))
+            tail = f.read()
+
+        # parse header.
+        header = next(csv.reader([header_line.decode('utf-8-sig')], delimiter=self._delimiter), [])
+
+        # the header and first row must be exactly what the output writer would produce.
+        canonical = header_line == self._encode_row(header) and tail == b'\r\n'
+        if canonical and first_line:
+            row = next(csv.reader([first_line.decode('utf-8')], delimiter=self._delimiter), [])
+            canonical = first_line == self._encode_row(row)
+
+        return {'header': header, 'header_size': len(header_line), 'size': size, 'canonical': canonical}
+
+    def _copy_body(self, file: str, offset: int, size: int, output) -> int:
+        """
+        Appends the bytes of a file past its header to the output, without going through user space when the
+        platform allows it.
+        :param file: str - CSV file.
+        :param offset: int - header size.
+        :param size: int - file size.
+        :param output: unbuffered binary output file.
+        :return: int - rows copied, counted as line terminators, None when rows are not counted.
+        """
+
+        count = size - offset
+        with open(file, 'rb') as f:
+            # count rows.
+            rows = None
+            if self._count_rows:
+                f.seek(offset)
+                rows = 0
+                for block in iter(lambda: f.read(self._block_size), b''):
+                    rows += block.count(b'\r\n')
+            # kernel side copies.
+            copied = 0
+            for copy in (getattr(os, 'copy_file_range', None), getattr(os, 'sendfile', None)):
+                if copy is None:
+                    continue
+                try:
+                    while copied < count:
+                        if copy is os.sendfile:
+                            sent = os.sendfile(output.fileno(), f.fileno(), offset + copied, count - copied)
+                        else:
+                            sent = copy(f.fileno(), output.fileno(), count - copied, offset + copied)
+                        if sent == 0:
+                            break
+                        copied += sent
+                    if copied == count:
+                        return rows
+                except OSError:
+                    # e.g. file systems or kernels without support, carry on where it stopped.
+                    continue
+            # buffered copy.
+            f.seek(offset + copied)
+            copyfileobj(f, output, self._block_size)
+
+        return rows
+
+    def consolidate(self, files: list, output_file: str) -> dict:
+        """
+        Consolidates CSV files into one.
+        :param files: list - CSV files, in output order.
+        :param output_file: str - consolidated CSV file.
+        :return: dict - mode, files, rows, bytes, seconds, rows_per_second and mb_per_second.
+        """
+
+        start = perf_counter()
+
+        # inspect headers.
+        inspections = [self._inspect(file=file) for file in files]
+        headers = [inspection.get('header') for inspection in inspections]
+        same_header = all(header == headers[0] for header in headers)
+
+        # pick the fastest mode the inputs allow.
+        if same_header and all(inspection.get('canonical') for inspection in inspections):
+            mode = self.BYTES
+        elif same_header:
+            mode = self.ROWS
+        else:
+            mode = self.UNION
+
+        # logger.
+        if self.logger is not None:
+            self.logger.info(f'consolidating {len(files)} files by {mode}')
+
+        # consolidate.
+        rows = 0
+        with open(output_file, 'wb', buffering=0) as output:
+            if mode == self.BYTES:
+                # header once, bodies as they are.
+                if files:
+                    output.write(self._encode_row(headers[0]))
+                for index, (file, inspection) in enumerate(zip(files, inspections)):
+                    copied = self._copy_body(
+                        file=file, offset=inspection.get('header_size'), size=inspection.get('size'), output=output
+                    )
+                    rows = None if copied is None else rows + copied
+                    # logger.
+                    if self.logger is not None:
+                        self.logger.info(f'file {file} consolidated - {index + 1} of {len(files)}')
+            else:
+                rows = self._merge_rows(files=files, headers=headers, mode=mode, output=output)
+
+        # throughput.
+        seconds = max(perf_counter() - start, 1e-9)
+        size = os.path.getsize(output_file)
+        stats = {
+            'mode': mode, 'files': len(files), 'rows': rows, 'bytes': size, 'seconds': seconds,
+            'rows_per_second': None if rows is None else rows / seconds, 'mb_per_second': size / 1024 / 1024 / seconds
+        }
+
+        # logger.
+        if self.logger is not None:
+            volume = f'{size / 1024 / 1024:.2f} MB' if rows is None else \
+                f'{rows} rows ({size / 1024 / 1024:.2f} MB)'
+            rate = f'{stats["mb_per_second"]:.2f} MB/s' if rows is None else \
+                f'{stats["rows_per_second"]:.0f} rows/s, {stats["mb_per_second"]:.2f} MB/s'
+            self.logger.info(f'{volume} consolidated by {mode} in {seconds:.2f} seconds - {rate}')
+
+        return stats
+
+    def append(self, files: list, output_file: str):
+        """
+        Appends CSV files to an existing consolidated file at byte level. Nothing is written unless every file
+        shares the output's header and dialect.
+        :param files: list - CSV files, in output order.
+        :param output_file: str - consolidated CSV file.
+        :return: dict or None - consolidation stats, None when the files cannot be appended as they are.
+        """
+
+        start = perf_counter()
+
+        # output and inputs must share header and dialect.
+        output_inspection = self._inspect(file=output_file)
+        if not output_inspection.get('canonical'):
+            return None
+        inspections = [self._inspect(file=file) for file in files]
+        for inspection in inspections:
+            if not inspection.get('canonical') or inspection.get('header') != output_inspection.get('header'):
+                return None
+
+        # logger.
+        if self.logger is not None:
+            self.logger.info(f'appending {len(files)} files by {self.BYTES}')
+
+        # append bodies.
+        rows = 0
+        initial_size = output_inspection.get('size')
+        with open(output_file, 'ab', buffering=0) as output:
+            for index, (file, inspection) in enumerate(zip(files, inspections)):
+                copied = self._copy_body(
+                    file=file, offset=inspection.get('header_size'), size=inspection.get('size'), output=output
+                )
+                rows = None if copied is None else rows + copied
+                # logger.
+                if self.logger is not None:
+                    self.logger.info(f'file {file} appended - {index + 1} of {len(files)}')
+
+        # throughput.
+        seconds = max(perf_counter() - start, 1e-9)
+        size = os.path.getsize(output_file) - initial_size
+        stats = {
+            'mode': self.BYTES, 'files': len(files), 'rows': rows, 'bytes': size, 'seconds': seconds,
+            'rows_per_second': None if rows is None else rows / seconds, 'mb_per_second': size / 1024 / 1024 / seconds
+        }
+
+        # logger.
+        if self.logger is not None:
+            self.logger.info(f'{size / 1024 / 1024:.2f} MB appended in {seconds:.2f} seconds')
+
+        return stats
+
+    def _merge_rows(self, files: list, headers: list, mode: str, output) -> int:
+
+        # output header, union of every header in order of appearance.
+        fields = list()
+        for header in headers:
+            fields.extend([field for field in header if field not in fields])
+
+        # buffered text writer on top of the raw output.
+        rows = 0
+        text = io.TextIOWrapper(io.BufferedWriter(output, self._block_size), encoding='utf-8', newline='')
+        writer = csv.writer(text, quoting=csv.QUOTE_ALL)
+        writer.writerow(fields)
+        for index, (file, header) in enumerate(zip(files, headers)):
+            with open(file, 'r', encoding='utf-8-sig', newline='') as f:
+                reader = csv.reader(f, delimiter=self._delimiter)
+                # skip header.
+                next(reader, None)
+                if mode == self.ROWS:
+                    # same columns, rows are only re-encoded.
+                    for row in reader:
+                        writer.writerow(row)
+                        rows += 1
+                else:
+                    # place every value under its column.
+                    positions = [header.index(field) if field in header else None for field in fields]
+                    for row in reader:
+                        writer.writerow([
+                            row[position] if position is not None and position < len(row) else ''
+                            for position in positions
+                        ])
+                        rows += 1
+            # logger.
+            if self.logger is not None:
+                self.logger.info(f'file {file} consolidated - {index + 1} of {len(files)}')
+
+        # flush buffers, the raw output is closed by its owner.
+        text.flush()
+        text.detach().detach()
+
+        return rows
@@ -0,0 +1,169 @@
+import re
+
+from collections import deque
+from html import unescape
+
+
+class HtmlTableReader:
+
+    # table tags, any other markup within a cell is dropped from its text.
+    _tag = re.compile(r'<(/?)(table|tr|td|th|a|br)\b([^>]*)>|<!--.*?-->', re.IGNORECASE | re.DOTALL)
+    _markup = re.compile(r'<[^>]*>')
+    _href = re.compile(r'href\s*=\s*["\']?([^"\'\s>]+)', re.IGNORECASE)
+
+    def __init__(self):
+        """
+        Streaming table tokenizer. Only table, row, cell, link and line break tags are tokenized, and rows are
+        emitted as soon as they are closed, without building a document tree. Only the row being read and the
+        unfinished tail of the latest chunk are held in memory whatever the size of the page.
+        """
+
+        # completed rows, (table index, header row, cell texts, links per cell).
+        self.rows: deque = deque()
+
+        # unprocessed tail of the latest chunk, e.g. a tag split across chunks.
+        self._buffer: str = ''
+
+        # parsing state.
+        self._table: int = -1
+        self._depth: int = 0
+        self._cells: list = None
+        self._links: list = None
+        self._header: bool = False
+        self._text: list = None
+        self._hrefs: list = None
+
+    def feed(self, data: str) -> None:
+        """
+        Tokenizes a chunk of the document.
+        :param data: str - next chunk.
+        :return: None
+        """
+
+        data = self._buffer + data
+
+        # keep an unfinished tag or comment for the next chunk.
+        end = len(data)
+        tag_start = data.rfind('<')
+        if tag_start != -1 and data.find('>', tag_start) == -1:
+            end = tag_start
+        comment_start = data.rfind('<!--', 0, end)
+        if comment_start != -1 and data.find('-->', comment_start) == -1:
+            end = comment_start
+        self._buffer = data[end:]
+
+        self._tokenize(data=data, end=end)
+
+    def close(self) -> None:
+
+        # flush the tail and the row left open at the end of the document.
+        data, self._buffer = self._buffer, ''
+        self._tokenize(data=data, end=len(data))
+        self._close_row()
+
+    def _tokenize(self, data: str, end: int) -> None:
+
+        position = 0
+        for match in self._tag.finditer(data, 0, end):
+            # text up to the tag.
+            if self._text is not None and match.start() > position:
+                self._text.append(data[position:match.start()])
+            position = match.end()
+            # comments.
+            tag = match.group(2)
+            if tag is None:
+                continue
+            # tags.
+            if match.group(1):
+                self._end_tag(tag=tag.lower())
+            else:
+                self._start_tag(tag=tag.lower(), attrs=match.group(3))
+
+        # text up to the end of the chunk.
+        if self._text is not None and end > position:
+            self._text.append(data[position:end])
+
+    def _start_tag(self, tag: str, attrs: str) -> None:
+
+        if tag == 'table':
+            # nested tables are flattened into their outer table.
+            self._depth += 1
+            if self._depth == 1:
+                self._table += 1
+        elif self._depth == 0:
+            return
+        elif tag == 'tr':
+            self._close_row()
+            self._cells, self._links, self._header = list(), list(), True
+        elif tag in ('td', 'th'):
+            self._close_cell()
+            if self._cells is None:
+                self._cells, self._links, self._header = list(), list(), True
+            self._header &= tag == 'th'
+            self._text, self._hrefs = list(), list()
+        elif tag == 'a' and self._text is not None:
+            href = self._href.search(attrs)
+            if href is not None:
+                self._hrefs.append(href.group(1))
+        elif tag == 'br' and self._text is not None:
+            self._text.append(' ')
+
+    def _end_tag(self, tag: str) -> None:
+
+        if self._depth == 0:
+            return
+        if tag in ('td', 'th'):
+            self._close_cell()
+        elif tag == 'tr':
+            self._close_row()
+        elif tag == 'table':
+            self._close_row()
+            self._depth -= 1
+
+    def _close_cell(self) -> None:
+
+        # no open cell.
+        if self._text is None:
+            return
+
+        # plain text, without markup nor repeated whitespace.
+        text = ''.join(self._text)
+        if '<' in text:
+            text = self._markup.sub('', text)
+        if '&' in text:
+            text = unescape(text)
+
+        self._cells.append(' '.join(text.split()))
+        self._links.append(self._hrefs)
+        self._text, self._hrefs = None, None
+
+    def _close_row(self) -> None:
+
+        # no open row.
+        self._close_cell()
+        if self._cells is None:
+            return
+
+        if self._cells:
+            self.rows.append((self._table, self._header, self._cells, self._links))
+        self._cells, self._links = None, None
+
+
+def iter_table_rows(file: str, chunk_size: int = 256 * 1024, encoding: str = 'utf-8'):
+    """
+    Yields the rows of every table of an HTML file, reading it in chunks.
+    :param file: str - HTML file.
+    :param chunk_size: int - characters fed to the tokenizer at a time.
+    :param encoding: str - file encoding.
+    :return: generator - (table index, header row, cell texts, links per cell) tuples, in document order.
+    """
+
+    reader = HtmlTableReader()
+    with open(file, 'r', encoding=encoding, errors='replace') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            reader.feed(chunk)
+            while reader.rows:
+                yield reader.rows.popleft()
+    reader.close()
+    while reader.rows:
+        yield reader.rows.popleft()
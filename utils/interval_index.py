@@ -0,0 +1,156 @@
+try:
+    import numpy as np
+except ImportError:
+    # interval indexes are queried through numpy.
+    np = None
+
+from utils.vector_store import VectorStore
+
+
+# audio analysis levels, from the coarsest to the finest.
+interval_levels = ('sections', 'bars', 'beats', 'tatums', 'segments')
+
+
+class IntervalIndex:
+
+    def __init__(self, file_base: str, levels: tuple = interval_levels):
+        """
+        Time interval index over the audio analysis levels of every track, one float64 [start, duration] store per
+        level as written by SpotTrackParser. Rows follow the level's index column, row i holds <level>_index i + 1,
+        and starts are sorted within a track, so every query is a binary search over a memory mapped view.
+        :param file_base: str - path towards the stores, without the _<level> suffix and extension.
+        :param levels: tuple - levels to open.
+        """
+
+        # assert numpy availability.
+        if np is None:
+            raise ValueError('interval indexes are queried through numpy, which is not installed')
+
+        # open one store per level.
+        self.file_base: str = file_base
+        self._stores: dict = {level: VectorStore(file_base=f'{file_base}_{level}') for level in levels}
+
+    def _store(self, level: str) -> VectorStore:
+
+        # assert level.
+        if level not in self._stores:
+            raise ValueError(f'the level value specified {level} is not allowed')
+
+        return self._stores[level]
+
+    def intervals(self, track_id: str, level: str):
+        """
+        Intervals of a track at a level.
+        :param track_id: str - track id.
+        :param level: str - one of sections, bars, beats, tatums or segments.
+        :return: numpy.ndarray - rows x 2 view holding start and duration, empty when the track is not indexed.
+        """
+
+        intervals = self._store(level=level).get(key=track_id)
+
+        return np.empty((0, 2), dtype=np.float64) if intervals is None else intervals
+
+    def locate(self, track_id: str, level: str, times):
+        """
+        Rows of the intervals containing each time.
+        :param track_id: str - track id.
+        :param level: str - level to search.
+        :param times: float or array-like - times in seconds.
+        :return: numpy.ndarray - int64 rows, -1 for times outside every interval.
+        """
+
+        intervals = self.intervals(track_id=track_id, level=level)
+        times = np.asarray(times, dtype=np.float64)
+
+        # track not indexed at this level.
+        if len(intervals) == 0:
+            return np.full(times.shape, -1, dtype=np.int64)
+
+        # last interval starting at or before each time.
+        rows = np.searchsorted(intervals[:, 0], times, side='right') - 1
+        inside = rows >= 0
+        ends = intervals[np.maximum(rows, 0), 0] + intervals[np.maximum(rows, 0), 1]
+        inside &= times < ends
+
+        return np.where(inside, rows, -1)
+
+    def between(self, track_id: str, level: str, start: float, end: float) -> slice:
+        """
+        Rows of the intervals overlapping [start, end), e.g. sections between 30s and 60s.
+        :param track_id: str - track id.
+        :param level: str - level to search.
+        :param start: float - range start in seconds.
+        :param end: float - range end in seconds.
+        :return: slice - rows, to be applied to intervals or to any matrix following the same rows.
+        """
+
+        intervals = self.intervals(track_id=track_id, level=level)
+        starts = intervals[:, 0]
+
+        # first interval ending after start, last interval starting before end.
+        first = max(int(np.searchsorted(starts, start, side='right')) - 1, 0)
+        if first < len(starts) and starts[first] + intervals[first, 1] <= start:
+            first += 1
+        last = int(np.searchsorted(starts, end, side='left'))
+
+        return slice(first, max(first, last))
+
+    def within(self, track_id: str, level: str, parent_level: str, parent_row: int) -> slice:
+        """
+        Rows of a level overlapping a single interval of another level, e.g. the segments inside beat_index 37
+        are within(track_id, 'segments', 'beats', 36).
+        :param track_id: str - track id.
+        :param level: str - level to search.
+        :param parent_level: str - level of the enclosing interval.
+        :param parent_row: int - row of the enclosing interval.
+        :return: slice - rows of level.
+        """
+
+        parent_start, parent_duration = self.intervals(track_id=track_id, level=parent_level)[parent_row]
+
+        return self.between(track_id=track_id, level=level, start=parent_start, end=parent_start + parent_duration)
+
+    def align(self, track_id: str, level: str, parent_level: str):
+        """
+        Maps every interval of a level to the interval of another level containing its start, e.g. segments to
+        beats or beats to bars.
+        :param track_id: str - track id.
+        :param level: str - level whose intervals are mapped.
+        :param parent_level: str - level mapped onto.
+        :return: numpy.ndarray - int64 parent rows, one per interval of level, -1 outside every parent interval.
+        """
+
+        return self.locate(
+            track_id=track_id, level=parent_level, times=self.intervals(track_id=track_id, level=level)[:, 0]
+        )
+
+    @staticmethod
+    def synchronize(values, assignment, parents: int, weights=None):
+        """
+        Averages rows of values into their assigned parent rows, e.g. beat synchronous pitches out of the segment
+        pitches matrix and align(track_id, 'segments', 'beats').
+        :param values: array-like - rows x columns values, e.g. a VectorStore matrix.
+        :param assignment: array-like - parent row per row of values, rows assigned -1 are skipped.
+        :param parents: int - amount of parent rows.
+        :param weights: array-like - weight per row of values, e.g. segment durations, equal weights when None.
+        :return: numpy.ndarray - parents x columns float64 means, NaN for parents without rows.
+        """
+
+        values = np.asarray(values, dtype=np.float64)
+        values = values.reshape(len(values), -1)
+        assignment = np.asarray(assignment, dtype=np.int64)
+        weights = np.ones(len(values), dtype=np.float64) if weights is None else np.asarray(weights, np.float64)
+
+        # skip unassigned rows.
+        valid = assignment >= 0
+        assignment, values, weights = assignment[valid], values[valid], weights[valid]
+
+        # weighted sums per parent, one bincount per column.
+        totals = np.bincount(assignment, weights=weights, minlength=parents)[:parents]
+        means = np.full((parents, values.shape[1]), np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for column in range(values.shape[1]):
+                sums = np.bincount(assignment, weights=values[:, column] * weights, minlength=parents)[:parents]
+                means[:, column] = sums / totals
+
+        return means
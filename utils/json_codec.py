@@ -0,0 +1,85 @@
+import json
+import mmap
+
+from os import path
+
+try:
+    import orjson
+except ImportError:
+    # stdlib json is used instead.
+    orjson = None
+
+
+class JsonCodec:
+
+    # available backends, fastest first.
+    backends = ('orjson', 'json')
+
+    def __init__(self, backend: str = None, mmap_threshold: int = 1024 * 1024):
+        """
+        JSON encoder / decoder picking the fastest backend installed, orjson when available and stdlib json
+        otherwise. Files larger than mmap_threshold are decoded straight from a memory map.
+        :param backend: str - 'orjson' or 'json', defaults to the fastest one installed.
+        :param mmap_threshold: int - min file size in bytes to be read through mmap, only used by orjson since
+        stdlib json cannot decode from a buffer.
+        """
+
+        # resolve backend.
+        if backend is None:
+            backend = 'orjson' if orjson is not None else 'json'
+        if backend not in self.backends:
+            raise ValueError(f'the backend value specified {backend} is not allowed')
+        if backend == 'orjson' and orjson is None:
+            raise ValueError('orjson backend was requested but orjson is not installed')
+
+        # settings.
+        self.backend: str = backend
+        self.mmap_threshold: int = mmap_threshold
+
+    def loads(self, data):
+        """
+        Decodes a JSON document.
+        :param data: bytes, str or memoryview - encoded document.
+        :return: decoded document.
+        """
+
+        if self.backend == 'orjson':
+            return orjson.loads(data)
+
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+    def dumps(self, data) -> bytes:
+        """
+        Encodes a document as UTF-8 JSON.
+        :param data: document to encode.
+        :return: bytes
+        """
+
+        if self.backend == 'orjson':
+            try:
+                return orjson.dumps(data)
+            except TypeError:
+                # non string keys, big integers and other types orjson does not support.
+                pass
+
+        return json.dumps(data).encode('utf-8')
+
+    def load_file(self, file: str):
+        """
+        Reads and decodes a JSON file.
+        :param file: str - path towards the file.
+        :return: decoded document.
+        """
+
+        with open(file, 'rb') as f:
+            # small files, or backends that need a bytes copy anyway.
+            if self.backend != 'orjson' or path.getsize(file) < max(self.mmap_threshold, 1):
+                return self.loads(f.read())
+            # decode straight from the page cache.
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                with memoryview(m) as view:
+                    return self.loads(view)
+
+
+# default codec shared by every module.
+codec = JsonCodec()
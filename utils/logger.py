@@ -11,3 +11,16 @@ class InMemoryLogger:
 
     def error(self, msg: str):
         print(f'ERROR - {str(dt.now())} - {msg}')
+
+
+class BufferedLogger:
+
+    def __init__(self):
+        # buffered (level, message) records.
+        self.records: list = list()
+
+    def info(self, msg: str):
+        self.records.append(('info', msg))
+
+    def error(self, msg: str):
+        self.records.append(('error', msg))
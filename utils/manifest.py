@@ -0,0 +1,142 @@
+import threading
+
+from json import dumps, loads
+from os import path, makedirs, fsync, replace
+from time import time
+
+
+class DownloadManifest:
+
+    # id states.
+    FETCHED = 'fetched'
+    FAILED = 'failed'
+    NOT_FOUND = 'not_found'
+
+    def __init__(self, manifest_file: str):
+        """
+        Persistent record of the ids already fetched, failed or not found for a given endpoint. Entries are
+        appended to a JSON lines file, so a crashed run resumes from its last checkpoint.
+        :param manifest_file: str - path towards the manifest file.
+        """
+
+        # manifest location.
+        self._manifest_file: str = manifest_file
+
+        # latest state per id.
+        self._states: dict = dict()
+
+        # lock shared by concurrent writers.
+        self._lock = threading.Lock()
+
+        # load previous runs.
+        self._load()
+
+    @property
+    def manifest_file(self) -> str:
+        """
+        Getter for property manifest_file.
+        :return: str
+        """
+
+        return self._manifest_file
+
+    def _load(self) -> None:
+
+        # check file existence.
+        if not path.isfile(self._manifest_file):
+            return
+
+        # replay entries, latest state wins.
+        with open(self._manifest_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                # skip a line truncated by a crash.
+                try:
+                    entry = loads(line)
+                except ValueError:
+                    continue
+                self._states[entry.get('id')] = entry.get('status')
+
+    def state(self, id: str):
+        """
+        Returns the latest state of an id.
+        :param id: str - id to look up.
+        :return: str or None - None when the id was never requested.
+        """
+
+        return self._states.get(id)
+
+    def pending(self, ids: list, retry_failed: bool = True) -> list:
+        """
+        Filters out the ids that do not need to be requested again, keeping the original order.
+        :param ids: list - ids to be downloaded.
+        :param retry_failed: bool - whether ids that failed on previous runs should be requested again.
+        :return: list
+        """
+
+        # states which are final.
+        skipped = (self.FETCHED, self.NOT_FOUND) if retry_failed else (self.FETCHED, self.NOT_FOUND, self.FAILED)
+
+        # remove duplicates too.
+        seen = set()
+        pending = list()
+        for id in ids:
+            if id in seen or self._states.get(id) in skipped:
+                continue
+            seen.add(id)
+            pending.append(id)
+
+        return pending
+
+    def mark(self, ids: list, status: str) -> None:
+        """
+        Records the state of a set of ids and flushes it to disk.
+        :param ids: list - ids whose state is recorded.
+        :param status: str - one of FETCHED, FAILED or NOT_FOUND.
+        :return: None
+        """
+
+        # assert input.
+        if status not in (self.FETCHED, self.FAILED, self.NOT_FOUND):
+            raise ValueError(f'the status value specified {status} is not allowed')
+
+        with self._lock:
+            # check for location to save the manifest.
+            makedirs(path.dirname(self._manifest_file), exist_ok=True)
+            # append checkpoint.
+            timestamp = int(time())
+            with open(self._manifest_file, 'a', encoding='utf-8') as f:
+                for id in ids:
+                    f.write(dumps({'id': id, 'status': status, 'timestamp': timestamp}) + '\n')
+                    self._states[id] = status
+                f.flush()
+                fsync(f.fileno())
+
+    def summary(self) -> dict:
+        """
+        Counts ids per state.
+        :return: dict
+        """
+
+        summary = {self.FETCHED: 0, self.FAILED: 0, self.NOT_FOUND: 0}
+        for status in self._states.values():
+            summary[status] = summary.get(status, 0) + 1
+
+        return summary
+
+    def compact(self) -> None:
+        """
+        Rewrites the manifest keeping only the latest state of every id.
+        :return: None
+        """
+
+        with self._lock:
+            # nothing to compact.
+            if not path.isfile(self._manifest_file):
+                return
+            # write atomically.
+            timestamp = int(time())
+            tmp_file = f'{self._manifest_file}.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                for id, status in self._states.items():
+                    f.write(dumps({'id': id, 'status': status, 'timestamp': timestamp}) + '\n')
+            replace(tmp_file, self._manifest_file)
@@ -1,19 +1,93 @@
-from os.path import join, isfile, splitext
-from os import listdir, remove
+import csv
+import sys
+import zlib
 
-from json import loads
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from importlib.util import spec_from_file_location, module_from_spec
+from os.path import join, isfile, isdir, exists, splitext, basename, relpath
+from os import listdir, remove
+from shutil import rmtree
 
-from utils.logger import InMemoryLogger
+from utils.chart_store import ChartStoreWriter
+from utils.logger import InMemoryLogger, BufferedLogger
 from utils.config import Config
+from utils.consolidation_manifest import ConsolidationManifest
+from utils.csv_consolidator import CsvConsolidator
+from utils.json_codec import codec
+from utils.sqlite_sink import SqliteSink
+from utils.table_writer import TableWriter, open_table, read_table, resolve_output_format, table_extensions
+from utils.vector_store import VectorStoreWriter
+
+
+def _load_parser_class(module_file: str, module_name: str, class_name: str) -> type:
+    """
+    Resolves a Parser subclass from the file of its module, as parsers living in hyphenated files can only be
+    loaded through importlib and can not be pickled by module name.
+    :param module_file: str - path towards the module file.
+    :param module_name: str - name the module was loaded with.
+    :param class_name: str - name of the class.
+    :return: type
+    """
+
+    # module already loaded by this process, e.g. inherited on fork.
+    module = sys.modules.get(module_name)
+    if module is None or getattr(module, '__file__', None) != module_file:
+        # load module from file, once per process.
+        module_name = f'_parser_module_{class_name}'
+        module = sys.modules.get(module_name)
+        if module is None:
+            spec = spec_from_file_location(module_name, module_file)
+            module = module_from_spec(spec)
+            sys.modules[module_name] = module
+            spec.loader.exec_module(module)
+
+    return getattr(module, class_name)
+
+
+def _parse_file_in_worker(parser_class: tuple, settings: dict, method_name: str, kwargs: dict, file: str) -> list:
+    """
+    Parses a single file inside a worker process. Module level function so that it can be pickled.
+    :param parser_class: tuple - module file, module name and class name of the Parser subclass to instantiate.
+    :param settings: dict - instance attributes copied from the parent parser.
+    :param method_name: str - name of the method parsing a single file.
+    :param kwargs: dict - keyword arguments for the parsing method.
+    :param file: str - file to parse.
+    :return: list - buffered log records.
+    """
+
+    # new parser, logging into a buffer which is replayed by the parent process.
+    parser = _load_parser_class(*parser_class)()
+    parser.__dict__.update(settings)
+    parser.logger = BufferedLogger()
+
+    # parse file.
+    for file_name, raw_data in parser._stream_files(files=[file]):
+        getattr(parser, method_name)(raw_data=raw_data, file_name=file_name, **kwargs)
+
+    return parser.logger.records
 
 
 class Parser:
 
-    def __init__(self):
+    def __init__(self, output_format: str = 'csv'):
+        """
+        Initialise parser base class.
+        :param output_format: str - format of parsed and consolidated tables, one of csv, parquet, npy or columnar,
+        the latter writes parquet when pyarrow is installed and one .npy file per column otherwise.
+        """
 
         # initialise logger.
         self.logger: InMemoryLogger = InMemoryLogger()
 
+        # resolve output format.
+        try:
+            self._output_format: str = resolve_output_format(output_format=output_format)
+        except ValueError as e:
+            self.logger.error(str(e))
+            raise
+
         # initialise config
         self._environment: dict = self._init_environment()
 
@@ -60,19 +134,46 @@ class Parser:
         # assign value.
         self._environment = env
 
+    @property
+    def output_format(self) -> str:
+        """
+        Getter for property output_format.
+        :return: str - csv, parquet or npy.
+        """
+
+        return self._output_format
+
     def _clear_containers(self):
         # wipe data from containers.
         self._raw_data_container.clear()
         self._files_container.clear()
 
-    def _read_files(self, path: str, allowed_extensions: tuple = ('.csv', '.txt', '.json', '.html'),
-                    list_only: bool = False, max_files: int = 99999, qualifier: str = '*'):
+    def _list_files(self, path: str, allowed_extensions: tuple = ('.csv', '.txt', '.json', '.html'),
+                    max_files: int = 99999, qualifier: str = '*') -> list:
+        """
+        Lists the files in a directory matching the given extensions and qualifier, without opening them.
+        Listed files are also appended to the files container.
+        :param path: str - directory from which to draw files.
+        :param allowed_extensions: tuple - extensions of the files to be listed.
+        :param max_files: int - max files to list.
+        :param qualifier: str - substring every file name must contain, '*' lists every file.
+        :return: list - file paths.
+        """
+
+        # listed files.
+        files: list = list()
 
         # iterate files in directory.
         for file in listdir(path):
 
-            # check for file.
-            if not isfile(join(path, file)):
+            # check max files limit.
+            if len(files) >= max_files:
+                # interrupt listing due to limit reach.
+                break
+
+            # check for file, directories are only listed when they hold a table of an allowed extension.
+            if not isfile(join(path, file)) and not (isdir(join(path, file)) and
+                                                     splitext(file)[1] in allowed_extensions):
                 # skip directories.
                 continue
 
@@ -89,25 +190,361 @@ class Parser:
                     # skip file
                     continue
 
-            # open file.
-            with open(join(path, file)) as f:
-                # check for listing.
-                if not list_only:
-                    # check reader type.
-                    if file_extension in ('.csv', '.txt', '.html'):
-                        # append data to files container.
-                        self._raw_data_container.append(join(path, file))
-                    elif file_extension == '.json':
-                        # append data to files container.
-                        self._raw_data_container.append(loads(f.read()))
-
-                # append file path to files container.
-                self._files_container.append(join(path, file))
+            # append file path to containers.
+            files.append(join(path, file))
+            self._files_container.append(join(path, file))
 
-            # check max files limit.
-            if len(self._raw_data_container) >= max_files:
-                # interrupt reading due to limit reach.
-                break
+        return files
+
+    @staticmethod
+    def _stream_files(files: list):
+        """
+        Yields one file at a time, JSON files are decoded right before being yielded so only one document is held
+        in memory at any given time. Any other file is yielded as its path.
+        :param files: list - file paths, as returned by _list_files.
+        :return: generator - (file path, data) tuples.
+        """
+
+        # iterate files.
+        for file in files:
+            # check reader type.
+            if splitext(file)[1] == '.json':
+                # decode document.
+                yield file, codec.load_file(file=file)
+            else:
+                # file is read by the caller.
+                yield file, file
+
+    @staticmethod
+    def _shard_files(files: list, shard: str = None) -> list:
+        """
+        Keeps the files belonging to a shard. Files are assigned by a hash of their name, so every host splitting
+        the same directory gets the same disjoint shards regardless of listing order.
+        :param files: list - file paths.
+        :param shard: str - shard formatted as i/n, with i in [0, n), None keeps every file.
+        :return: list
+        """
+
+        # no sharding.
+        if shard in (None, ''):
+            return files
+
+        # parse shard.
+        try:
+            index, total = [int(x) for x in shard.split('/')]
+        except (AttributeError, ValueError):
+            raise ValueError(f'expected a shard formatted as i/n, but found {shard}')
+        if total < 1 or not 0 <= index < total:
+            raise ValueError(f'expected a shard i/n with 0 <= i < n, but found {shard}')
+
+        return [file for file in files if zlib.crc32(basename(file).encode('utf-8')) % total == index]
+
+    def _worker_settings(self) -> dict:
+        """
+        Instance attributes that worker processes must share with this parser.
+        :return: dict
+        """
+
+        return {'_base_path': getattr(self, '_base_path', None), '_output_format': self._output_format}
+
+    def _parse_files(self, files: list, method_name: str, workers: int = 1, **kwargs) -> None:
+        """
+        Parses every file with the given method, either sequentially or spread across a pool of processes.
+        Log records of every file are replayed in file order, and output files do not depend on the mode.
+        :param files: list - file paths, as returned by _list_files.
+        :param method_name: str - name of the method parsing a single file, it receives raw_data and file_name.
+        :param workers: int - amount of processes, 1 parses files on the current process.
+        :param kwargs: keyword arguments for the parsing method.
+        :return: None
+        """
+
+        # assert workers input.
+        if not isinstance(workers, int) or workers < 1:
+            self.logger.error(f'expected a positive integer, but found {workers} of type {type(workers)}')
+            raise ValueError(f'expected a positive integer, but found {workers} of type {type(workers)}')
+
+        # sequential mode, documents are decoded one at a time.
+        if workers == 1 or len(files) <= 1:
+            for index, (file, raw_data) in enumerate(self._stream_files(files=files)):
+                # logger.
+                self.logger.info(f'iterating file {file} - {index + 1} of {len(files)}')
+                # summon parser.
+                getattr(self, method_name)(raw_data=raw_data, file_name=file, **kwargs)
+            return
+
+        # parallel mode.
+        self.logger.info(f'parsing {len(files)} files using {workers} processes')
+        # parser class by file, its module may not be importable by name.
+        module = sys.modules.get(type(self).__module__)
+        module_file = getattr(module, '__file__', None) or next(
+            value.__code__.co_filename for value in vars(type(self)).values() if hasattr(value, '__code__')
+        )
+        parser_class = (module_file, type(self).__module__, type(self).__name__)
+        worker = partial(_parse_file_in_worker, parser_class, self._worker_settings(), method_name, kwargs)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # results are yielded in file order.
+            records = executor.map(worker, files, chunksize=max(1, len(files) // (workers * 8)))
+            for index, (file, file_records) in enumerate(zip(files, records)):
+                # logger.
+                self.logger.info(f'iterating file {file} - {index + 1} of {len(files)}')
+                # merge worker log.
+                for level, msg in file_records:
+                    getattr(self.logger, level)(msg)
+
+    def _read_files(self, path: str, allowed_extensions: tuple = ('.csv', '.txt', '.json', '.html'),
+                    list_only: bool = False, max_files: int = 99999, qualifier: str = '*'):
+
+        # list files in directory.
+        files: list = self._list_files(
+            path=path, allowed_extensions=allowed_extensions, max_files=max_files, qualifier=qualifier
+        )
+
+        # check for listing.
+        if list_only:
+            return
+
+        # append data to raw data container.
+        for _, data in self._stream_files(files=files):
+            self._raw_data_container.append(data)
+
+    def _table_extensions(self) -> tuple:
+        """
+        Extensions of the tables written with the current output format.
+        :return: tuple
+        """
+
+        return tuple([table_extensions[self._output_format]])
+
+    def _open_table(self, output_path: list, file_name: str, fields: list, types: list) -> TableWriter:
+        """
+        Opens a table writer in the current output format.
+        :param output_path: list - inner project path where the table is stored.
+        :param file_name: str - table name, without extension.
+        :param fields: list - column names.
+        :param types: list - column types, one of str, int, float or bool per column.
+        :return: TableWriter
+        """
+
+        return open_table(
+            file_base=join(self._base_path, *output_path, file_name), fields=fields, types=types,
+            output_format=self._output_format
+        )
+
+    def _write_table(self, output_path: list, file_name: str, fields: list, types: list, rows: list) -> None:
+        """
+        Writes a whole table in the current output format.
+        :param output_path: list - inner project path where the table is stored.
+        :param file_name: str - table name, without extension.
+        :param fields: list - column names.
+        :param types: list - column types, one of str, int, float or bool per column.
+        :param rows: list - tuples holding one value per field.
+        :return: None
+        """
+
+        with self._open_table(output_path=output_path, file_name=file_name, fields=fields, types=types) as table:
+            table.write_rows(rows=rows)
+
+    def _open_vector_store(self, output_path: list, file_name: str, width: int,
+                           dtype: str = 'float32') -> VectorStoreWriter:
+        """
+        Opens a vector store writer, stored alongside the tables whatever the output format.
+        :param output_path: list - inner project path where the store is stored.
+        :param file_name: str - store name, without extension.
+        :param width: int - values per row.
+        :param dtype: str - value type, float32 or float64.
+        :return: VectorStoreWriter
+        """
+
+        return VectorStoreWriter(file_base=join(self._base_path, *output_path, file_name), width=width, dtype=dtype)
+
+    def _open_chart_store(self, output_path: list, file_name: str) -> ChartStoreWriter:
+        """
+        Opens a chart store writer, stored alongside the tables whatever the output format.
+        :param output_path: list - inner project path where the store is stored.
+        :param file_name: str - store name, without extension.
+        :return: ChartStoreWriter
+        """
+
+        return ChartStoreWriter(file_base=join(self._base_path, *output_path, file_name))
+
+    def _iter_table_rows(self, file: str, fields: list, delimiter: str = ','):
+        """
+        Yields the rows of a CSV or columnar table, holding the given fields in the given order. CSV columns are
+        matched by header name.
+        :param file: str - path towards the table.
+        :param fields: list - column names.
+        :param delimiter: str - delimiter of CSV inputs.
+        :return: generator - tuples holding one value per field, None for fields missing from the table.
+        """
+
+        # columnar tables.
+        if splitext(file)[1] != '.csv':
+            data = read_table(file=file)
+            columns = dict(zip(data.get('fields'), data.get('columns')))
+            rows = len(data.get('columns')[0]) if data.get('columns') else 0
+            yield from zip(*[columns.get(field, [None] * rows) for field in fields])
+            return
+
+        # csv files.
+        with open(file, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f, delimiter=delimiter)
+            header = next(reader, [])
+            positions = [header.index(field) if field in header else None for field in fields]
+            for row in reader:
+                yield tuple([row[position] if position is not None else None for position in positions])
+
+    def _consolidate_tables(self, output_path: list, file_name: str) -> None:
+        """
+        Consolidates the columnar tables held by the raw data container into a single table, column batches are
+        appended without going through rows.
+        :param output_path: list - inner project path where the consolidated table is stored.
+        :param file_name: str - consolidated table name, without extension.
+        :return: None
+        """
+
+        # consolidated table, opened with the schema of the first table.
+        table = None
+
+        # iterate tables.
+        files: int = len(self._raw_data_container)
+        for index, file in enumerate(self._raw_data_container):
+            # logger.
+            self.logger.info(f'iterating file {self._files_container[index]} - {index + 1} of {files}')
+            # read table.
+            data = read_table(file=file)
+            if table is None:
+                table = self._open_table(
+                    output_path=output_path, file_name=file_name, fields=data.get('fields'), types=data.get('types')
+                )
+            # append columns.
+            table.write_columns(columns=data.get('columns'))
+            # logger.
+            self.logger.info(f'file {file} consolidated')
+
+        # finish table.
+        if table is not None:
+            table.close()
+
+        # logger.
+        self.logger.info('all files have been consolidated')
+
+    def _consolidate_csv_files(self, output_path: list, file_name: str, delimiter: str) -> dict:
+        """
+        Consolidates the CSV files held by the raw data container into a single CSV file. Files sharing the
+        header and dialect the parsers write are concatenated at byte level, any other input is merged row by row.
+        :param output_path: list - inner project path where the consolidated file is stored.
+        :param file_name: str - consolidated file name, without extension.
+        :param delimiter: str - delimiter of the input files.
+        :return: dict - consolidation stats.
+        """
+
+        # consolidate files.
+        stats = CsvConsolidator(delimiter=delimiter, logger=self.logger).consolidate(
+            files=list(self._raw_data_container), output_file=join(self._base_path, *output_path, f'{file_name}.csv')
+        )
+
+        # logger.
+        self.logger.info('all files have been consolidated')
+
+        return stats
+
+    def _consolidate_output(self, output_path: list, file_name: str, delimiter: str, incremental: bool = False):
+        """
+        Consolidates the files held by the raw data container in the current output format. Incremental runs
+        keep a manifest next to the output recording every consolidated input, so that new inputs are appended
+        to the existing output and a full rebuild only happens when a consolidated input was modified or deleted.
+        Columnar outputs cannot be appended to, so they are rebuilt whenever there is any new input.
+        :param output_path: list - inner project path where the consolidated file is stored.
+        :param file_name: str - consolidated file name, without extension.
+        :param delimiter: str - delimiter of CSV inputs.
+        :param incremental: bool - whether the consolidation manifest is used.
+        :return: None
+        """
+
+        # full consolidation.
+        if not incremental:
+            if self._output_format == 'csv':
+                self._consolidate_csv_files(output_path=output_path, file_name=file_name, delimiter=delimiter)
+            else:
+                self._consolidate_tables(output_path=output_path, file_name=file_name)
+            return
+
+        # compare inputs against the previous run.
+        output_file = join(self._base_path, *output_path, f'{file_name}{self._table_extensions()[0]}')
+        manifest = ConsolidationManifest(
+            manifest_file=join(self._base_path, *output_path, f'{file_name}.manifest.json')
+        )
+        inputs = {relpath(file, self._base_path): file for file in self._raw_data_container}
+        plan, new, reason = manifest.plan(inputs=inputs, output_file=output_file, output_format=self._output_format)
+
+        # logger.
+        self.logger.info(f'{file_name} consolidation plan: {plan}, {reason}')
+
+        # append new inputs.
+        if plan == ConsolidationManifest.APPEND and self._output_format == 'csv':
+            stats = CsvConsolidator(delimiter=delimiter, logger=self.logger).append(
+                files=[inputs[name] for name in new], output_file=output_file
+            )
+            if stats is not None:
+                manifest.record(inputs=inputs, consolidated=new, output_file=output_file,
+                                output_format=self._output_format, rebuilt=False)
+                return
+            # logger.
+            self.logger.info('new files do not share the consolidated header and dialect, rebuilding instead')
+        elif plan == ConsolidationManifest.UP_TO_DATE:
+            manifest.record(inputs=inputs, consolidated=[], output_file=output_file,
+                            output_format=self._output_format, rebuilt=False)
+            return
+
+        # full rebuild, nothing is recorded when there was nothing to consolidate.
+        self._consolidate_output(output_path=output_path, file_name=file_name, delimiter=delimiter)
+        if not exists(output_file):
+            return
+        manifest.record(inputs=inputs, consolidated=list(inputs), output_file=output_file,
+                        output_format=self._output_format, rebuilt=True)
+
+    def _open_sqlite(self, database_path: list, database_name: str) -> SqliteSink:
+        """
+        Opens the SQLite warehouse stored within the project.
+        :param database_path: list - inner project path where the database is stored.
+        :param database_name: str - database file name, without extension.
+        :return: SqliteSink
+        """
+
+        return SqliteSink(database_file=join(self._base_path, *database_path, f'{database_name}.sqlite'))
+
+    def _load_tables_into_sqlite(self, sink: SqliteSink, table_name: str, schema: dict, delimiter: str = ',') -> int:
+        """
+        Bulk loads the tables held by the raw data container, CSV or columnar, into a single SQLite table.
+        CSV columns are matched by header name, so inputs only need to hold the schema's fields.
+        :param sink: SqliteSink - open warehouse.
+        :param table_name: str - destination table, replaced when it already exists.
+        :param schema: dict - fields and types of the table.
+        :param delimiter: str - delimiter of CSV inputs.
+        :return: int - rows loaded.
+        """
+
+        # destination table.
+        fields = schema.get('fields')
+        table = sink.table(table_name=table_name, fields=fields, types=schema.get('types'))
+
+        # iterate tables.
+        files: int = len(self._raw_data_container)
+        for index, file in enumerate(self._raw_data_container):
+            # logger.
+            self.logger.info(f'loading file {self._files_container[index]} into {table_name} - {index + 1} of {files}')
+            # rows of csv and columnar tables alike, in batches of one transaction.
+            rows = self._iter_table_rows(file=file, fields=fields, delimiter=delimiter)
+            for batch in iter(lambda: list(islice(rows, sink.batch_rows)), []):
+                table.write_rows(rows=batch)
+
+        # load remaining rows and index table.
+        table.close()
+
+        # logger.
+        self.logger.info(f'{table.rows} rows loaded into {table_name}')
+
+        return table.rows
 
     def _remove_files(self):
 
@@ -116,8 +553,11 @@ class Parser:
 
         # iterate files container.
         for file in self._files_container:
-            # remove file.
-            remove(file)
+            # remove file, columnar npy outputs are folders.
+            if isdir(file):
+                rmtree(file)
+            else:
+                remove(file)
 
         # logger.
         self.logger.info('all files have been removed from the system')
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+from time import monotonic, sleep
+
+
+class RateLimiter:
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Thread safe rate limiter which hands out request slots so that no more than `rate` requests per
+        second are issued, no matter how many threads or coroutines share it.
+        :param rate: float - max amount of requests per second.
+        :param burst: int - max amount of requests that can be issued back to back after an idle period.
+        """
+
+        # assert input.
+        if not isinstance(rate, (int, float)) or rate <= 0:
+            raise ValueError(f'expected a positive number for rate, but found {rate} of type {type(rate)}')
+        if not isinstance(burst, int) or burst < 1:
+            raise ValueError(f'expected a positive integer for burst, but found {burst} of type {type(burst)}')
+
+        # seconds between two consecutive slots.
+        self._interval: float = 1.0 / rate
+        self._burst: int = burst
+
+        # next available slot.
+        self._next_slot: float = monotonic()
+
+        # lock shared by every consumer.
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        """
+        Getter for property rate.
+        :return: float
+        """
+
+        return 1.0 / self._interval
+
+    def _reserve(self) -> float:
+        """
+        Reserves the next available slot.
+        :return: float - seconds to wait before the reserved slot is reached.
+        """
+
+        with self._lock:
+            now = monotonic()
+            # idle time only accumulates up to `burst` slots.
+            self._next_slot = max(self._next_slot, now - (self._burst - 1) * self._interval)
+            # compute waiting time for this slot and move on to the next one.
+            delay = self._next_slot - now
+            self._next_slot += self._interval
+
+        return max(delay, 0.0)
+
+    def acquire(self) -> None:
+        """
+        Blocks the calling thread until a slot is available.
+        :return: None
+        """
+
+        delay = self._reserve()
+        if delay > 0:
+            sleep(delay)
+
+    async def acquire_async(self) -> None:
+        """
+        Suspends the calling coroutine until a slot is available.
+        :return: None
+        """
+
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Holds every consumer back for the given amount of seconds, e.g. after a 429 Retry-After response.
+        :param seconds: float - seconds to wait before handing out the next slot.
+        :return: None
+        """
+
+        with self._lock:
+            self._next_slot = max(self._next_slot, monotonic() + seconds)
@@ -0,0 +1,152 @@
+import sqlite3
+
+from os import path, makedirs
+
+from utils.table_writer import TableWriter, coercions
+
+
+class SqliteSink:
+
+    # column type affinities.
+    sql_types = {'str': 'TEXT', 'int': 'INTEGER', 'float': 'REAL', 'bool': 'INTEGER'}
+
+    # indexed columns, created on every table holding all of them.
+    indexes = (('track_id',), ('region', 'week'), ('artist_id',))
+
+    # settings used while loading, durability is traded for speed since tables can always be reloaded.
+    ingest_pragmas = {
+        'journal_mode': 'WAL', 'synchronous': 'OFF', 'temp_store': 'MEMORY', 'cache_size': -256 * 1024,
+        'mmap_size': 1024 * 1024 * 1024
+    }
+
+    def __init__(self, database_file: str, batch_rows: int = 100000):
+        """
+        SQLite warehouse loaded through bulk executemany calls, batch_rows rows per transaction. Indexes are
+        created once a table is fully loaded.
+        :param database_file: str - path towards the database file.
+        :param batch_rows: int - rows per transaction.
+        """
+
+        # assert input.
+        if not isinstance(batch_rows, int) or batch_rows < 1:
+            raise ValueError(f'expected a positive integer, but found {batch_rows} of type {type(batch_rows)}')
+
+        # check for location to save the database.
+        makedirs(path.dirname(database_file) or '.', exist_ok=True)
+
+        # settings.
+        self.database_file: str = database_file
+        self.batch_rows: int = batch_rows
+
+        # transactions are handled explicitly.
+        self.connection = sqlite3.connect(database_file, isolation_level=None)
+        for pragma, value in self.ingest_pragmas.items():
+            self.connection.execute(f'PRAGMA {pragma} = {value}')
+
+    def table(self, table_name: str, fields: list, types: list, replace: bool = True) -> 'SqliteTableWriter':
+        """
+        Opens a table writer.
+        :param table_name: str - table name.
+        :param fields: list - column names.
+        :param types: list - column types, one of str, int, float or bool per column.
+        :param replace: bool - whether an existing table is dropped, otherwise rows are appended to it.
+        :return: SqliteTableWriter
+        """
+
+        return SqliteTableWriter(sink=self, table_name=table_name, fields=fields, types=types, replace=replace)
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        """
+        Runs a query.
+        :param sql: str - SQL statement.
+        :param params: tuple - statement parameters.
+        :return: list - result rows.
+        """
+
+        return self.connection.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+
+        # refresh planner statistics, pragmas only last as long as the connection.
+        self.connection.execute('ANALYZE')
+        self.connection.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        self.close()
+
+
+class SqliteTableWriter(TableWriter):
+
+    def __init__(self, sink: SqliteSink, table_name: str, fields: list, types: list, replace: bool = True):
+        """
+        Loads rows into a SQLite table, buffered into one transaction per sink.batch_rows rows.
+        """
+
+        # initialise superclass.
+        super().__init__(file=sink.database_file, fields=fields, types=types)
+
+        # settings.
+        self._sink: SqliteSink = sink
+        self.table_name: str = table_name
+        self._coercions: list = [coercions[column_type] for column_type in types]
+        self._buffer: list = list()
+
+        # create table.
+        columns = ', '.join([f'"{field}" {sink.sql_types[column_type]}' for field, column_type in zip(fields, types)])
+        if replace:
+            sink.connection.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        sink.connection.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" ({columns})')
+
+        # insert statement.
+        self._insert: str = f'INSERT INTO "{table_name}" VALUES ({", ".join(["?"] * len(fields))})'
+
+    def write_rows(self, rows: list) -> None:
+
+        # coerce values into the buffer.
+        row_coercions = self._coercions
+        self._buffer.extend([tuple([coerce(value) for coerce, value in zip(row_coercions, row)]) for row in rows])
+        self.rows += len(rows)
+
+        # load a transaction.
+        if len(self._buffer) >= self._sink.batch_rows:
+            self._flush()
+
+    def write_columns(self, columns: list) -> None:
+
+        self.write_rows(rows=list(zip(*columns)))
+
+    def _flush(self) -> None:
+
+        # nothing buffered.
+        if len(self._buffer) == 0:
+            return
+
+        # single transaction per batch.
+        connection = self._sink.connection
+        connection.execute('BEGIN')
+        try:
+            connection.executemany(self._insert, self._buffer)
+        except sqlite3.Error:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        self._buffer = list()
+
+    def close(self) -> None:
+
+        # load remaining rows.
+        self._flush()
+
+        # index the loaded table.
+        for columns in self._sink.indexes:
+            if all(column in self.fields for column in columns):
+                index_name = f'idx_{self.table_name}_' + '_'.join(columns)
+                index_columns = ', '.join([f'"{column}"' for column in columns])
+                self._sink.connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{self.table_name}" ({index_columns})'
+                )
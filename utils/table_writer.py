@@ -0,0 +1,471 @@
+import csv
+import json
+
+from itertools import islice
+from os import path, makedirs, replace
+from shutil import rmtree
+
+try:
+    import numpy as np
+except ImportError:
+    # npy output is not available.
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # parquet output is not available.
+    pa = None
+    pq = None
+
+
+# supported output formats, columnar resolves to parquet when pyarrow is installed and npy otherwise.
+output_formats = ('csv', 'parquet', 'npy', 'columnar')
+
+# file extension per resolved output format, npy tables are directories holding one file per column.
+table_extensions = {'csv': '.csv', 'parquet': '.parquet', 'npy': '.columns'}
+
+# column types.
+column_types = ('str', 'int', 'float', 'bool')
+
+
+def resolve_output_format(output_format: str) -> str:
+    """
+    Resolves an output format into the backend that will write it.
+    :param output_format: str - one of csv, parquet, npy or columnar.
+    :return: str - csv, parquet or npy.
+    """
+
+    # assert input.
+    if output_format not in output_formats:
+        raise ValueError(f'the output format value specified {output_format} is not allowed')
+
+    # pick the best columnar backend installed.
+    if output_format == 'columnar':
+        output_format = 'parquet' if pa is not None else 'npy'
+
+    # assert backend availability.
+    if output_format == 'parquet' and pa is None:
+        raise ValueError('parquet output was requested but pyarrow is not installed')
+    if output_format == 'npy' and np is None:
+        raise ValueError('npy output was requested but numpy is not installed')
+
+    return output_format
+
+
+def _to_int(value):
+
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        # numbers written as floats, e.g. 12.0.
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return None
+
+
+def _to_float(value):
+
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_bool(value):
+
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return value.lower() in ('true', '1')
+
+    return bool(value)
+
+
+def _to_str(value):
+
+    if value is None:
+        return None
+
+    return str(value)
+
+
+# value coercion per column type, values that cannot be coerced become nulls.
+coercions = {'str': _to_str, 'int': _to_int, 'float': _to_float, 'bool': _to_bool}
+
+
+class TableWriter:
+
+    def __init__(self, file: str, fields: list, types: list):
+        """
+        Base class of the parsed table writers. Rows or columns are appended in batches and the table is
+        finished on close.
+        :param file: str - path towards the table, including its extension.
+        :param fields: list - column names.
+        :param types: list - column types, one of str, int, float or bool per column.
+        """
+
+        # assert input.
+        if len(fields) != len(types):
+            raise ValueError(f'expected one type per field, but found {len(types)} types for {len(fields)} fields')
+        for column_type in types:
+            if column_type not in column_types:
+                raise ValueError(f'the column type value specified {column_type} is not allowed')
+
+        # settings.
+        self.file: str = file
+        self.fields: list = list(fields)
+        self.types: list = list(types)
+
+        # rows written so far.
+        self.rows: int = 0
+
+    def write_rows(self, rows: list) -> None:
+        """
+        Appends a batch of rows.
+        :param rows: list - tuples holding one value per field.
+        :return: None
+        """
+
+        # transpose batch.
+        if len(rows) == 0:
+            return
+        self.write_columns(columns=[list(column) for column in zip(*rows)])
+
+    def write_columns(self, columns: list) -> None:
+        """
+        Appends a batch of columns.
+        :param columns: list - sequences holding the values of each field, in field order.
+        :return: None
+        """
+
+        raise NotImplementedError
+
+    def close(self) -> None:
+
+        raise NotImplementedError
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        self.close()
+
+
+class CsvTableWriter(TableWriter):
+
+    def __init__(self, file: str, fields: list, types: list):
+        """
+        Writes a fully quoted CSV table, the format every parser has always written.
+        """
+
+        # initialise superclass.
+        super().__init__(file=file, fields=fields, types=types)
+
+        # open file and write headers.
+        self._f = open(file, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._f, quoting=csv.QUOTE_ALL)
+        self._writer.writerow(self.fields)
+
+    def write_rows(self, rows: list) -> None:
+
+        # rows are written as they come.
+        self._writer.writerows(rows)
+        self.rows += len(rows)
+
+    def write_columns(self, columns: list) -> None:
+
+        self.write_rows(rows=list(zip(*columns)))
+
+    def close(self) -> None:
+
+        self._f.close()
+
+
+class ParquetTableWriter(TableWriter):
+
+    # arrow type per column type.
+    arrow_types = {'str': 'string', 'int': 'int64', 'float': 'float64', 'bool': 'bool_'}
+
+    def __init__(self, file: str, fields: list, types: list, compression: str = 'zstd',
+                 row_group_rows: int = 65536):
+        """
+        Writes a typed Parquet table. Batches are buffered into row groups of row_group_rows, so that appending
+        many small batches does not produce many tiny row groups.
+        :param compression: str - parquet compression codec.
+        :param row_group_rows: int - rows per row group.
+        """
+
+        # initialise superclass.
+        super().__init__(file=file, fields=fields, types=types)
+
+        # arrow schema.
+        self._schema = pa.schema([
+            (field, getattr(pa, self.arrow_types[column_type])()) for field, column_type in zip(fields, types)
+        ])
+
+        # buffered values per column.
+        self._row_group_rows: int = row_group_rows
+        self._buffer: list = [list() for _ in fields]
+        self._buffered: int = 0
+
+        # written to a temporary file so readers never see a partial table.
+        self._tmp_file: str = f'{file}.tmp'
+        self._writer = pq.ParquetWriter(self._tmp_file, self._schema, compression=compression)
+
+    def write_columns(self, columns: list) -> None:
+
+        # nothing to write.
+        if len(columns) == 0 or len(columns[0]) == 0:
+            return
+
+        # coerce values into the buffer.
+        for index, (column, column_type) in enumerate(zip(columns, self.types)):
+            coerce = coercions[column_type]
+            self._buffer[index].extend([coerce(value) for value in column])
+        self._buffered += len(columns[0])
+        self.rows += len(columns[0])
+
+        # write a row group.
+        if self._buffered >= self._row_group_rows:
+            self._flush()
+
+    def _flush(self) -> None:
+
+        # nothing buffered.
+        if self._buffered == 0:
+            return
+
+        # write buffer as a row group.
+        arrays = [
+            pa.array(values, type=self._schema.field(index).type) for index, values in enumerate(self._buffer)
+        ]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        self._buffer = [list() for _ in self.fields]
+        self._buffered = 0
+
+    def close(self) -> None:
+
+        self._flush()
+        self._writer.close()
+        replace(self._tmp_file, self.file)
+
+
+class NpyTableWriter(TableWriter):
+
+    def __init__(self, file: str, fields: list, types: list):
+        """
+        Writes a directory holding one .npy file per column. Numeric columns are stored as int64, float64 or
+        bool, integer and boolean columns holding nulls are widened to float64 with NaN. String columns are
+        dictionary encoded, int32 codes (-1 for nulls) plus a JSON list of distinct values.
+        """
+
+        # initialise superclass.
+        super().__init__(file=file, fields=fields, types=types)
+
+        # column chunks, kept until the table is closed.
+        self._chunks: list = [list() for _ in fields]
+
+        # distinct values of every string column.
+        self._dictionaries: list = [dict() if column_type == 'str' else None for column_type in types]
+
+    def write_columns(self, columns: list) -> None:
+
+        # nothing to write.
+        if len(columns) == 0 or len(columns[0]) == 0:
+            return
+
+        for index, (column, column_type) in enumerate(zip(columns, self.types)):
+            # dictionary encode strings.
+            if column_type == 'str':
+                dictionary = self._dictionaries[index]
+                codes = [
+                    -1 if value is None else dictionary.setdefault(str(value), len(dictionary)) for value in column
+                ]
+                self._chunks[index].append(np.array(codes, dtype=np.int32))
+                continue
+            # numeric arrays, e.g. columns read back from another npy table, are appended as they are.
+            if isinstance(column, np.ndarray) and column.dtype.kind in 'biuf':
+                if column_type == 'float' or column.dtype.kind == 'f':
+                    self._chunks[index].append(column.astype(np.float64, copy=False))
+                else:
+                    self._chunks[index].append(column.astype(np.int64 if column_type == 'int' else np.bool_,
+                                                             copy=False))
+                continue
+            # coerce numbers, nulls turn the chunk into floats.
+            values = [coercions[column_type](value) for value in column]
+            if any(value is None for value in values):
+                self._chunks[index].append(
+                    np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+                )
+            else:
+                self._chunks[index].append(np.array(values, dtype={'int': np.int64, 'float': np.float64,
+                                                                   'bool': np.bool_}[column_type]))
+
+        self.rows += len(columns[0])
+
+    def close(self) -> None:
+
+        # written to a temporary directory so readers never see a partial table.
+        tmp_path = f'{self.file}.tmp'
+        if path.isdir(tmp_path):
+            rmtree(tmp_path)
+        makedirs(tmp_path)
+
+        # write columns.
+        dtypes = list()
+        for index, (field, column_type) in enumerate(zip(self.fields, self.types)):
+            # join chunks, a single float chunk widens the whole column.
+            chunks = self._chunks[index]
+            if len(chunks) == 0:
+                column = np.array([], dtype=np.int32 if column_type == 'str' else np.float64)
+            elif column_type != 'str' and any(chunk.dtype == np.float64 for chunk in chunks):
+                column = np.concatenate([chunk.astype(np.float64) for chunk in chunks])
+            else:
+                column = np.concatenate(chunks)
+            np.save(path.join(tmp_path, f'{field}.npy'), column, allow_pickle=False)
+            dtypes.append(str(column.dtype))
+            # write distinct values.
+            if column_type == 'str':
+                with open(path.join(tmp_path, f'{field}.values.json'), 'w', encoding='utf-8') as f:
+                    f.write(json.dumps(list(self._dictionaries[index])))
+
+        # write schema.
+        with open(path.join(tmp_path, '_schema.json'), 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'fields': self.fields, 'types': self.types, 'dtypes': dtypes, 'rows': self.rows}))
+
+        # publish table.
+        if path.isdir(self.file):
+            rmtree(self.file)
+        replace(tmp_path, self.file)
+
+        # release chunks.
+        self._chunks = [list() for _ in self.fields]
+
+
+# writer class per resolved output format.
+_writers = {'csv': CsvTableWriter, 'parquet': ParquetTableWriter, 'npy': NpyTableWriter}
+
+
+def open_table(file_base: str, fields: list, types: list, output_format: str = 'csv') -> TableWriter:
+    """
+    Opens a table writer.
+    :param file_base: str - path towards the table, without extension.
+    :param fields: list - column names.
+    :param types: list - column types, one of str, int, float or bool per column.
+    :param output_format: str - one of csv, parquet, npy or columnar.
+    :return: TableWriter
+    """
+
+    # resolve backend.
+    output_format = resolve_output_format(output_format=output_format)
+
+    return _writers[output_format](file=f'{file_base}{table_extensions[output_format]}', fields=fields, types=types)
+
+
+def read_table(file: str, decode_strings: bool = True) -> dict:
+    """
+    Reads a parquet file or an npy table directory.
+    :param file: str - path towards the table.
+    :param decode_strings: bool - whether npy string columns are decoded, otherwise their codes are returned.
+    :return: dict - fields, types and columns, a list holding one array or list per field.
+    """
+
+    # parquet table.
+    if path.splitext(file)[1] == table_extensions['parquet']:
+        if pq is None:
+            raise ValueError('parquet input was found but pyarrow is not installed')
+        table = pq.read_table(file)
+        types = [
+            next(column_type for column_type, arrow_type in ParquetTableWriter.arrow_types.items()
+                 if getattr(pa, arrow_type)() == field.type)
+            for field in table.schema
+        ]
+        return {'fields': table.column_names, 'types': types,
+                'columns': [table.column(name).to_pylist() for name in table.column_names]}
+
+    # npy table.
+    if not path.isdir(file):
+        raise ValueError(f'expected a .parquet file or a {table_extensions["npy"]} directory, but found {file}')
+    if np is None:
+        raise ValueError('npy input was found but numpy is not installed')
+    with open(path.join(file, '_schema.json'), 'r', encoding='utf-8') as f:
+        schema = json.loads(f.read())
+    columns = list()
+    for field, column_type in zip(schema.get('fields'), schema.get('types')):
+        column = np.load(path.join(file, f'{field}.npy'), allow_pickle=False)
+        # decode dictionary codes.
+        if column_type == 'str' and decode_strings:
+            with open(path.join(file, f'{field}.values.json'), 'r', encoding='utf-8') as f:
+                values = np.array(json.loads(f.read()) + [None], dtype=object)
+            column = values[column]
+        columns.append(column)
+
+    return {'fields': schema.get('fields'), 'types': schema.get('types'), 'columns': columns}
+
+
+def _to_array(values, column_type: str):
+
+    # typed array of a column.
+    if column_type == 'str':
+        return np.array(['' if value is None else str(value) for value in values], dtype=str)
+    if column_type == 'bool':
+        return np.array([bool(_to_bool(value)) for value in values], dtype=bool)
+
+    return np.array([_to_float(value) for value in values], dtype=np.float64)
+
+
+def read_columns(file: str, fields: list, types: list, delimiter: str = ',', batch_rows: int = 100000) -> dict:
+    """
+    Reads the given columns of a CSV, parquet or npy table into numpy arrays. CSV columns are matched by header
+    name and typed batch_rows rows at a time, and values that cannot be coerced become NaN for floats and empty
+    strings otherwise.
+    :param file: str - path towards the table.
+    :param fields: list - column names.
+    :param types: list - column types, one of str, int, float or bool per column, ints are read as floats so
+    that nulls are kept.
+    :param delimiter: str - delimiter of CSV inputs.
+    :param batch_rows: int - CSV rows held as text at once.
+    :return: dict - field and array, str columns are unicode arrays, numbers float64 and bools bool.
+    """
+
+    # assert numpy availability.
+    if np is None:
+        raise ValueError('columns are read into numpy arrays, which is not installed')
+
+    # assert input.
+    if not isinstance(batch_rows, int) or batch_rows < 1:
+        raise ValueError(f'expected a positive integer, but found {batch_rows} of type {type(batch_rows)}')
+
+    # columnar tables.
+    if path.splitext(file)[1] != table_extensions['csv']:
+        data = read_table(file=file)
+        columns = dict(zip(data.get('fields'), data.get('columns')))
+        size = len(data.get('columns')[0]) if data.get('columns') else 0
+        return {field: _to_array(values=columns.get(field, [None] * size), column_type=column_type)
+                for field, column_type in zip(fields, types)}
+
+    # csv tables, only a batch of rows is kept as text before being typed.
+    batches: dict = {field: list() for field in fields}
+    with open(file, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, [])
+        positions = [header.index(field) if field in header else None for field in fields]
+        while True:
+            rows = list(islice(reader, batch_rows))
+            if not rows:
+                break
+            for field, column_type, position in zip(fields, types, positions):
+                values = [row[position] for row in rows] if position is not None else [''] * len(rows)
+                batches[field].append(_to_array(values=values, column_type=column_type))
+
+    return {field: np.concatenate(batches[field]) if batches[field] else _to_array(values=[], column_type=column_type)
+            for field, column_type in zip(fields, types)}
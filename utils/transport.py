@@ -0,0 +1,96 @@
+import requests
+
+from requests.adapters import HTTPAdapter
+
+
+class HttpTransport:
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 16, timeout: tuple = (5, 30)):
+        """
+        HTTP transport keeping keep-alive connection pools per host, shared by every API class.
+        :param pool_connections: int - max amount of hosts whose connection pool is kept alive.
+        :param pool_maxsize: int - max amount of connections kept alive per host, should be at least the amount
+        of requests issued concurrently against a single host.
+        :param timeout: tuple - default (connect, read) timeout in seconds, used when a request does not set one.
+        """
+
+        # assert input.
+        if not isinstance(pool_connections, int) or pool_connections < 1:
+            raise ValueError(f'expected a positive integer, but found {pool_connections} of type '
+                             f'{type(pool_connections)}')
+        if not isinstance(pool_maxsize, int) or pool_maxsize < 1:
+            raise ValueError(f'expected a positive integer, but found {pool_maxsize} of type {type(pool_maxsize)}')
+
+        # settings.
+        self.pool_connections: int = pool_connections
+        self.pool_maxsize: int = pool_maxsize
+        self.timeout: tuple = timeout
+
+        # pooled adapter, retries are handled by each API class.
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+
+        # session sharing the adapter for both schemes.
+        self._session = requests.Session()
+        self._session.mount('https://', self._adapter)
+        self._session.mount('http://', self._adapter)
+        # compressed responses are transparently decoded by urllib3.
+        self._session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Performs a request through the pooled session.
+        :param method: str - HTTP method.
+        :param url: str - request url.
+        :param kwargs: keyword arguments accepted by requests.Session.request.
+        :return: requests.Response
+        """
+
+        # apply default timeout.
+        kwargs.setdefault('timeout', self.timeout)
+
+        return self._session.request(method=method, url=url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+
+        return self.request(method='GET', url=url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+
+        return self.request(method='POST', url=url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Reports connection usage for every host pool that is currently alive.
+        :return: dict - connections opened and reused overall and per host.
+        """
+
+        # per host stats.
+        hosts: dict = dict()
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            # pool may have been evicted meanwhile.
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            # every request not served by a new connection reused a pooled one.
+            hosts[f'{pool.scheme}://{pool.host}:{pool.port}'] = {
+                'requests': pool.num_requests,
+                'opened': pool.num_connections,
+                'reused': max(pool.num_requests - pool.num_connections, 0)
+            }
+
+        return {
+            'requests': sum(host['requests'] for host in hosts.values()),
+            'opened': sum(host['opened'] for host in hosts.values()),
+            'reused': sum(host['reused'] for host in hosts.values()),
+            'hosts': hosts
+        }
+
+    def close(self) -> None:
+        """
+        Closes every pooled connection.
+        :return: None
+        """
+
+        self._session.close()
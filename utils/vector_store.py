@@ -0,0 +1,182 @@
+import json
+
+from array import array
+from os import path, makedirs, replace, getpid
+
+try:
+    import numpy as np
+except ImportError:
+    # stores can still be written, but not memory mapped.
+    np = None
+
+
+# supported value types, array typecode and data file extension per dtype.
+vector_dtypes = {'float32': ('f', '.f32'), 'float64': ('d', '.f64')}
+
+# file extension of the offset index.
+index_extension = '.index.json'
+
+
+class VectorStoreWriter:
+
+    def __init__(self, file_base: str, width: int, dtype: str = 'float32', append: bool = False):
+        """
+        Writes per key matrices back to back into a single binary file, along with an index holding the first row
+        and the amount of rows of every key. Rows shorter than width are padded with NaN.
+        :param file_base: str - path towards the store, without extension.
+        :param width: int - values per row.
+        :param dtype: str - value type, float32 or float64.
+        :param append: bool - whether keys are appended to an existing store, rows past the ones its index holds,
+        e.g. left by an interrupted append, are dropped. A new store is written when there is none.
+        """
+
+        # assert input.
+        if not isinstance(width, int) or width < 1:
+            raise ValueError(f'expected a positive integer, but found {width} of type {type(width)}')
+        if dtype not in vector_dtypes:
+            raise ValueError(f'the dtype value specified {dtype} is not allowed')
+
+        # check for location to save the store.
+        makedirs(path.dirname(file_base) or '.', exist_ok=True)
+
+        # settings.
+        self.file_base: str = file_base
+        self.width: int = width
+        self.dtype: str = dtype
+        self._typecode, self._data_extension = vector_dtypes[dtype]
+
+        # index, key to [first row, rows].
+        self.keys: dict = dict()
+        self.rows: int = 0
+
+        # existing store, appended to in place and made visible when the index is replaced on close.
+        data_file = f'{file_base}{self._data_extension}'
+        if append and path.isfile(f'{file_base}{index_extension}') and path.isfile(data_file):
+            with open(f'{file_base}{index_extension}', 'r', encoding='utf-8') as f:
+                index = json.loads(f.read())
+            if index.get('dtype', 'float32') != dtype or index.get('width') != width:
+                raise ValueError(f'expected a {index.get("dtype")} store of width {index.get("width")}, but found '
+                                 f'{dtype} and {width}')
+            self.keys, self.rows = index.get('keys'), index.get('rows')
+            self._tmp_file: str = None
+            self._file = open(data_file, 'r+b')
+            self._file.truncate(self.rows * width * array(self._typecode).itemsize)
+            self._file.seek(0, 2)
+            return
+
+        # binary output, written to a temporary file and moved into place on close.
+        self._tmp_file: str = f'{file_base}{self._data_extension}.{getpid()}.tmp'
+        self._file = open(self._tmp_file, 'wb')
+
+    def write(self, key: str, rows: list) -> None:
+        """
+        Appends the matrix of a key.
+        :param key: str - matrix key, e.g. a track_id.
+        :param rows: list - rows of up to width numbers each.
+        :return: None
+        """
+
+        # keys are unique.
+        if key in self.keys:
+            raise ValueError(f'key {key} was already written to {self.file_base}')
+
+        # flatten rows, padding short rows.
+        width = self.width
+        padding = [float('nan')] * width
+        values = array(self._typecode)
+        for row in rows:
+            values.extend(row[:width])
+            if len(row) < width:
+                values.extend(padding[len(row):])
+        values.tofile(self._file)
+
+        # index.
+        self.keys[key] = [self.rows, len(rows)]
+        self.rows += len(rows)
+
+    def close(self) -> None:
+
+        # already closed.
+        if self._file.closed:
+            return
+
+        # move data into place.
+        self._file.close()
+        if self._tmp_file is not None:
+            replace(self._tmp_file, f'{self.file_base}{self._data_extension}')
+
+        # write index atomically.
+        index_file = f'{self.file_base}{index_extension}'
+        with open(f'{index_file}.{getpid()}.tmp', 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'dtype': self.dtype, 'width': self.width, 'rows': self.rows, 'keys': self.keys}))
+        replace(f'{index_file}.{getpid()}.tmp', index_file)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        self.close()
+
+
+class VectorStore:
+
+    def __init__(self, file_base: str):
+        """
+        Read only, memory mapped view over a store written by VectorStoreWriter. Matrices are returned as numpy
+        views into the mapped file, so nothing is copied until values are used.
+        :param file_base: str - path towards the store, without extension.
+        """
+
+        # assert numpy availability.
+        if np is None:
+            raise ValueError('vector stores are memory mapped through numpy, which is not installed')
+
+        # read index.
+        with open(f'{file_base}{index_extension}', 'r', encoding='utf-8') as f:
+            index = json.loads(f.read())
+
+        # settings.
+        self.file_base: str = file_base
+        self.width: int = index.get('width')
+        self.keys: dict = index.get('keys')
+        self.dtype: str = index.get('dtype', 'float32')
+
+        # map data, empty stores cannot be mapped.
+        rows = index.get('rows')
+        self.matrix = np.memmap(
+            f'{file_base}{vector_dtypes[self.dtype][1]}', dtype=self.dtype, mode='r', shape=(rows, self.width)
+        ) if rows > 0 else np.empty((0, self.width), dtype=self.dtype)
+
+    def __len__(self) -> int:
+
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+
+        return key in self.keys
+
+    def get(self, key: str):
+        """
+        Matrix of a key.
+        :param key: str - matrix key, e.g. a track_id.
+        :return: numpy.ndarray - rows x width view, None when the key is not stored.
+        """
+
+        if key not in self.keys:
+            return None
+        first, rows = self.keys[key]
+
+        return self.matrix[first:first + rows]
+
+    def offsets(self, keys: list = None):
+        """
+        First row and amount of rows per key, to slice the whole matrix at once.
+        :param keys: list - keys to fetch, every key in storage order when None.
+        :return: tuple - keys list and an int64 array of [first row, rows] pairs.
+        """
+
+        keys = list(self.keys) if keys is None else keys
+
+        return keys, np.array([self.keys[key] for key in keys], dtype=np.int64).reshape(-1, 2)